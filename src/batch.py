@@ -0,0 +1,279 @@
+"""批量处理模块：把多个视频分发到进程池并行处理"""
+
+import glob
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import Callable, List, Optional
+
+from .insert import insert_video
+from .media.probe import probe_media
+from .media.segments import probe_streams
+from .watermark import add_image_watermark, add_text_watermark, add_combo_watermark
+
+# 支持的视频扩展名（与UI文件夹模式一致）
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.webm')
+
+# 任务类型 -> (处理函数, 输入视频参数名)
+TASKS = {
+    'watermark': (add_image_watermark, 'video_path'),
+    'watermark_text': (add_text_watermark, 'video_path'),
+    'watermark_combo': (add_combo_watermark, 'video_path'),
+    'insert': (insert_video, 'main_video_path'),
+}
+
+# 预检并发探测的线程数上限（ffprobe 为独立进程，线程只负责等待）
+PREFLIGHT_WORKERS = 16
+
+# 估算磁盘需求时预留的余量（重编码输出大小与源文件相近，但码率会有波动）
+DISK_SPACE_MARGIN = 1.2
+
+
+def collect_videos(source: str) -> List[str]:
+    """收集待处理的视频文件
+
+    Args:
+        source: 文件夹路径或通配符（如 videos/*.mp4）
+
+    Returns:
+        排序后的视频文件路径列表
+    """
+    if os.path.isdir(source):
+        candidates = [os.path.join(source, name) for name in os.listdir(source)]
+    else:
+        candidates = glob.glob(source)
+
+    return sorted(
+        path for path in candidates
+        if os.path.isfile(path) and path.lower().endswith(VIDEO_EXTENSIONS)
+    )
+
+
+def default_output_dir(source: str) -> str:
+    """默认输出目录：与UI文件夹模式一致，为 <文件夹名>_wmarked"""
+    folder = source if os.path.isdir(source) else os.path.dirname(source) or '.'
+    folder = os.path.abspath(folder)
+    return os.path.join(os.path.dirname(folder), f'{os.path.basename(folder)}_wmarked')
+
+
+def build_output_path(video_path: str, output_dir: str) -> str:
+    """生成输出文件路径：<输出目录>/<原文件名>_wmarked.mp4"""
+    stem = os.path.splitext(os.path.basename(video_path))[0]
+    return os.path.join(output_dir, f'{stem}_wmarked.mp4')
+
+
+def threads_per_job(jobs: int) -> int:
+    """每个并行任务分得的编码线程数，避免 jobs × cpu_count 个线程争抢CPU"""
+    return max(1, (os.cpu_count() or 1) // max(1, jobs))
+
+
+def _run_batch_job(task_type: str, params: dict) -> dict:
+    """在工作进程中处理单个视频（必须是模块级函数以便进程池序列化）
+
+    Returns:
+        结果字典：input、output、success、error、elapsed、duration、size
+    """
+    func, input_key = TASKS[task_type]
+    video_path = params[input_key]
+    result = {
+        'input': video_path,
+        'output': params['output_path'],
+        'success': False,
+        'error': None,
+        'elapsed': 0.0,
+        'duration': 0.0,
+        'size': os.path.getsize(video_path),
+    }
+
+    start = time.perf_counter()
+    try:
+        func(**params)
+        result['success'] = True
+        result['duration'] = probe_streams(video_path)[2]
+    except Exception as e:
+        result['error'] = str(e)
+    result['elapsed'] = time.perf_counter() - start
+    return result
+
+
+def run_batch(
+    task_type: str,
+    videos: List[str],
+    output_dir: str,
+    params: dict,
+    jobs: Optional[int] = None,
+    on_result: Optional[Callable[[dict], None]] = None
+) -> List[dict]:
+    """并行批量处理视频
+
+    Args:
+        task_type: 任务类型（'watermark'、'watermark_text'、'watermark_combo'、'insert'）
+        videos: 待处理的视频列表
+        output_dir: 输出目录
+        params: 处理函数的公共参数（不包含输入、输出路径和线程数）
+        jobs: 并行任务数，默认使用CPU核心数（不超过视频数量）
+        on_result: 每个视频处理完成后的回调
+
+    Returns:
+        按完成顺序排列的结果列表
+    """
+    if task_type not in TASKS:
+        raise ValueError(f"任务类型必须是 {list(TASKS)} 之一， got '{task_type}'")
+    if not videos:
+        return []
+
+    jobs = max(1, min(jobs or os.cpu_count() or 1, len(videos)))
+    threads = threads_per_job(jobs)
+    _, input_key = TASKS[task_type]
+    os.makedirs(output_dir, exist_ok=True)
+
+    results = []
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = []
+        for video_path in videos:
+            job_params = dict(params)
+            job_params[input_key] = video_path
+            job_params['output_path'] = build_output_path(video_path, output_dir)
+            job_params['threads'] = threads
+            futures.append(executor.submit(_run_batch_job, task_type, job_params))
+
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            if on_result:
+                on_result(result)
+
+    return results
+
+
+def preflight_batch(
+    task_type: str,
+    videos: List[str],
+    output_dir: str,
+    params: dict,
+    workers: Optional[int] = None
+) -> dict:
+    """编码开始前并发探测所有输入，检查参数是否适用于每个文件并估算磁盘需求
+
+    检查项：文件为空或无法解析、没有视频流、水印时间范围或插入位置超出视频时长。
+    输出大小按源文件大小估算（插入任务再加上插入视频的大小）。
+
+    Args:
+        task_type: 任务类型（同 run_batch）
+        videos: 待处理的视频列表
+        output_dir: 输出目录
+        params: 处理函数的公共参数（同 run_batch）
+        workers: 并发探测的线程数，默认 min(视频数, PREFLIGHT_WORKERS)
+
+    Returns:
+        预检报告字典：
+            ready: 通过预检的视频列表（保持原顺序）
+            rejected: 未通过的视频列表，每项为 {'input': 路径, 'error': 原因}
+            estimated_bytes: 通过预检的视频输出总大小估算
+            free_bytes: 输出目录所在磁盘的可用空间
+            enough_space: 可用空间是否足够（含 DISK_SPACE_MARGIN 余量）
+
+    Raises:
+        ValueError: 任务类型无效，或所有视频共用的素材（水印图片、插入视频）不可用
+    """
+    if task_type not in TASKS:
+        raise ValueError(f"任务类型必须是 {list(TASKS)} 之一， got '{task_type}'")
+
+    # 所有视频共用的素材只检查一次
+    watermark_path = params.get('watermark_path')
+    if watermark_path and not os.path.isfile(watermark_path):
+        raise ValueError(f'水印图片不存在: {watermark_path}')
+    extra_bytes = 0
+    if task_type == 'insert':
+        insert_path = params['insert_video_path']
+        try:
+            insert_info = probe_media(insert_path)
+        except (OSError, RuntimeError) as e:
+            raise ValueError(f'无法读取插入视频: {insert_path}: {e}') from e
+        if not insert_info.has_video:
+            raise ValueError(f'插入视频没有视频流: {insert_path}')
+        extra_bytes = os.path.getsize(insert_path)
+
+    entries = []
+    if videos:
+        workers = max(1, min(workers or PREFLIGHT_WORKERS, len(videos)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            entries = list(executor.map(
+                lambda video_path: _preflight_video(task_type, video_path, params), videos
+            ))
+
+    ready = [entry['input'] for entry in entries if entry['error'] is None]
+    rejected = [{'input': entry['input'], 'error': entry['error']}
+                for entry in entries if entry['error'] is not None]
+    estimated_bytes = sum(entry['size'] + extra_bytes
+                          for entry in entries if entry['error'] is None)
+    free_bytes = shutil.disk_usage(_existing_parent(output_dir)).free
+
+    return {
+        'ready': ready,
+        'rejected': rejected,
+        'estimated_bytes': estimated_bytes,
+        'free_bytes': free_bytes,
+        'enough_space': estimated_bytes * DISK_SPACE_MARGIN <= free_bytes,
+    }
+
+
+def _preflight_video(task_type: str, video_path: str, params: dict) -> dict:
+    """预检单个视频，返回 {'input', 'error', 'size'}（error 为 None 表示通过）"""
+    entry = {'input': video_path, 'error': None, 'size': 0}
+    try:
+        entry['size'] = os.path.getsize(video_path)
+        if entry['size'] == 0:
+            entry['error'] = '文件为空'
+            return entry
+        info = probe_media(video_path)
+    except (OSError, RuntimeError) as e:
+        entry['error'] = f'无法读取视频信息: {e}'
+        return entry
+
+    if not info.has_video:
+        entry['error'] = '没有视频流'
+    elif info.duration <= 0:
+        entry['error'] = '无法确定视频时长'
+    elif task_type == 'insert':
+        position = params['insert_position']
+        if position < 0 or position > info.duration:
+            entry['error'] = f'插入位置 {position}s 超出视频时长 {info.duration:.2f}s'
+    else:
+        start_time = params.get('start_time') or 0
+        end_time = params.get('end_time')
+        if start_time >= info.duration:
+            entry['error'] = f'水印开始时间 {start_time}s 超出视频时长 {info.duration:.2f}s'
+        elif end_time is not None and end_time > info.duration:
+            entry['error'] = f'水印结束时间 {end_time}s 超出视频时长 {info.duration:.2f}s'
+    return entry
+
+
+def _existing_parent(path: str) -> str:
+    """返回路径自身或最近的已存在的上级目录（输出目录可能尚未创建）"""
+    path = os.path.abspath(path)
+    while not os.path.exists(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    return path
+
+
+def summarize_results(results: List[dict], wall_time: float) -> dict:
+    """汇总批量处理的吞吐量统计"""
+    succeeded = [r for r in results if r['success']]
+    total_duration = sum(r['duration'] for r in succeeded)
+    total_size = sum(r['size'] for r in succeeded)
+    wall_time = max(wall_time, 1e-6)
+    return {
+        'total': len(results),
+        'succeeded': len(succeeded),
+        'failed': len(results) - len(succeeded),
+        'wall_time': wall_time,
+        'videos_per_minute': len(succeeded) * 60 / wall_time,
+        'media_duration': total_duration,
+        'realtime_factor': total_duration / wall_time,
+        'megabytes_per_second': total_size / (1024 * 1024) / wall_time,
+    }
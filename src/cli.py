@@ -1,16 +1,26 @@
 """Command-line interface for video watermark tool."""
 
+import json
 import logging
 import os
 import sys
+import time
 from pathlib import Path
 
 import click
 
 from .watermark import add_image_watermark
+from .watermark.image_watermark import BACKENDS
 from .watermark.text_watermark_v2 import add_text_watermark as add_text_watermark_v2
 from .watermark.combo_watermark import add_combo_watermark
-from .insert import insert_video
+from .watermark.personalized import add_personalized_watermarks
+from .watermark.dynamic_text import add_dynamic_text_watermark
+from .watermark.font_index import get_font_index
+from .insert import insert_videos
+from .insert.snap import SNAP_MODES
+from .media.pipeline import (COMPOSE_PROCESSES_ENV, COMPOSITE_FORMAT_ENV, COMPOSITE_FORMATS,
+                             MAX_FRAMES_ENV, MAX_MEMORY_ENV, parse_memory_size)
+from .batch import collect_videos, default_output_dir, preflight_batch, run_batch, summarize_results
 from .logger_config import setup_logger, get_logger
 
 # 设置日志
@@ -32,15 +42,45 @@ POSITIONS = {
 
 AUDIO_MODES = ['keep', 'replace', 'mix', 'mute']
 
+# 批量处理任务名 -> 内部任务类型
+BATCH_TASKS = {
+    'watermark': 'watermark',
+    'watermark-text': 'watermark_text',
+    'watermark-combo': 'watermark_combo',
+    'insert': 'insert',
+}
+
 
 @click.group(invoke_without_command=True)
 @click.version_option(version='1.0.0', prog_name='Video Watermark Tool')
+@click.option('--max-memory', default=None,
+              help='每个渲染进程帧缓冲区的内存上限，如 512M、2G（默认：不限制）')
+@click.option('--max-frames', type=click.IntRange(min=2), default=None,
+              help='每个渲染进程的在途帧数上限（默认：20）')
+@click.option('--compose-processes', type=click.IntRange(min=0), default=None,
+              help='逐帧合成使用的进程数，帧经共享内存传递（默认：0，在线程中合成）')
+@click.option('--composite-format', type=click.Choice(COMPOSITE_FORMATS), default=None,
+              help='逐帧合成的像素格式：yuv420p 直接在解码出的 YUV 平面上混合，'
+                   '省去两次色彩转换（默认：rgb24）')
 @click.pass_context
-def cli(ctx):
+def cli(ctx, max_memory, max_frames, compose_processes, composite_format):
     """视频水印工具 - 添加水印和插入视频片段
 
     不输入任何命令将启动图形界面
     """
+    # 通过环境变量传递，批量处理、分段渲染的工作进程同样生效
+    if max_memory is not None:
+        try:
+            os.environ[MAX_MEMORY_ENV] = str(parse_memory_size(max_memory))
+        except ValueError as e:
+            raise click.BadParameter(str(e), param_hint="'--max-memory'")
+    if max_frames is not None:
+        os.environ[MAX_FRAMES_ENV] = str(max_frames)
+    if compose_processes is not None:
+        os.environ[COMPOSE_PROCESSES_ENV] = str(compose_processes)
+    if composite_format is not None:
+        os.environ[COMPOSITE_FORMAT_ENV] = composite_format
+
     # 如果没有提供子命令，启动 UI
     if ctx.invoked_subcommand is None:
         ui()
@@ -68,10 +108,16 @@ def cli(ctx):
               help='水印宽度（像素，保持宽高比）')
 @click.option('--height', type=int, default=None,
               help='水印高度（像素，保持宽高比）')
+@click.option('--backend', type=click.Choice(BACKENDS), default='moviepy',
+              help='处理后端：moviepy（逐帧合成）、ffmpeg（单进程滤镜图，速度更快）')
+@click.option('--smart-render', is_flag=True,
+              help='仅重编码水印时间范围所在的GOP，其余部分直接流复制（需h264/yuv420p源）')
+@click.option('--segments', type=click.IntRange(1), default=None,
+              help='分段并行编码：在关键帧处把视频切为N段，由N个进程分别处理后无损拼接（适合长视频）')
 @click.option('--log-level', type=click.Choice(['DEBUG', 'INFO', 'WARNING', 'ERROR']),
               default='INFO', help='日志级别（默认：INFO）')
 def watermark(input, output, watermark, position, opacity, margin,
-              start_time, end_time, width, height, log_level):
+              start_time, end_time, width, height, backend, smart_render, segments, log_level):
     """向视频添加图片水印"""
     # 设置日志级别
     logger.setLevel(getattr(logging, log_level))
@@ -111,10 +157,16 @@ def watermark(input, output, watermark, position, opacity, margin,
         click.echo(f'  水印: {watermark}')
         click.echo(f'  位置: {position}')
         click.echo(f'  透明度: {opacity}')
+        click.echo(f'  后端: {backend}')
+        if smart_render:
+            click.echo(f'  模式: 智能部分重编码')
+        if segments and segments > 1:
+            click.echo(f'  分段并行: {segments} 段')
         click.echo(f'  输出: {output}')
 
         logger.info(f"位置: {position}")
         logger.info(f"透明度: {opacity}")
+        logger.info(f"处理后端: {backend}")
         logger.info("开始调用处理函数...")
 
         # 调用水印函数
@@ -128,7 +180,10 @@ def watermark(input, output, watermark, position, opacity, margin,
             start_time=start_sec,
             end_time=end_sec,
             width=width,
-            height=height
+            height=height,
+            backend=backend,
+            smart_render=smart_render,
+            segments=segments
         )
 
         logger.info("处理完成")
@@ -158,7 +213,7 @@ def watermark(input, output, watermark, position, opacity, margin,
 @click.option('--color', type=str, default='white',
               help='文字颜色（默认：white，支持颜色名称或十六进制如#FF0000）')
 @click.option('--font', type=str, default=None,
-              help='字体文件路径（TTF格式）')
+              help='字体文件路径（TTF格式）或字体族名（见 fonts 命令），默认自动选择能渲染文字的系统字体')
 @click.option('--opacity', type=click.FloatRange(0.0, 1.0), default=0.9,
               help='文字透明度 0.0-1.0（默认：0.9）')
 @click.option('--stroke-width', type=int, default=1,
@@ -171,10 +226,15 @@ def watermark(input, output, watermark, position, opacity, margin,
               help='水印结束时间（秒或HH:MM:SS，默认：视频结束）')
 @click.option('--vertical-margin', type=int, default=10,
               help='上下垂直留空（像素，默认：10），避免字母上下延被截断')
+@click.option('--smart-render', is_flag=True,
+              help='仅重编码水印时间范围所在的GOP，其余部分直接流复制（需h264/yuv420p源）')
+@click.option('--segments', type=click.IntRange(1), default=None,
+              help='分段并行编码：在关键帧处把视频切为N段，由N个进程分别处理后无损拼接（适合长视频）')
 @click.option('--log-level', type=click.Choice(['DEBUG', 'INFO', 'WARNING', 'ERROR']),
               default='INFO', help='日志级别（默认：INFO）')
 def watermark_text(input, output, text, position, font_size, color, font,
-                   opacity, stroke_width, stroke_color, start_time, end_time, vertical_margin, log_level):
+                   opacity, stroke_width, stroke_color, start_time, end_time, vertical_margin,
+                   smart_render, segments, log_level):
     """向视频添加文字水印"""
     # 设置日志级别
     logger.setLevel(getattr(logging, log_level))
@@ -215,6 +275,10 @@ def watermark_text(input, output, text, position, font_size, color, font,
         click.echo(f'  位置: {position}')
         click.echo(f'  大小: {font_size}px')
         click.echo(f'  垂直留空: {vertical_margin}px')
+        if smart_render:
+            click.echo(f'  模式: 智能部分重编码')
+        if segments and segments > 1:
+            click.echo(f'  分段并行: {segments} 段')
         click.echo(f'  输出: {output}')
 
         logger.info(f"位置: {position}")
@@ -239,7 +303,9 @@ def watermark_text(input, output, text, position, font_size, color, font,
             stroke_color=stroke_color,
             start_time=start_sec,
             end_time=end_sec,
-            margin=vertical_margin
+            margin=vertical_margin,
+            smart_render=smart_render,
+            segments=segments
         )
 
         logger.info("处理完成")
@@ -284,7 +350,7 @@ def watermark_text(input, output, text, position, font_size, color, font,
 @click.option('--color', type=str, default='white',
               help='文字颜色（默认：white，支持颜色名称或十六进制如#FF0000）')
 @click.option('--font', type=str, default=None,
-              help='字体文件路径（TTF格式）')
+              help='字体文件路径（TTF格式）或字体族名（见 fonts 命令），默认自动选择能渲染文字的系统字体')
 @click.option('--text-opacity', type=click.FloatRange(0.0, 1.0), default=0.9,
               help='文字透明度 0.0-1.0（默认：0.9）')
 @click.option('--stroke-width', type=int, default=1,
@@ -299,17 +365,21 @@ def watermark_text(input, output, text, position, font_size, color, font,
               help='合并布局（horizontal: 水平排列，vertical: 垂直排列）')
 @click.option('--combine-spacing', type=int, default=10,
               help='合并时Logo和文字之间的间距（像素，默认：10）')
+@click.option('--smart-render', is_flag=True,
+              help='仅重编码水印时间范围所在的GOP，其余部分直接流复制（需h264/yuv420p源）')
 @click.option('--start-time', '-s', type=str, default='0',
               help='水印开始时间（秒或HH:MM:SS，默认：0）')
 @click.option('--end-time', '-e', type=str, default=None,
               help='水印结束时间（秒或HH:MM:SS，默认：视频结束）')
+@click.option('--segments', type=click.IntRange(1), default=None,
+              help='分段并行编码：在关键帧处把视频切为N段，由N个进程分别处理后无损拼接（适合长视频）')
 @click.option('--log-level', type=click.Choice(['DEBUG', 'INFO', 'WARNING', 'ERROR']),
               default='INFO', help='日志级别（默认：INFO）')
 def watermark_combo(input, output, watermark, logo_position, logo_opacity, logo_margin,
                     logo_width, logo_height, logo_scale_factor, text, text_position,
                     font_size, color, font, text_opacity, stroke_width, stroke_color,
                     vertical_margin, combine_mode, combine_layout, combine_spacing,
-                    start_time, end_time, log_level):
+                    start_time, end_time, smart_render, segments, log_level):
     """向视频添加组合水印（Logo + 文字）"""
     # 设置日志级别
     logger.setLevel(getattr(logging, log_level))
@@ -380,6 +450,10 @@ def watermark_combo(input, output, watermark, logo_position, logo_opacity, logo_
             click.echo(f'  合并模式: 启用（Logo和文字合并为一张图片）')
             click.echo(f'  合并布局: {combine_layout}')
             click.echo(f'  合并间距: {combine_spacing}px')
+        if smart_render:
+            click.echo(f'  模式: 智能部分重编码')
+        if segments and segments > 1:
+            click.echo(f'  分段并行: {segments} 段')
 
         logger.info(f"开始调用处理函数...")
 
@@ -407,7 +481,9 @@ def watermark_combo(input, output, watermark, logo_position, logo_opacity, logo_
             combine_layout=combine_layout,
             combine_spacing=combine_spacing,
             start_time=start_sec,
-            end_time=end_sec
+            end_time=end_sec,
+            smart_render=smart_render,
+            segments=segments
         )
 
         logger.info("处理完成")
@@ -422,37 +498,152 @@ def watermark_combo(input, output, watermark, logo_position, logo_opacity, logo_
         logger.info("=" * 60)
 
 
+@cli.command()
+@click.option('--input', '-i', required=True, type=click.Path(exists=True),
+              help='输入视频文件路径')
+@click.option('--output', '-o', required=True, type=click.Path(),
+              help='输出视频文件路径')
+@click.option('--text', '-t', type=str, default='{timecode}',
+              help='文字模板（默认：{timecode}），可用字段 {timecode} {frame} {time} {seconds} '
+                   '{clock:%Y-%m-%d %H:%M:%S}')
+@click.option('--position', '-p', default='bottom-right',
+              type=click.Choice(list(POSITIONS.keys()), case_sensitive=False),
+              help='水印位置（默认：bottom-right）')
+@click.option('--font-size', type=int, default=24,
+              help='字体大小（默认：24）')
+@click.option('--color', type=str, default='white',
+              help='文字颜色（默认：white，支持颜色名称或十六进制如#FF0000）')
+@click.option('--font', type=str, default=None,
+              help='字体文件路径（TTF格式）或字体族名（见 fonts 命令），默认自动选择')
+@click.option('--opacity', type=click.FloatRange(0.0, 1.0), default=0.9,
+              help='文字透明度 0.0-1.0（默认：0.9）')
+@click.option('--stroke-width', type=int, default=1,
+              help='描边宽度（默认：1，0表示无描边）')
+@click.option('--stroke-color', type=str, default='black',
+              help='描边颜色（默认：black）')
+@click.option('--start-time', '-s', type=str, default='0',
+              help='水印开始时间（秒或HH:MM:SS，默认：0）')
+@click.option('--end-time', '-e', type=str, default=None,
+              help='水印结束时间（秒或HH:MM:SS，默认：视频结束）')
+@click.option('--margin', type=int, default=15,
+              help='边距（像素，默认：15）')
+@click.option('--clock-start', type=click.DateTime(['%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S']),
+              default=None, help='{clock} 字段在视频开始时刻的时间（默认：当前时间）')
+@click.option('--log-level', type=click.Choice(['DEBUG', 'INFO', 'WARNING', 'ERROR']),
+              default='INFO', help='日志级别（默认：INFO）')
+def watermark_dynamic(input, output, text, position, font_size, color, font, opacity,
+                      stroke_width, stroke_color, start_time, end_time, margin, clock_start,
+                      log_level):
+    """向视频添加动态文字水印（时间码、帧号、时钟等逐帧变化的文字）"""
+    logger.setLevel(getattr(logging, log_level))
+    logger.info("=" * 60)
+    logger.info("开始处理：动态文字水印")
+    logger.info(f"输入文件: {input}")
+    logger.info(f"文字模板: {text}")
+    logger.info(f"输出文件: {output}")
+
+    try:
+        position_h, position_v = POSITIONS[position]
+        start_sec = _time_str_to_seconds(start_time)
+        end_sec = _time_str_to_seconds(end_time) if end_time else None
+        logger.debug(f"时间范围: {start_sec}s - {end_sec}s")
+
+        click.echo(f'正在添加动态文字水印到视频...')
+        click.echo(f'  输入: {input}')
+        click.echo(f'  模板: {text}')
+        click.echo(f'  位置: {position}')
+        click.echo(f'  大小: {font_size}px')
+        click.echo(f'  输出: {output}')
+
+        add_dynamic_text_watermark(
+            video_path=input,
+            template=text,
+            output_path=output,
+            position=(position_h, position_v),
+            font_size=font_size,
+            color=color,
+            font_path=font,
+            opacity=opacity,
+            stroke_width=stroke_width,
+            stroke_color=stroke_color,
+            start_time=start_sec,
+            end_time=end_sec,
+            margin=margin,
+            clock_start=clock_start
+        )
+
+        logger.info("处理完成")
+        click.echo(f'✅ 动态文字水印添加成功: {output}')
+
+    except Exception as e:
+        error_msg = f'处理失败: {str(e)}'
+        logger.exception(error_msg)
+        click.echo(f'❌ 错误: {str(e)}', err=True)
+        sys.exit(1)
+    finally:
+        logger.info("=" * 60)
+
+
 @cli.command()
 @click.option('--main', '-m', required=True, type=click.Path(exists=True),
               help='主视频文件路径')
-@click.option('--insert', '-i', required=True, type=click.Path(exists=True),
-              help='要插入的视频文件路径')
+@click.option('--insert', '-i', 'inserts', required=True, multiple=True, type=click.Path(exists=True),
+              help='要插入的视频文件路径（可重复，与 --position 按顺序一一对应）')
 @click.option('--output', '-o', required=True, type=click.Path(),
               help='输出视频文件路径')
-@click.option('--position', '-p', type=str, required=True,
-              help='插入位置（秒或HH:MM:SS）')
-@click.option('--audio-mode', type=click.Choice(AUDIO_MODES), default='keep',
-              help='音频处理方式：keep（保留主音频）、replace（使用插入音频）、' +
-                   'mix（混合音频）、mute（静音）')
+@click.option('--position', '-p', 'positions', type=str, required=True, multiple=True,
+              help='插入位置（秒或HH:MM:SS，可重复）')
+@click.option('--audio-mode', 'audio_modes', type=click.Choice(AUDIO_MODES), multiple=True,
+              help='音频处理方式：keep（保留主音频，默认）、replace（使用插入音频）、' +
+                   'mix（混合音频）、mute（静音）；只给一次时用于全部插入项，否则与 --insert 一一对应')
 @click.option('--crossfade', type=click.FloatRange(0.0, 5.0), default=0.0,
               help='交叉淡入淡出时长（秒）')
 @click.option('--seamless', is_flag=True, default=True,
               help='无缝插入模式（无交叉淡入淡出，直接拼接）[默认启用]')
+@click.option('--stream-copy/--no-stream-copy', default=True,
+              help='编码参数一致时使用流复制快速插入，只重编码插入点所在的GOP [默认启用]')
+@click.option('--insert-cache/--no-insert-cache', default=False,
+              help='插入视频编码参数与主视频不一致时，转码为主视频的参数并缓存，之后同类主视频直接流复制'
+                   '（缓存目录 ~/.cache/video_watermark/inserts，可用 VIDEO_WATERMARK_INSERT_CACHE_DIR 指定，'
+                   '上限 2GB）[默认关闭]')
+@click.option('--segments', type=click.IntRange(1), default=None,
+              help='无法流复制时分段并行重编码：主视频切为N段，与插入视频由多个进程同时编码后无损拼接')
+@click.option('--snap', type=click.Choice(SNAP_MODES), default='none',
+              help='插入位置吸附：keyframe（最近的关键帧，可无损切分）、'
+                   'scene（附近的场景切换处）、none（不调整，默认）')
+@click.option('--snap-window', type=click.FloatRange(0.1, 30.0), default=2.0,
+              help='场景吸附的搜索半径（秒，默认：2）')
 @click.option('--log-level', type=click.Choice(['DEBUG', 'INFO', 'WARNING', 'ERROR']),
               default='INFO', help='日志级别（默认：INFO）')
-def insert(main, insert, output, position, audio_mode, crossfade, seamless, log_level):
-    """将视频插入到主视频的指定位置"""
+def insert(main, inserts, output, positions, audio_modes, crossfade, seamless, stream_copy,
+           insert_cache, segments, snap, snap_window, log_level):
+    """将视频插入到主视频的指定位置
+
+    多次指定 -i/-p 可一次插入多个视频（只编码一遍），例如：
+    -i intro.mp4 -p 0 -i ad.mp4 -p 00:05:00 -i outro.mp4 -p 00:10:00
+    """
     # 设置日志级别
     logger.setLevel(getattr(logging, log_level))
     logger.info("=" * 60)
     logger.info("开始处理：插入视频")
     logger.info(f"主视频: {main}")
-    logger.info(f"插入视频: {insert}")
+    logger.info(f"插入视频: {', '.join(inserts)}")
     logger.info(f"输出文件: {output}")
 
     try:
+        # 检查插入项参数
+        if len(positions) != len(inserts):
+            raise click.UsageError(f'--insert 与 --position 的数量必须一致'
+                                   f'（{len(inserts)} 个视频，{len(positions)} 个位置）')
+        if not audio_modes:
+            audio_modes = ('keep',)
+        if len(audio_modes) == 1:
+            audio_modes = audio_modes * len(inserts)
+        elif len(audio_modes) != len(inserts):
+            raise click.UsageError('--audio-mode 只能给一次，或与 --insert 的数量一致')
+
         # 检查输入文件
-        for f in [main, insert]:
+        for f in (main,) + inserts:
             if not os.path.isfile(f):
                 error_msg = f'错误：文件不存在: {f}'
                 logger.error(error_msg)
@@ -462,14 +653,20 @@ def insert(main, insert, output, position, audio_mode, crossfade, seamless, log_
         logger.debug("输入文件验证通过")
 
         # 转换插入位置
-        insert_pos = _time_str_to_seconds(position)
-        logger.debug(f"插入位置: {position} -> {insert_pos}秒")
+        items = []
+        for path, position, audio_mode in zip(inserts, positions, audio_modes):
+            insert_pos = _time_str_to_seconds(position)
+            logger.debug(f"插入位置: {position} -> {insert_pos}秒")
+            items.append({'path': path, 'position': insert_pos, 'audio_mode': audio_mode})
 
         click.echo(f'正在插入视频...')
         click.echo(f'  主视频: {main}')
-        click.echo(f'  插入视频: {insert}')
-        click.echo(f'  位置: {position}（{insert_pos}秒）')
-        click.echo(f'  音频模式: {audio_mode}')
+        for item, position in zip(items, positions):
+            click.echo(f"  插入视频: {item['path']}")
+            click.echo(f"    位置: {position}（{item['position']}秒）")
+            click.echo(f"    音频模式: {item['audio_mode']}")
+        if snap != 'none':
+            click.echo(f'  位置吸附: {snap}')
         if not seamless:
             click.echo(f'  模式: 有缝插入（带过渡效果）')
         elif crossfade > 0:
@@ -478,25 +675,371 @@ def insert(main, insert, output, position, audio_mode, crossfade, seamless, log_
             click.echo(f'  模式: 无缝插入（直接拼接）')
         click.echo(f'  输出: {output}')
 
-        logger.info(f"插入位置: {insert_pos}秒")
-        logger.info(f"音频模式: {audio_mode}")
+        for item in items:
+            logger.info(f"插入位置: {item['position']}秒，音频模式: {item['audio_mode']}")
         if crossfade > 0:
             logger.info(f"交叉淡入淡出: {crossfade}秒")
 
-        # 调用视频插入函数
-        insert_video(
+        # 调用视频插入函数（全部插入项一次完成）
+        insert_videos(
             main_video_path=main,
-            insert_video_path=insert,
+            inserts=items,
             output_path=output,
-            insert_position=insert_pos,
-            audio_mode=audio_mode,
             crossfade_duration=crossfade,
-            seamless=seamless
+            seamless=seamless,
+            stream_copy=stream_copy,
+            segments=segments,
+            snap=snap,
+            snap_window=snap_window,
+            cache_inserts=insert_cache
         )
 
         logger.info("处理完成")
         click.echo(f'✅ 视频插入成功: {output}')
 
+    except click.UsageError:
+        raise
+    except Exception as e:
+        error_msg = f'处理失败: {str(e)}'
+        logger.exception(error_msg)
+        click.echo(f'❌ 错误: {str(e)}', err=True)
+        sys.exit(1)
+    finally:
+        logger.info("=" * 60)
+
+
+@cli.command()
+@click.option('--input', '-i', required=True, type=str,
+              help='输入文件夹或通配符（如 "videos/*.mp4"）')
+@click.option('--output-dir', '-o', type=click.Path(file_okay=False), default=None,
+              help='输出目录（默认：<输入文件夹>_wmarked）')
+@click.option('--task', required=True, type=click.Choice(list(BATCH_TASKS.keys())),
+              help='处理任务：watermark、watermark-text、watermark-combo、insert')
+@click.option('--jobs', '-j', type=click.IntRange(1), default=None,
+              help='并行任务数（默认：CPU核心数），编码线程按任务数平均分配')
+@click.option('--watermark', '-w', type=click.Path(exists=True), default=None,
+              help='水印图片/Logo路径（watermark、watermark-combo）')
+@click.option('--text', '-t', type=str, default=None,
+              help='水印文字（watermark-text、watermark-combo）')
+@click.option('--position', '-p', default='bottom-right',
+              type=click.Choice(list(POSITIONS.keys()), case_sensitive=False),
+              help='水印/文字位置（默认：bottom-right）')
+@click.option('--logo-position', default='top-left',
+              type=click.Choice(list(POSITIONS.keys()), case_sensitive=False),
+              help='组合水印的Logo位置（默认：top-left）')
+@click.option('--opacity', type=click.FloatRange(0.0, 1.0), default=None,
+              help='透明度 0.0-1.0（默认：图片0.8，文字0.9）')
+@click.option('--margin', type=int, default=10,
+              help='水印边距（像素，默认：10）')
+@click.option('--width', type=int, default=None,
+              help='水印宽度（像素，保持宽高比）')
+@click.option('--height', type=int, default=None,
+              help='水印高度（像素，保持宽高比）')
+@click.option('--font-size', type=int, default=24,
+              help='字体大小（默认：24）')
+@click.option('--color', type=str, default='white',
+              help='文字颜色（默认：white）')
+@click.option('--font', type=str, default=None,
+              help='字体文件路径（可选）')
+@click.option('--stroke-width', type=int, default=1,
+              help='描边宽度（默认：1）')
+@click.option('--stroke-color', type=str, default='black',
+              help='描边颜色（默认：black）')
+@click.option('--start-time', '-s', type=str, default='0',
+              help='水印开始时间（秒或HH:MM:SS，默认：0）')
+@click.option('--end-time', '-e', type=str, default=None,
+              help='水印结束时间（秒或HH:MM:SS，默认：视频结束）')
+@click.option('--backend', type=click.Choice(BACKENDS), default='moviepy',
+              help='图片水印处理后端（默认：moviepy）')
+@click.option('--smart-render', is_flag=True,
+              help='仅重编码水印时间范围所在的GOP（水印任务）')
+@click.option('--insert-video', 'insert_path', type=click.Path(exists=True), default=None,
+              help='要插入的视频文件路径（insert）')
+@click.option('--insert-position', type=str, default=None,
+              help='插入位置（秒或HH:MM:SS，insert）')
+@click.option('--audio-mode', type=click.Choice(AUDIO_MODES), default='keep',
+              help='插入视频的音频处理方式（默认：keep）')
+@click.option('--preflight-only', is_flag=True,
+              help='只做预检（探测所有文件、检查参数和磁盘空间），不处理')
+@click.option('--log-level', type=click.Choice(['DEBUG', 'INFO', 'WARNING', 'ERROR']),
+              default='INFO', help='日志级别（默认：INFO）')
+def batch(input, output_dir, task, jobs, watermark, text, position, logo_position, opacity,
+          margin, width, height, font_size, color, font, stroke_width, stroke_color,
+          start_time, end_time, backend, smart_render, insert_path, insert_position,
+          audio_mode, preflight_only, log_level):
+    """批量并行处理文件夹中的视频"""
+    # 设置日志级别
+    logger.setLevel(getattr(logging, log_level))
+    logger.info("=" * 60)
+    logger.info(f"开始处理：批量{task}")
+    logger.info(f"输入: {input}")
+
+    try:
+        videos = collect_videos(input)
+        if not videos:
+            error_msg = f'错误：未找到视频文件: {input}'
+            logger.error(error_msg)
+            click.echo(f'{error_msg}', err=True)
+            sys.exit(1)
+
+        # 检查任务所需参数
+        task_type = BATCH_TASKS[task]
+        missing = []
+        if task_type == 'watermark' and not watermark:
+            missing.append('--watermark')
+        if task_type in ('watermark_text', 'watermark_combo') and not text:
+            missing.append('--text')
+        if task_type == 'insert':
+            if not insert_path:
+                missing.append('--insert-video')
+            if insert_position is None:
+                missing.append('--insert-position')
+        if missing:
+            error_msg = f'错误：任务 {task} 缺少参数: {", ".join(missing)}'
+            logger.error(error_msg)
+            click.echo(f'{error_msg}', err=True)
+            sys.exit(1)
+
+        start_sec = _time_str_to_seconds(start_time)
+        end_sec = _time_str_to_seconds(end_time) if end_time else None
+        position_tuple = POSITIONS[position]
+
+        if task_type == 'watermark':
+            params = {
+                'watermark_path': watermark,
+                'position': position_tuple,
+                'opacity': 0.8 if opacity is None else opacity,
+                'margin': margin,
+                'start_time': start_sec,
+                'end_time': end_sec,
+                'width': width,
+                'height': height,
+                'backend': backend,
+                'smart_render': smart_render,
+            }
+        elif task_type == 'watermark_text':
+            params = {
+                'text': text,
+                'position': position_tuple,
+                'font_size': font_size,
+                'color': color,
+                'font_path': font,
+                'opacity': 0.9 if opacity is None else opacity,
+                'stroke_width': stroke_width,
+                'stroke_color': stroke_color,
+                'start_time': start_sec,
+                'end_time': end_sec,
+                'smart_render': smart_render,
+            }
+        elif task_type == 'watermark_combo':
+            params = {
+                'text': text,
+                'watermark_path': watermark,
+                'logo_position': POSITIONS[logo_position],
+                'logo_margin': margin,
+                'logo_width': width,
+                'logo_height': height,
+                'text_position': position_tuple,
+                'font_size': font_size,
+                'color': color,
+                'font_path': font,
+                'text_opacity': 0.9 if opacity is None else opacity,
+                'stroke_width': stroke_width,
+                'stroke_color': stroke_color,
+                'start_time': start_sec,
+                'end_time': end_sec,
+                'smart_render': smart_render,
+            }
+        else:
+            params = {
+                'insert_video_path': insert_path,
+                'insert_position': _time_str_to_seconds(insert_position),
+                'audio_mode': audio_mode,
+            }
+
+        output_dir = output_dir or default_output_dir(input)
+
+        # 预检：编码开始前并发探测所有文件，跳过不适用的文件
+        preflight = preflight_batch(task_type, videos, output_dir, params)
+        click.echo(f'预检完成：{len(preflight["ready"])}/{len(videos)} 个文件通过')
+        for item in preflight['rejected']:
+            logger.warning(f"预检未通过: {item['input']}: {item['error']}")
+            click.echo(f'  ⚠️ 跳过 {os.path.basename(item["input"])}: {item["error"]}', err=True)
+        click.echo(f'  预计输出: {preflight["estimated_bytes"] / (1024 * 1024):.1f} MB，'
+                   f'可用空间: {preflight["free_bytes"] / (1024 * 1024):.1f} MB')
+        logger.info(f"预检结果: 通过 {len(preflight['ready'])}，未通过 {len(preflight['rejected'])}，"
+                    f"预计输出 {preflight['estimated_bytes']} 字节")
+
+        if not preflight['enough_space']:
+            error_msg = '错误：输出目录所在磁盘空间不足'
+            logger.error(error_msg)
+            click.echo(f'{error_msg}', err=True)
+            sys.exit(1)
+        if preflight_only:
+            sys.exit(1 if preflight['rejected'] else 0)
+        if not preflight['ready']:
+            error_msg = '错误：没有可处理的视频文件'
+            logger.error(error_msg)
+            click.echo(f'{error_msg}', err=True)
+            sys.exit(1)
+
+        videos = preflight['ready']
+        jobs = max(1, min(jobs or os.cpu_count() or 1, len(videos)))
+
+        click.echo(f'正在批量处理视频...')
+        click.echo(f'  任务: {task}')
+        click.echo(f'  文件数: {len(videos)}')
+        click.echo(f'  并行任务数: {jobs}')
+        click.echo(f'  输出目录: {output_dir}')
+
+        logger.info(f"文件数: {len(videos)}")
+        logger.info(f"并行任务数: {jobs}")
+        logger.debug(f"参数: {params}")
+
+        def report(result):
+            name = os.path.basename(result['input'])
+            if result['success']:
+                logger.info(f"完成: {name}（{result['elapsed']:.1f}秒）")
+                click.echo(f'  ✅ {name}（{result["elapsed"]:.1f}秒）')
+            else:
+                logger.error(f"失败: {name}: {result['error']}")
+                click.echo(f'  ❌ {name}: {result["error"]}', err=True)
+
+        wall_start = time.perf_counter()
+        results = run_batch(task_type, videos, output_dir, params, jobs=jobs, on_result=report)
+        summary = summarize_results(results, time.perf_counter() - wall_start)
+
+        click.echo('')
+        click.echo(f'批量处理完成：成功 {summary["succeeded"]}/{summary["total"]}，'
+                   f'失败 {summary["failed"]}')
+        click.echo(f'  总用时: {summary["wall_time"]:.1f}秒')
+        click.echo(f'  吞吐量: {summary["videos_per_minute"]:.2f} 个/分钟，'
+                   f'{summary["megabytes_per_second"]:.2f} MB/秒')
+        click.echo(f'  视频总时长: {summary["media_duration"]:.1f}秒'
+                   f'（{summary["realtime_factor"]:.2f}x 实时）')
+        logger.info(f"批量处理完成: {summary}")
+
+        if summary['failed'] or preflight['rejected']:
+            sys.exit(1)
+
+    except Exception as e:
+        error_msg = f'处理失败: {str(e)}'
+        logger.exception(error_msg)
+        click.echo(f'❌ 错误: {str(e)}', err=True)
+        sys.exit(1)
+    finally:
+        logger.info("=" * 60)
+
+
+@cli.command()
+@click.option('--input', '-i', required=True, type=click.Path(exists=True),
+              help='输入视频文件路径')
+@click.option('--recipients', '-r', required=True, type=click.Path(exists=True),
+              help='接收者列表JSON文件：[{"output_path": "alice.mp4", "text": "Alice"}, ...]')
+@click.option('--output-dir', '-o', type=click.Path(file_okay=False), default=None,
+              help='输出目录（接收者 output_path 为相对路径时相对于此目录，默认：当前目录）')
+@click.option('--max-encoders', type=click.IntRange(1), default=None,
+              help='同时运行的编码器数量（默认：CPU核心数），超出时分批处理')
+@click.option('--position', '-p', default='bottom-right',
+              type=click.Choice(list(POSITIONS.keys()), case_sensitive=False),
+              help='默认文字位置（默认：bottom-right）')
+@click.option('--font-size', type=int, default=24,
+              help='默认字体大小（默认：24）')
+@click.option('--color', type=str, default='white',
+              help='默认文字颜色（默认：white）')
+@click.option('--font', type=str, default=None,
+              help='默认字体文件路径（可选）')
+@click.option('--opacity', type=click.FloatRange(0.0, 1.0), default=0.9,
+              help='默认文字透明度 0.0-1.0（默认：0.9）')
+@click.option('--stroke-width', type=int, default=1,
+              help='默认描边宽度（默认：1）')
+@click.option('--stroke-color', type=str, default='black',
+              help='默认描边颜色（默认：black）')
+@click.option('--vertical-margin', type=int, default=10,
+              help='默认文字边距（像素，默认：10）')
+@click.option('--watermark', '-w', type=click.Path(exists=True), default=None,
+              help='默认Logo图片路径（可选）')
+@click.option('--logo-position', default='top-left',
+              type=click.Choice(list(POSITIONS.keys()), case_sensitive=False),
+              help='默认Logo位置（默认：top-left）')
+@click.option('--logo-opacity', type=click.FloatRange(0.0, 1.0), default=0.8,
+              help='默认Logo透明度 0.0-1.0（默认：0.8）')
+@click.option('--start-time', '-s', type=str, default='0',
+              help='水印开始时间（秒或HH:MM:SS，默认：0）')
+@click.option('--end-time', '-e', type=str, default=None,
+              help='水印结束时间（秒或HH:MM:SS，默认：视频结束）')
+@click.option('--log-level', type=click.Choice(['DEBUG', 'INFO', 'WARNING', 'ERROR']),
+              default='INFO', help='日志级别（默认：INFO）')
+def personalize(input, recipients, output_dir, max_encoders, position, font_size, color, font,
+                opacity, stroke_width, stroke_color, vertical_margin, watermark, logo_position,
+                logo_opacity, start_time, end_time, log_level):
+    """为多个接收者生成个性化水印视频（源视频只解码一次）"""
+    # 设置日志级别
+    logger.setLevel(getattr(logging, log_level))
+    logger.info("=" * 60)
+    logger.info("开始处理：个性化水印")
+    logger.info(f"输入文件: {input}")
+    logger.info(f"接收者列表: {recipients}")
+
+    try:
+        with open(recipients, 'r', encoding='utf-8') as f:
+            entries = json.load(f)
+        if not isinstance(entries, list) or not entries:
+            error_msg = f'错误：接收者列表必须是非空的JSON数组: {recipients}'
+            logger.error(error_msg)
+            click.echo(f'{error_msg}', err=True)
+            sys.exit(1)
+
+        defaults = {
+            'position': POSITIONS[position],
+            'font_size': font_size,
+            'color': color,
+            'font_path': font,
+            'opacity': opacity,
+            'stroke_width': stroke_width,
+            'stroke_color': stroke_color,
+            'margin': vertical_margin,
+            'watermark_path': watermark,
+            'logo_position': POSITIONS[logo_position],
+            'logo_opacity': logo_opacity,
+            'start_time': _time_str_to_seconds(start_time),
+            'end_time': _time_str_to_seconds(end_time) if end_time else None,
+        }
+
+        jobs = []
+        for entry in entries:
+            job = dict(defaults)
+            job.update(entry)
+            # 接收者中的位置可以使用命令行的位置名称
+            for key in ('position', 'logo_position'):
+                if isinstance(job[key], str):
+                    job[key] = POSITIONS[job[key]]
+            if output_dir and job.get('output_path') and not os.path.isabs(job['output_path']):
+                job['output_path'] = os.path.join(output_dir, job['output_path'])
+            jobs.append(job)
+
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+
+        click.echo(f'正在生成个性化水印视频...')
+        click.echo(f'  输入: {input}')
+        click.echo(f'  接收者数量: {len(jobs)}')
+        click.echo(f'  同时编码: {max_encoders or "自动"}')
+
+        logger.info(f"接收者数量: {len(jobs)}")
+        logger.debug(f"接收者参数: {jobs}")
+
+        outputs = add_personalized_watermarks(
+            video_path=input,
+            recipients=jobs,
+            max_encoders=max_encoders
+        )
+
+        logger.info("处理完成")
+        click.echo(f'✅ 个性化水印生成成功: {len(outputs)} 个文件')
+        for path in outputs:
+            click.echo(f'  {path}')
+
     except Exception as e:
         error_msg = f'处理失败: {str(e)}'
         logger.exception(error_msg)
@@ -515,6 +1058,26 @@ def positions():
         click.echo(f'  {pos_name:15s} - 水平: {h:8s}  垂直: {v}')
 
 
+@cli.command()
+@click.option('--text', '-t', type=str, default=None,
+              help='只列出能完整渲染这段文字的字体（如中文字幕）')
+@click.option('--rebuild', is_flag=True,
+              help='忽略缓存，重新扫描系统字体目录')
+def fonts(text, rebuild):
+    """列出系统字体（--font 参数可直接使用字体族名）"""
+    index = get_font_index(refresh=rebuild)
+
+    found = index.fonts_for_text(text) if text else index.fonts
+    if not found:
+        click.echo('未找到可用字体' + (f'（文字: {text}）' if text else ''))
+        return
+
+    click.echo(f'可用字体（共 {len(found)} 个）：')
+    click.echo('')
+    for font in found:
+        click.echo(f'  {font.family} [{font.style}] - {font.path}')
+
+
 def _time_str_to_seconds(time_str):
     """将时间字符串转换为秒数
     
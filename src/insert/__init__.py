@@ -1,5 +1,5 @@
 """Video insertion module."""
 
-from .video_insert import insert_video
+from .video_insert import insert_video, insert_videos
 
-__all__ = ['insert_video']
+__all__ = ['insert_video', 'insert_videos']
@@ -0,0 +1,226 @@
+"""插入视频转码缓存：把插入视频预先转码为主视频的编码参数，之后插入同类主视频时直接流复制
+
+同一个片头/广告插入大量主视频时，每种目标参数（分辨率、帧率、像素格式、时间基、音频布局）
+只转码一次，缓存文件可被多个进程、多次命令复用。
+"""
+
+import hashlib
+import os
+import tempfile
+from fractions import Fraction
+from typing import Optional
+
+from ..media.ffmpeg_tools import run_ffmpeg
+from ..media.segments import SMART_RENDER_CODECS, SMART_RENDER_PIX_FMTS
+
+# 缓存格式版本，转码参数变化时递增以使旧缓存失效
+CLIP_CACHE_VERSION = 1
+
+# 默认容量上限（字节）
+DEFAULT_CLIP_CACHE_BYTES = 2 * 1024 * 1024 * 1024
+
+# 指定缓存目录的环境变量，设为空字符串时禁用磁盘缓存
+CLIP_CACHE_DIR_ENV = 'VIDEO_WATERMARK_INSERT_CACHE_DIR'
+
+
+def default_clip_cache_dir() -> Optional[str]:
+    """默认缓存目录：环境变量 VIDEO_WATERMARK_INSERT_CACHE_DIR，否则在用户缓存目录下
+
+    Returns:
+        缓存目录路径；环境变量设为空字符串时返回 None（禁用缓存）
+    """
+    if CLIP_CACHE_DIR_ENV in os.environ:
+        return os.environ[CLIP_CACHE_DIR_ENV] or None
+    from ..watermark.asset_cache import user_cache_dir
+    return os.path.join(user_cache_dir(), 'inserts')
+
+
+def target_profile(main_stream: Optional[dict], main_audio: Optional[dict]) -> Optional[tuple]:
+    """由主视频的流信息得到插入视频需要转换成的目标参数
+
+    Returns:
+        (编码格式, 宽, 高, 像素格式, 时间基, 帧率, 采样率, 声道数, 声道布局)；
+        主视频不是 h264/yuv420p（转码结果无法与之流复制拼接）或时间基无法复现时返回 None
+    """
+    if main_stream is None:
+        return None
+    if (main_stream.get('codec_name') not in SMART_RENDER_CODECS or
+            main_stream.get('pix_fmt') not in SMART_RENDER_PIX_FMTS):
+        return None
+    try:
+        time_base = Fraction(main_stream.get('time_base'))
+    except (TypeError, ValueError, ZeroDivisionError):
+        return None
+    if time_base.numerator != 1 or not main_stream.get('r_frame_rate'):
+        return None
+
+    audio = main_audio or {}
+    return (
+        main_stream['codec_name'], int(main_stream['width']), int(main_stream['height']),
+        main_stream['pix_fmt'], main_stream['time_base'], main_stream['r_frame_rate'],
+        int(audio.get('sample_rate') or 0), int(audio.get('channels') or 0),
+        audio.get('channel_layout')
+    )
+
+
+def transcode_to_profile(insert_path: str, output_path: str, profile: tuple,
+                         threads: Optional[int] = None) -> str:
+    """把插入视频转码为目标参数（libx264 视频、AAC 音频），使其可与主视频流复制拼接"""
+    _, width, height, pix_fmt, time_base, frame_rate, sample_rate, channels, _ = profile
+
+    args = ['-i', insert_path, '-map', '0:v:0', '-map', '0:a:0?',
+            '-vf', f'scale={width}:{height},setsar=1,fps={frame_rate}',
+            '-c:v', 'libx264', '-preset', 'medium', '-pix_fmt', pix_fmt,
+            '-video_track_timescale', str(Fraction(time_base).denominator),
+            '-c:a', 'aac']
+    if sample_rate:
+        args += ['-ar', str(sample_rate)]
+    if channels:
+        args += ['-ac', str(channels)]
+    if threads:
+        args += ['-threads', str(threads)]
+    run_ffmpeg(args + [output_path])
+    return output_path
+
+
+class InsertClipCache:
+    """插入视频转码结果的磁盘缓存
+
+    键为插入视频内容哈希与目标参数的哈希，值为转码后的 mp4 文件。写入先写临时文件再原子替换，
+    多个工作进程可同时读写；总大小超过上限时按最近使用时间（读取时更新文件修改时间）淘汰。
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, max_bytes: int = DEFAULT_CLIP_CACHE_BYTES):
+        """
+        Args:
+            cache_dir: 缓存目录，None 表示使用 default_clip_cache_dir()
+            max_bytes: 缓存总大小上限（字节）
+        """
+        self._cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    @property
+    def cache_dir(self) -> Optional[str]:
+        # 默认目录在首次使用时确定（避免导入时依赖 watermark 包）
+        if self._cache_dir is None:
+            self._cache_dir = default_clip_cache_dir() or ''
+        return self._cache_dir
+
+    @staticmethod
+    def make_key(insert_path: str, profile: tuple) -> str:
+        """由插入视频内容哈希和目标参数生成缓存键"""
+        from ..watermark.asset_cache import file_digest
+        payload = repr((CLIP_CACHE_VERSION, file_digest(insert_path), profile)).encode('utf-8')
+        return hashlib.sha256(payload).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f'{key}.mp4')
+
+    def get(self, key: str) -> Optional[str]:
+        """返回缓存文件路径，未命中时返回 None"""
+        if not self.cache_dir:
+            return None
+        path = self._path(key)
+        try:
+            # 更新修改时间作为最近使用时间
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def get_or_transcode(
+        self,
+        insert_path: str,
+        profile: tuple,
+        temp_dir: str,
+        threads: Optional[int] = None
+    ) -> str:
+        """获取插入视频按目标参数转码后的文件，未命中时转码并写入缓存
+
+        Args:
+            insert_path: 插入视频路径
+            profile: 目标参数（见 target_profile）
+            temp_dir: 缓存禁用或无法写入时的转码输出目录（由调用方清理）
+            threads: 转码线程数
+
+        Returns:
+            转码后的文件路径
+        """
+        if not self.cache_dir:
+            return _transcode_to_dir(insert_path, profile, temp_dir, threads)
+
+        key = self.make_key(insert_path, profile)
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp.mp4')
+            os.close(fd)
+        except OSError:
+            return _transcode_to_dir(insert_path, profile, temp_dir, threads)
+
+        try:
+            transcode_to_profile(insert_path, temp_path, profile, threads)
+            os.replace(temp_path, self._path(key))
+        except BaseException:
+            _remove_quietly(temp_path)
+            raise
+
+        self.evict(keep=key)
+        return self._path(key)
+
+    def evict(self, keep: Optional[str] = None) -> None:
+        """淘汰最久未使用的缓存文件，直到总大小不超过上限（keep 指定的条目不淘汰）"""
+        entries = []
+        total = 0
+        try:
+            with os.scandir(self.cache_dir) as it:
+                for entry in it:
+                    if not entry.name.endswith('.mp4') or entry.name.endswith('.tmp.mp4'):
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+                    total += stat.st_size
+        except FileNotFoundError:
+            return
+
+        entries.sort()
+        keep_path = self._path(keep) if keep else None
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if path != keep_path and _remove_quietly(path):
+                total -= size
+
+    def clear(self) -> None:
+        """删除全部缓存文件"""
+        if not self.cache_dir or not os.path.isdir(self.cache_dir):
+            return
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.mp4'):
+                _remove_quietly(os.path.join(self.cache_dir, name))
+
+
+def _transcode_to_dir(insert_path: str, profile: tuple, directory: str,
+                      threads: Optional[int] = None) -> str:
+    """不经缓存，转码到指定目录下的新文件"""
+    fd, output_path = tempfile.mkstemp(dir=directory, prefix='normalized_', suffix='.mp4')
+    os.close(fd)
+    return transcode_to_profile(insert_path, output_path, profile, threads)
+
+
+def _remove_quietly(path: str) -> bool:
+    """删除文件，失败时忽略；返回是否删除成功"""
+    try:
+        os.remove(path)
+        return True
+    except OSError:
+        return False
+
+
+insert_clip_cache = InsertClipCache()
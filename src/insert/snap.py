@@ -0,0 +1,145 @@
+"""插入点吸附：把插入位置移到最近的关键帧或场景切换处"""
+
+import math
+import subprocess
+from typing import Optional
+
+import numpy as np
+from moviepy.tools import cross_platform_popen_params
+
+from ..media.ffmpeg_tools import get_ffmpeg_binary
+from ..media.keyframes import load_keyframe_index
+from ..media.probe import probe_media
+
+# 可选的吸附方式
+SNAP_MODES = ['none', 'keyframe', 'scene']
+
+# 场景检测的缩略帧尺寸（只用于比较颜色分布）
+SCENE_FRAME_SIZE = (64, 36)
+
+# 场景检测的采样帧率：只比较每秒这么多帧（源帧率更低时取源帧率）
+SCENE_SAMPLE_FPS = 10
+
+# 每个颜色通道的直方图分箱数
+SCENE_HISTOGRAM_BINS = 16
+
+# 相邻帧直方图差异（0-1）超过此值视为场景切换
+SCENE_THRESHOLD = 0.3
+
+
+def snap_insert_position(
+    video_path: str,
+    position: float,
+    mode: str = 'none',
+    window: float = 2.0
+) -> float:
+    """按吸附方式调整插入位置
+
+    Args:
+        video_path: 主视频路径
+        position: 请求的插入位置（秒）
+        mode: 'none' 不调整；'keyframe' 移到最近的关键帧（可无损流复制切分）；
+              'scene' 移到 [position - window, position + window] 内最近的场景切换处
+        window: 场景检测的搜索半径（秒）
+
+    Returns:
+        调整后的插入位置；找不到吸附点时返回原位置
+    """
+    if mode not in SNAP_MODES:
+        raise ValueError(f"吸附方式必须是 {SNAP_MODES} 之一， got '{mode}'")
+
+    if mode == 'keyframe':
+        keyframe = load_keyframe_index(video_path).nearest(position)
+        return position if keyframe is None else keyframe
+    if mode == 'scene':
+        scene = find_scene_change(video_path, position, window)
+        return position if scene is None else scene
+    return position
+
+
+def find_scene_change(
+    video_path: str,
+    position: float,
+    window: float = 2.0,
+    threshold: float = SCENE_THRESHOLD
+) -> Optional[float]:
+    """在 position 附近查找最近的场景切换
+
+    只解码搜索窗口内的帧，由 ffmpeg 按 SCENE_SAMPLE_FPS 采样并缩小为 SCENE_FRAME_SIZE 后
+    比较相邻采样帧的颜色直方图；切换点的精度为采样间隔。
+
+    Returns:
+        切换后第一个采样帧的时间（秒，取整到源视频的帧）；窗口内没有场景切换时返回 None
+    """
+    info = probe_media(video_path)
+    start = max(0.0, position - window)
+    end = min(info.duration, position + window)
+    if end <= start or info.fps <= 0:
+        return None
+
+    rate = min(SCENE_SAMPLE_FPS, info.fps)
+    frames = _decode_thumbnails(video_path, start, end - start, rate)
+    if len(frames) < 2:
+        return None
+
+    differences = histogram_differences(frames)
+    # differences[i] 为第 i 个与第 i+1 个采样帧之间的差异，切换点为第 i+1 个采样帧
+    cuts = np.flatnonzero(differences > threshold) + 1
+    if len(cuts) == 0:
+        return None
+
+    # 定位后解码的第一帧是 start 之后帧网格上的第一帧，之后每 1 / rate 秒一个采样帧
+    first = math.ceil(start * info.fps - 1e-6) / info.fps
+    times = np.round((first + cuts / rate) * info.fps) / info.fps
+    return float(times[np.argmin(np.abs(times - position))])
+
+
+def histogram_differences(frames: np.ndarray, bins: int = SCENE_HISTOGRAM_BINS) -> np.ndarray:
+    """计算相邻帧颜色直方图的差异（每通道直方图的总变差距离取平均，范围 0-1）
+
+    Args:
+        frames: (N, H, W, 3) uint8 帧数组
+        bins: 每个通道的分箱数（须整除 256）
+
+    Returns:
+        长度为 N-1 的差异数组
+    """
+    count, height, width, channels = frames.shape
+    shift = int(np.log2(256 // bins))
+
+    # 把 (帧, 通道, 分箱) 展开为一维编号，一次 bincount 得到所有直方图
+    binned = (frames >> shift).astype(np.intp)
+    offsets = (np.arange(count)[:, None, None, None] * channels +
+               np.arange(channels)[None, None, None, :]) * bins
+    histograms = np.bincount((binned + offsets).ravel(), minlength=count * channels * bins)
+    histograms = histograms.reshape(count, channels, bins) / float(height * width)
+
+    return np.abs(np.diff(histograms, axis=0)).sum(axis=2).mean(axis=1) / 2
+
+
+def _decode_thumbnails(video_path: str, start: float, duration: float, rate: float) -> np.ndarray:
+    """按每秒 rate 帧采样 [start, start + duration) 内的帧，缩小为 SCENE_FRAME_SIZE（RGB）
+
+    先采样再缩放，未采样的帧不经过缩放和像素格式转换，也不写入管道。
+    """
+    width, height = SCENE_FRAME_SIZE
+    cmd = [
+        get_ffmpeg_binary(), '-v', 'error',
+        '-ss', f'{start:.6f}', '-t', f'{duration:.6f}', '-i', video_path,
+        '-map', '0:v:0', '-vf', f'fps={rate:g},scale={width}:{height}:flags=area',
+        '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-'
+    ]
+    popen_params = cross_platform_popen_params({
+        'stdout': subprocess.PIPE,
+        'stderr': subprocess.PIPE,
+        'stdin': subprocess.DEVNULL,
+    })
+    proc = subprocess.Popen(cmd, **popen_params)
+    stdout, stderr = proc.communicate()
+    if proc.returncode != 0:
+        error = stderr.decode('utf-8', errors='replace').strip()
+        raise RuntimeError(f'FFmpeg 执行失败（返回码 {proc.returncode}）: {error}')
+
+    frame_bytes = width * height * 3
+    count = len(stdout) // frame_bytes
+    return np.frombuffer(stdout[:count * frame_bytes], np.uint8).reshape(count, height, width, 3)
@@ -1,12 +1,37 @@
 """视频插入功能模块"""
 
 import os
-from typing import Optional
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
 
 import click
 from moviepy import VideoFileClip, CompositeVideoClip, concatenate_videoclips
 from moviepy import afx, vfx
 
+from ..media.ffmpeg_tools import run_ffmpeg
+from ..media.keyframes import KEYFRAME_TOLERANCE, load_keyframe_index
+from ..media.pipeline import render_pipelined
+from ..media.probe import probe_media
+from ..media.segments import (
+    SMART_RENDER_CODECS, SMART_RENDER_PIX_FMTS, concat_segments, encode_segment,
+    list_keyframes, plan_parallel_cuts, probe_streams, segments_match, split_at_keyframes,
+    video_streams_match
+)
+from .clip_cache import insert_clip_cache, target_profile
+from .snap import snap_insert_position
+
+# 插入视频的音频处理方式
+AUDIO_MODES = ['keep', 'replace', 'mix', 'mute']
+
+# 每个插入项可设置的参数及默认值（'path' 和 'position' 必须提供）
+INSERT_DEFAULTS = {
+    'path': None,
+    'position': None,
+    'audio_mode': 'keep',
+}
+
 
 def insert_video(
     main_video_path: str,
@@ -15,7 +40,13 @@ def insert_video(
     insert_position: float,
     audio_mode: str = 'keep',
     crossfade_duration: float = 0.0,
-    seamless: bool = True
+    seamless: bool = True,
+    stream_copy: bool = True,
+    threads: Optional[int] = None,
+    segments: Optional[int] = None,
+    snap: str = 'none',
+    snap_window: float = 2.0,
+    cache_inserts: bool = False
 ) -> None:
     """将视频插入到主视频的指定位置
 
@@ -31,104 +62,505 @@ def insert_video(
                    'mute': 静音
         crossfade_duration: 交叉淡入淡出时长（秒）
         seamless: 是否使用无缝插入模式（无过渡效果）[默认启用]
+        stream_copy: 编码参数一致且无过渡效果时，使用流复制快速插入（只重编码切点所在的GOP）
+        threads: 编码线程数，默认使用全部CPU核心（批量并行处理时由调度方分配；
+                 分段并行时为每段的线程数）
+        segments: 无法流复制时分段并行重编码的段数：主视频在关键帧处切分，
+                  各段与插入视频由多个进程分别编码后无损拼接（无过渡效果时有效）
+        snap: 插入位置吸附方式
+              'none': 不调整（默认）
+              'keyframe': 移到最近的关键帧，切分时无需重编码
+              'scene': 移到 snap_window 秒内最近的场景切换处
+        snap_window: 场景吸附的搜索半径（秒）
+        cache_inserts: 流复制时，编码参数不一致的插入视频先转码为主视频的参数再拼接，
+                       转码结果按（插入视频内容, 目标参数）缓存，同一片头插入大量同类主视频时只转码一次
+                       （默认关闭；缓存写在 ~/.cache/video_watermark/inserts，上限 2GB，见 clip_cache）
     """
+    insert_videos(
+        main_video_path,
+        [{'path': insert_video_path, 'position': insert_position, 'audio_mode': audio_mode}],
+        output_path, crossfade_duration, seamless, stream_copy, threads, segments,
+        snap, snap_window, cache_inserts
+    )
+
+
+def insert_videos(
+    main_video_path: str,
+    inserts: List[dict],
+    output_path: str,
+    crossfade_duration: float = 0.0,
+    seamless: bool = True,
+    stream_copy: bool = True,
+    threads: Optional[int] = None,
+    segments: Optional[int] = None,
+    snap: str = 'none',
+    snap_window: float = 2.0,
+    cache_inserts: bool = False
+) -> None:
+    """在主视频的多个位置插入视频，整个编辑列表一次完成
+
+    所有插入点一起规划：能流复制时只重编码插入点所在的GOP，否则只解码、编码一遍，
+    不会因多次插入而反复重编码。
+
+    音频：每个插入片段按自己的 audio_mode 取插入视频音频（replace、mix）或静音（keep、mute）；
+    主视频片段在所有插入项都为 replace 或 mute 时静音，否则保留原音频；
+    所有插入项都为 mute 时输出不含音轨。只有一个插入项时与 insert_video 的含义一致。
+
+    Args:
+        main_video_path: 主视频文件路径
+        inserts: 插入项列表，每项为 {'path': 插入视频路径, 'position': 插入位置（秒）,
+                 'audio_mode': 音频处理方式（默认 'keep'）}；位置相同的插入项按列表顺序连续插入
+        output_path: 输出视频文件路径
+        其余参数含义同 insert_video（snap 对每个插入位置分别生效）
+    """
+    inserts = [_normalize_insert(item) for item in inserts]
+    if not inserts:
+        raise ValueError('至少需要一个插入项')
+
+    # 只探测元数据验证插入位置，不启动帧读取器
+    main_duration = probe_media(main_video_path).duration
+    for item in inserts:
+        if item['position'] < 0 or item['position'] > main_duration:
+            raise ValueError(f"插入位置 {item['position']}s 超出主视频时长 {main_duration}s")
+
+    if snap != 'none':
+        for item in inserts:
+            snapped = snap_insert_position(main_video_path, item['position'], snap, snap_window)
+            if snapped != item['position']:
+                click.echo(f"插入位置吸附: {item['position']:.3f}秒 -> {snapped:.3f}秒（{snap}）")
+                item['position'] = snapped
+            else:
+                click.echo(f'未找到可吸附的位置（{snap}），使用原插入位置')
+
+    # 按插入位置排序（位置相同时保持列表顺序）
+    inserts.sort(key=lambda item: item['position'])
+
+    # 无过渡效果时尝试流复制快速插入
+    if stream_copy and (seamless or crossfade_duration <= 0):
+        if _insert_video_stream_copy(main_video_path, inserts, output_path, threads, cache_inserts):
+            return
+
+    # 无过渡效果时分段并行重编码
+    if segments and segments > 1 and (seamless or crossfade_duration <= 0):
+        if _insert_video_parallel(main_video_path, inserts, output_path, segments, threads):
+            return
+
     # 加载视频
     main_video = VideoFileClip(main_video_path)
-    insert_video = VideoFileClip(insert_video_path)
-    
-    # 验证插入位置
-    if insert_position < 0 or insert_position > main_video.duration:
-        raise ValueError(f'插入位置 {insert_position}s 超出主视频时长 {main_video.duration}s')
-    
+    insert_clips = [VideoFileClip(item['path']) for item in inserts]
+
     click.echo(f'主视频时长: {main_video.duration:.2f}秒')
-    click.echo(f'插入视频时长: {insert_video.duration:.2f}秒')
-    
-    # 分割主视频
-    before_clip = main_video.subclipped(0, insert_position)
-    after_clip = main_video.subclipped(insert_position)
-    
-    # 调整插入视频大小以匹配主视频
-    if insert_video.size != main_video.size:
-        click.echo(f'调整插入视频分辨率: {insert_video.size} -> {main_video.size}')
-        insert_video = insert_video.resized(main_video.size)
-    
-    # 处理音频（仅在非无缝模式且需要交叉淡入淡出时）
-    if not seamless and crossfade_duration > 0:
-        # 应用交叉淡入淡出效果
-        before_clip = before_clip.with_effects([afx.AudioFadeOut(crossfade_duration)])
-        after_clip = after_clip.with_effects([afx.AudioFadeIn(crossfade_duration)])
-        insert_video = insert_video.with_effects([afx.AudioFadeIn(crossfade_duration)])
-        insert_video = insert_video.with_effects([afx.AudioFadeOut(crossfade_duration)])
-
-    # 根据音频模式处理
-    if audio_mode == 'keep':
-        # 保留主视频音频
-        insert_video = insert_video.without_audio()
-    elif audio_mode == 'replace':
-        # 使用插入视频音频，主视频静音
-        before_clip = before_clip.without_audio()
-        after_clip = after_clip.without_audio()
-    elif audio_mode == 'mute':
-        # 全部静音
-        before_clip = before_clip.without_audio()
-        insert_video = insert_video.without_audio()
-        after_clip = after_clip.without_audio()
-    elif audio_mode == 'mix':
-        # 混合音频 - 这里保留原音频，让MoviePy自动处理
-        click.echo('混合音频模式：将自动混合主视频和插入视频的音频')
+    for clip in insert_clips:
+        click.echo(f'插入视频时长: {clip.duration:.2f}秒')
+
+    use_fade = not seamless and crossfade_duration > 0
+    keep_main_audio = _keep_main_audio(inserts)
+
+    # 按编辑列表依次排列：主视频片段、插入视频、主视频片段……（跳过长度为0的主视频片段）
+    main_pieces = []
+    previous = 0.0
+    for item in inserts:
+        main_pieces.append((previous, item['position']))
+        previous = item['position']
+    main_pieces.append((previous, main_video.duration))
+
+    def main_piece(start, end):
+        piece = main_video.subclipped(start, end)
+        return piece if keep_main_audio else piece.without_audio()
+
+    clips = []
+    for (start, end), item, insert_clip in zip(main_pieces, inserts, insert_clips):
+        if end > start:
+            clips.append(main_piece(start, end))
+
+        # 调整插入视频大小以匹配主视频
+        if insert_clip.size != main_video.size:
+            click.echo(f'调整插入视频分辨率: {insert_clip.size} -> {main_video.size}')
+            insert_clip = insert_clip.resized(main_video.size)
+
+        if item['audio_mode'] in ('keep', 'mute'):
+            insert_clip = insert_clip.without_audio()
+        elif item['audio_mode'] == 'mix':
+            # 混合音频 - 这里保留原音频，让MoviePy自动处理
+            click.echo('混合音频模式：将自动混合主视频和插入视频的音频')
+        clips.append(insert_clip)
+    start, end = main_pieces[-1]
+    if end > start:
+        clips.append(main_piece(start, end))
 
     # 连接视频片段
-    if not seamless and crossfade_duration > 0:
-        # 使用交叉淡入淡出
-        if audio_mode == 'mix':
+    if use_fade:
+        # 应用交叉淡入淡出效果：每段在与相邻段的衔接处淡入/淡出
+        last = len(clips) - 1
+        faded = []
+        for index, clip in enumerate(clips):
+            effects = []
+            if index > 0:
+                effects.append(afx.AudioFadeIn(crossfade_duration))
+            if index < last:
+                effects.append(afx.AudioFadeOut(crossfade_duration))
+            faded.append(clip.with_effects(effects) if effects else clip)
+
+        if any(item['audio_mode'] == 'mix' for item in inserts):
             # 混合音频需要特殊处理
-            final_video = _create_fade_with_mix(
-                before_clip, insert_video, after_clip, crossfade_duration)
+            final_video = _create_fade_with_mix(faded, crossfade_duration)
         else:
             # 普通交叉淡入淡出
-            final_video = _create_fade_transition(
-                before_clip, insert_video, after_clip, crossfade_duration)
+            final_video = _create_fade_transition(faded, crossfade_duration)
     else:
         # 直接拼接（无缝模式或禁用交叉淡入淡出）
-        final_video = concatenate_videoclips([before_clip, insert_video, after_clip], method="compose")
-    
-    # 写出视频
+        final_video = concatenate_videoclips(clips, method="compose")
+
+    # 写出视频（解码拼接与编码在不同线程中重叠执行）
     click.echo('正在生成输出视频...')
-    final_video.write_videofile(
-        output_path,
-        codec='libx264',
-        audio_codec='aac',
-        threads=os.cpu_count(),
-        logger=None
-    )
-    
+    render_pipelined(final_video, output_path, threads=threads or os.cpu_count())
+
     # 释放资源
     main_video.close()
-    insert_video.close()
-    before_clip.close()
-    after_clip.close()
+    for clip in insert_clips:
+        clip.close()
     final_video.close()
 
 
-def _create_fade_transition(clip1, clip2, clip3, fade_duration):
-    """创建交叉淡入淡出的视频过渡"""
-    # 对clip1应用淡出
-    if clip1.duration > 0:
-        clip1 = clip1.with_effects([vfx.FadeOut(fade_duration)])
+def _normalize_insert(item: dict) -> dict:
+    """校验插入项参数并补齐默认值"""
+    unknown = set(item) - set(INSERT_DEFAULTS)
+    if unknown:
+        raise ValueError(f"未知的插入项参数: {sorted(unknown)}")
+    if not item.get('path'):
+        raise ValueError("插入项缺少 'path'")
+    if item.get('position') is None:
+        raise ValueError(f"插入项 {item['path']} 缺少 'position'")
+
+    normalized = dict(INSERT_DEFAULTS)
+    normalized.update(item)
+    if normalized['audio_mode'] not in AUDIO_MODES:
+        raise ValueError(f"音频处理方式必须是 {AUDIO_MODES} 之一， got '{normalized['audio_mode']}'")
+    normalized['position'] = float(normalized['position'])
+    return normalized
+
+
+def _keep_main_audio(inserts: List[dict]) -> bool:
+    """主视频片段是否保留音频：所有插入项都为 replace 或 mute 时静音"""
+    return not all(item['audio_mode'] in ('replace', 'mute') for item in inserts)
+
+
+def _split_main_pieces(
+    bounds: List[float],
+    positions: List[float]
+) -> List[Tuple[int, Optional[float], Optional[float], float]]:
+    """把按 bounds 切分的主视频各段在段内的插入点处再切开
+
+    Returns:
+        按时间顺序排列的 (段序号, 段内开始, 段内结束, 全局开始)，
+        段内开始/结束为 None 表示段的起点/终点
+    """
+    pieces = []
+    for index in range(len(bounds) - 1):
+        a, b = bounds[index], bounds[index + 1]
+        inner = [p for p in positions if a + KEYFRAME_TOLERANCE < p < b - KEYFRAME_TOLERANCE]
+        edges = [a] + inner + [b]
+        last = len(edges) - 2
+        for i, (start, end) in enumerate(zip(edges, edges[1:])):
+            pieces.append((index, None if i == 0 else start - a, None if i == last else end - a, start))
+    return pieces
+
+
+def _interleave(pieces: list, inserts: List[dict]) -> List[Tuple[str, object]]:
+    """按时间顺序排列主视频片段与插入项
+
+    Returns:
+        [('main', 片段) 或 ('insert', 插入项)]，插入项排在全局开始不早于其位置的第一个片段之前
+    """
+    sequence = []
+    pending = list(inserts)
+    for piece in pieces:
+        while pending and pending[0]['position'] <= piece[3] + KEYFRAME_TOLERANCE:
+            sequence.append(('insert', pending.pop(0)))
+        sequence.append(('main', piece))
+    sequence.extend(('insert', item) for item in pending)
+    return sequence
+
+
+def _insert_video_stream_copy(
+    main_video_path: str,
+    inserts: List[dict],
+    output_path: str,
+    threads: Optional[int] = None,
+    cache_inserts: bool = False
+) -> bool:
+    """流复制快速插入：在关键帧处切分主视频，只重编码插入点所在的GOP，再用 concat 分离器拼接
+
+    音频按各插入项的 audio_mode 单独重建（编码为 AAC），与完整渲染流程的行为一致。
+    插入视频和重编码的GOP都要与主视频的编码档次、级别和全局头一致（见 video_streams_match）。
+    cache_inserts 为 True 时，编码参数与主视频不一致的插入视频先转码为主视频的参数
+    （结果按目标参数缓存，见 clip_cache），再同样流复制拼接。
+
+    Returns:
+        是否完成了快速插入；返回 False 时调用方应走完整渲染流程
+    """
+    main_stream, main_audio, main_duration = probe_streams(main_video_path)
+    if main_stream is None:
+        return False
+    mismatched = []
+    for item in inserts:
+        stream, item['audio'], item['duration'] = probe_streams(item['path'])
+        item['clip'] = item['path']
+        if not video_streams_match(main_stream, stream):
+            mismatched.append(item)
+
+    profile = target_profile(main_stream, main_audio) if mismatched and cache_inserts else None
+    if mismatched and profile is None:
+        return False
+
+    keyframes = load_keyframe_index(main_video_path)
+    inner = [item['position'] for item in inserts if 0 < item['position'] < main_duration]
+    off_keyframe = [p for p in inner if not keyframes.is_keyframe(p)]
+    # 切点不在关键帧上时需要重编码一小段，只支持与 libx264 输出一致的源
+    if off_keyframe and (main_stream.get('codec_name') not in SMART_RENDER_CODECS or
+                         main_stream.get('pix_fmt') not in SMART_RENDER_PIX_FMTS):
+        return False
+
+    # 主视频切点：关键帧上的插入点本身，以及其余插入点所在GOP [k1, k2) 的边界
+    cut_times = set()
+    for p in inner:
+        if p in off_keyframe:
+            cut_times.add(keyframes.before(p))
+            cut_times.add(keyframes.after(p))
+        else:
+            cut_times.add(keyframes.nearest(p))
+    cut_times = sorted(t for t in cut_times if t is not None and 0 < t < main_duration)
+
+    click.echo(f'主视频时长: {main_duration:.2f}秒')
+    for item in inserts:
+        click.echo(f"插入视频时长: {item['duration']:.2f}秒")
+
+    temp_dir = tempfile.mkdtemp(prefix='fast_insert_')
+    try:
+        # 编码参数不一致的插入视频：使用（或生成）按主视频参数转码的缓存文件
+        normalized = {}
+        for item in mismatched:
+            if item['path'] not in normalized:
+                click.echo(f"插入视频编码参数与主视频不一致，使用转码缓存: {item['path']}")
+                normalized[item['path']] = insert_clip_cache.get_or_transcode(
+                    item['path'], profile, temp_dir, threads)
+            item['clip'] = normalized[item['path']]
+            stream, item['audio'], item['duration'] = probe_streams(item['clip'])
+            # 转码结果的全局头（SPS/PPS）与主视频不同（如主视频不是 libx264 编码）时不能拼接
+            if not video_streams_match(main_stream, stream):
+                click.echo('转码后的插入视频与主视频的编码参数仍不一致，改为完整渲染')
+                return False
+        click.echo('编码参数一致，使用流复制快速插入')
+
+        main_dir = os.path.join(temp_dir, 'main')
+        os.makedirs(main_dir)
+        chunks = split_at_keyframes(main_video_path, cut_times, main_dir)
+        pieces = _split_main_pieces([0.0] + cut_times + [main_duration], off_keyframe)
+
+        # 插入视频重新封装为仅视频流的片段（同一文件只处理一次）
+        insert_segments = {}
+        for number, item in enumerate(inserts):
+            if item['clip'] not in insert_segments:
+                insert_dir = os.path.join(temp_dir, f'insert_{number:03d}')
+                os.makedirs(insert_dir)
+                insert_segments[item['clip']] = split_at_keyframes(item['clip'], [], insert_dir)[0]
+
+        parts = []
+        reencoded = []
+        for kind, entry in _interleave(pieces, inserts):
+            if kind == 'insert':
+                parts.append(insert_segments[entry['clip']])
+                continue
+            index, start, end, _ = entry
+            if start is None and end is None:
+                parts.append(chunks[index])
+            else:
+                # 插入点所在的GOP：只重编码这一段，并在插入点处切开
+                part_path = os.path.join(temp_dir, f'gop_{len(parts):03d}.mp4')
+                parts.append(encode_segment(chunks[index], part_path, start, end, threads=threads))
+                reencoded.append(part_path)
+
+        # 重编码的GOP与主视频的档次、级别或全局头不一致时不能流复制拼接
+        if not segments_match(main_stream, reencoded):
+            click.echo('重编码片段与主视频的编码参数不一致，改为完整渲染')
+            return False
+
+        _concat_with_insert_audio(
+            parts, output_path, temp_dir, main_video_path, main_audio, main_duration, inserts
+        )
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    return True
+
+
+def _insert_video_parallel(
+    main_video_path: str,
+    inserts: List[dict],
+    output_path: str,
+    segments: int,
+    threads: Optional[int] = None
+) -> bool:
+    """分段并行插入：主视频在关键帧处切为约 segments 段，插入点所在的段在插入点处切开，
+    各段与插入视频（缩放并转换为主视频的分辨率和帧率）由多个进程同时重编码，再无损拼接
+
+    Returns:
+        是否完成了分段插入；返回 False 时调用方应走完整渲染流程
+    """
+    main_stream, main_audio, main_duration = probe_streams(main_video_path)
+    if main_stream is None:
+        return False
+    for item in inserts:
+        stream, item['audio'], item['duration'] = probe_streams(item['path'])
+        item['clip'] = item['path']
+        if stream is None:
+            return False
+
+    cuts = plan_parallel_cuts(list_keyframes(main_video_path), main_duration, segments)
+    bounds = [0.0] + cuts + [main_duration]
+    size = (int(main_stream['width']), int(main_stream['height']))
+    frame_rate = main_stream.get('r_frame_rate')
+    threads = threads or max(1, (os.cpu_count() or 1) // (len(bounds) - 1))
+
+    click.echo(f'主视频时长: {main_duration:.2f}秒')
+    for item in inserts:
+        click.echo(f"插入视频时长: {item['duration']:.2f}秒")
+    click.echo(f'分段并行重编码：{len(bounds) - 1} 段')
+
+    temp_dir = tempfile.mkdtemp(prefix='parallel_insert_')
+    try:
+        chunks = split_at_keyframes(main_video_path, cuts, temp_dir)
+        pieces = _split_main_pieces(bounds, [item['position'] for item in inserts])
+
+        with ProcessPoolExecutor(max_workers=segments) as executor:
+            futures = []
+            for index, (kind, entry) in enumerate(_interleave(pieces, inserts)):
+                part_path = os.path.join(temp_dir, f'part_{index:03d}.mp4')
+                if kind == 'insert':
+                    futures.append(executor.submit(
+                        encode_segment, entry['path'], part_path, None, None, threads,
+                        size, frame_rate
+                    ))
+                else:
+                    chunk_index, start, end, _ = entry
+                    futures.append(executor.submit(
+                        encode_segment, chunks[chunk_index], part_path, start, end, threads
+                    ))
+            parts = [future.result() for future in futures]
+
+        # 各段分别编码，全局头（SPS/PPS）不一致时拼接结果无法正确解码
+        if not segments_match(probe_streams(parts[0])[0], parts[1:]):
+            click.echo('分段编码结果的编码参数不一致，改为完整渲染')
+            return False
+
+        _concat_with_insert_audio(
+            parts, output_path, temp_dir, main_video_path, main_audio, main_duration, inserts
+        )
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    return True
+
+
+def _concat_with_insert_audio(
+    video_parts: List[str],
+    output_path: str,
+    temp_dir: str,
+    main_video_path: str,
+    main_audio: Optional[dict],
+    main_duration: float,
+    inserts: List[dict]
+) -> None:
+    """无损拼接视频片段，并按各插入项的 audio_mode 重建音轨（编码为 AAC）
+
+    inserts 中每项需已包含实际拼接的文件 'clip' 及其探测得到的 'audio'（音频流信息）和 'duration'。
+    """
+    if all(item['audio_mode'] == 'mute' for item in inserts):
+        concat_segments(video_parts, output_path)
+        return
+
+    video_only = os.path.join(temp_dir, 'video.mp4')
+    concat_segments(video_parts, video_only)
+
+    filter_graph = _build_insert_audio_graph(main_audio, main_duration, inserts)
+    inputs = ['-i', video_only, '-i', main_video_path]
+    for item in inserts:
+        inputs += ['-i', item['clip']]
+
+    click.echo('正在生成输出视频...')
+    run_ffmpeg(inputs + [
+        '-filter_complex', filter_graph,
+        '-map', '0:v', '-map', '[aout]',
+        '-c:v', 'copy', '-c:a', 'aac',
+        output_path
+    ])
+
+
+def _build_insert_audio_graph(
+    main_audio: Optional[dict],
+    main_duration: float,
+    inserts: List[dict]
+) -> str:
+    """构建插入后音轨的 filter_complex（输入 1 为主视频，输入 2 起依次为各插入视频）
+
+    音轨依次为 [主视频片段, 插入视频, 主视频片段, 插入视频, ……, 主视频片段]，
+    每段取原音频还是静音见 insert_videos 的说明；源没有音轨时同样用静音补齐。
+    """
+    reference = main_audio or next((item['audio'] for item in inserts if item['audio']), None) or {}
+    sample_rate = reference.get('sample_rate') or 44100
+    layout = reference.get('channel_layout') or (
+        'mono' if reference.get('channels') == 1 else 'stereo')
+    audio_format = f'aformat=sample_fmts=fltp:sample_rates={sample_rate}:channel_layouts={layout}'
+
+    use_main = main_audio is not None and _keep_main_audio(inserts)
+
+    # (输入序号, 起点, 终点)，输入序号为 None 表示静音
+    parts = []
+    previous = 0.0
+    for number, item in enumerate(inserts):
+        use_insert = item['audio_mode'] in ('replace', 'mix') and item['audio'] is not None
+        parts.append((1 if use_main else None, previous, item['position']))
+        parts.append((number + 2 if use_insert else None, 0.0, item['duration']))
+        previous = item['position']
+    parts.append((1 if use_main else None, previous, main_duration))
+
+    chains: List[str] = []
+    labels: List[str] = []
+    for source, start, end in parts:
+        length = end - start
+        if length <= 0:
+            continue
+        label = f'[a{len(labels)}]'
+        if source is None:
+            chains.append(f'anullsrc=r={sample_rate}:cl={layout},'
+                          f'atrim=end={length:.6f},{audio_format}{label}')
+        else:
+            chains.append(f'[{source}:a:0]atrim=start={start:.6f}:end={end:.6f},'
+                          f'asetpts=PTS-STARTPTS,apad=whole_dur={length:.6f},'
+                          f'{audio_format}{label}')
+        labels.append(label)
+
+    chains.append(f'{"".join(labels)}concat=n={len(labels)}:v=0:a=1[aout]')
+    return ';'.join(chains)
+
 
-    # 对clip2应用淡入和淡出
-    if clip2.duration > 0:
-        clip2 = clip2.with_effects([vfx.FadeIn(fade_duration), vfx.FadeOut(fade_duration)])
+def _create_fade_transition(clips, fade_duration):
+    """创建交叉淡入淡出的视频过渡（每段在与相邻段的衔接处淡入/淡出）"""
+    last = len(clips) - 1
+    faded = []
+    for index, clip in enumerate(clips):
+        effects = []
+        if index > 0:
+            effects.append(vfx.FadeIn(fade_duration))
+        if index < last:
+            effects.append(vfx.FadeOut(fade_duration))
+        faded.append(clip.with_effects(effects) if effects else clip)
 
-    # 对clip3应用淡入
-    if clip3.duration > 0:
-        clip3 = clip3.with_effects([vfx.FadeIn(fade_duration)])
-    
-    return concatenate_videoclips([clip1, clip2, clip3])
+    return concatenate_videoclips(faded)
 
 
-def _create_fade_with_mix(clip1, clip2, clip3, fade_duration):
+def _create_fade_with_mix(clips, fade_duration):
     """创建带音频混合的交叉淡入淡出过渡"""
     # 这里需要更复杂的音频混合逻辑
     # 简化版本：直接拼接，让音频自动混合
-    return concatenate_videoclips([clip1, clip2, clip3])
+    return concatenate_videoclips(clips)
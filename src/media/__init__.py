@@ -0,0 +1,14 @@
+"""Media utilities module (ffmpeg invocation, probing, segment operations)."""
+
+from .ffmpeg_tools import get_ffmpeg_binary, get_ffprobe_binary, run_ffmpeg, run_ffprobe
+from .frame_io import FramePool, FrameWriter, RawFrameReader, RawFrameWriter, raw_frame_shape
+from .keyframes import KeyframeIndex, load_keyframe_index
+from .pipeline import (PipelineStats, parse_memory_size, plan_frame_pool,
+                       process_compositing_available, render_pipelined)
+from .probe import MediaInfo, probe_media
+
+__all__ = ['get_ffmpeg_binary', 'get_ffprobe_binary', 'run_ffmpeg', 'run_ffprobe',
+           'KeyframeIndex', 'load_keyframe_index', 'MediaInfo', 'probe_media',
+           'PipelineStats', 'parse_memory_size', 'plan_frame_pool',
+           'process_compositing_available', 'render_pipelined',
+           'FramePool', 'FrameWriter', 'RawFrameReader', 'RawFrameWriter', 'raw_frame_shape']
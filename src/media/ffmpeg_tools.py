@@ -0,0 +1,74 @@
+"""FFmpeg 命令行调用封装"""
+
+import json
+import os
+import shutil
+import subprocess
+from typing import List
+
+from moviepy.tools import cross_platform_popen_params
+
+
+def get_ffmpeg_binary() -> str:
+    """获取 ffmpeg 可执行文件路径（与 moviepy 使用同一个二进制）"""
+    from moviepy.config import FFMPEG_BINARY
+    return FFMPEG_BINARY
+
+
+def get_ffprobe_binary() -> str:
+    """获取 ffprobe 可执行文件路径
+
+    查找顺序：环境变量 FFPROBE_BINARY -> ffmpeg 同目录 -> 系统PATH
+    """
+    env_binary = os.getenv('FFPROBE_BINARY')
+    if env_binary:
+        return env_binary
+
+    exe_name = 'ffprobe.exe' if os.name == 'nt' else 'ffprobe'
+    sibling = os.path.join(os.path.dirname(get_ffmpeg_binary()), exe_name)
+    if os.path.isfile(sibling):
+        return sibling
+
+    return shutil.which('ffprobe') or exe_name
+
+
+def run_ffmpeg(args: List[str]) -> None:
+    """执行一条 ffmpeg 命令，失败时抛出 RuntimeError
+
+    Args:
+        args: ffmpeg 参数列表（不包含可执行文件本身）
+    """
+    cmd = [get_ffmpeg_binary(), '-hide_banner', '-loglevel', 'error', '-y'] + args
+    popen_params = cross_platform_popen_params({
+        'stdout': subprocess.DEVNULL,
+        'stderr': subprocess.PIPE,
+        'stdin': subprocess.DEVNULL,
+    })
+    proc = subprocess.Popen(cmd, **popen_params)
+    _, stderr = proc.communicate()
+    if proc.returncode != 0:
+        error = stderr.decode('utf-8', errors='replace').strip()
+        raise RuntimeError(f'FFmpeg 执行失败（返回码 {proc.returncode}）: {error}')
+
+
+def run_ffprobe(args: List[str]) -> dict:
+    """执行一条 ffprobe 命令并解析 JSON 输出，失败时抛出 RuntimeError
+
+    Args:
+        args: ffprobe 参数列表（不包含可执行文件本身和输出格式参数）
+
+    Returns:
+        解析后的 JSON 字典
+    """
+    cmd = [get_ffprobe_binary(), '-v', 'error', '-of', 'json'] + args
+    popen_params = cross_platform_popen_params({
+        'stdout': subprocess.PIPE,
+        'stderr': subprocess.PIPE,
+        'stdin': subprocess.DEVNULL,
+    })
+    proc = subprocess.Popen(cmd, **popen_params)
+    stdout, stderr = proc.communicate()
+    if proc.returncode != 0:
+        error = stderr.decode('utf-8', errors='replace').strip()
+        raise RuntimeError(f'FFprobe 执行失败（返回码 {proc.returncode}）: {error}')
+    return json.loads(stdout.decode('utf-8', errors='replace') or '{}')
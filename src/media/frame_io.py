@@ -0,0 +1,234 @@
+"""零拷贝帧传输：ffmpeg 管道直接读入预分配的 NumPy 缓冲区，编码时直接写出数组内存
+
+moviepy 的读取器每帧生成新的 bytes 再构造数组，写入时又经 tobytes 复制一次；
+4K 下每帧约 24MB，分配和内存带宽开销很大。这里用 readinto 读入可复用的缓冲区，
+写入时把数组的 memoryview 交给管道，整条链路不产生中间副本。
+"""
+
+import queue
+import subprocess
+from typing import List, Optional, Tuple
+
+import numpy as np
+from moviepy.tools import cross_platform_popen_params, ffmpeg_escape_filename
+from moviepy.video.io.ffmpeg_writer import FFMPEG_VideoWriter
+
+from .ffmpeg_tools import get_ffmpeg_binary
+
+# 编码失败时错误信息中保留的 ffmpeg stderr 行数
+_STDERR_TAIL_LINES = 20
+
+
+class FramePool:
+    """预分配、可复用的帧缓冲区池
+
+    缓冲区用完后由使用方 release 归还；池空时 acquire 阻塞，从而限制在途帧数。
+    """
+
+    def __init__(self, shape: Tuple[int, ...], count: int, dtype=np.uint8):
+        """
+        Args:
+            shape: 每个缓冲区的形状，如 (高, 宽, 3)
+            count: 缓冲区数量（至少 2）
+            dtype: 元素类型
+        """
+        if count < 2:
+            raise ValueError(f'帧缓冲区数量至少为 2， got {count}')
+        self.shape = tuple(shape)
+        self.buffers: List[np.ndarray] = [np.empty(self.shape, dtype) for _ in range(count)]
+        self._free: queue.Queue = queue.Queue()
+        for buffer in self.buffers:
+            self._free.put(buffer)
+
+    @property
+    def nbytes(self) -> int:
+        """全部缓冲区占用的内存（字节）"""
+        return sum(buffer.nbytes for buffer in self.buffers)
+
+    def acquire(self, timeout: Optional[float] = None) -> Optional[np.ndarray]:
+        """取出一个空闲缓冲区，超时返回 None"""
+        try:
+            return self._free.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def release(self, buffer: np.ndarray) -> None:
+        """归还缓冲区"""
+        self._free.put(buffer)
+
+
+def raw_frame_shape(size: Tuple[int, int], pix_fmt: str = 'rgb24') -> Tuple[int, ...]:
+    """原始帧的数组形状：rgb24 为 (高, 宽, 3)；yuv420p 为 (高 × 3/2, 宽)，Y、U、V 平面依次存放
+
+    Raises:
+        ValueError: 不支持的像素格式，或 yuv420p 的宽高不是偶数
+    """
+    width, height = size
+    if pix_fmt == 'rgb24':
+        return (height, width, 3)
+    if pix_fmt == 'yuv420p':
+        if width % 2 or height % 2:
+            raise ValueError(f'yuv420p 帧的宽高必须是偶数， got {width}x{height}')
+        return (height * 3 // 2, width)
+    raise ValueError(f"像素格式必须是 rgb24 或 yuv420p， got '{pix_fmt}'")
+
+
+class RawFrameReader:
+    """用 ffmpeg 把视频解码为原始帧，逐帧读入调用方提供的缓冲区
+
+    rgb24 时解码参数与 moviepy 的 FFMPEG_VideoReader 一致（bicubic 缩放到 size），
+    得到的帧与 VideoFileClip 逐帧相同；yuv420p 时源视频为同尺寸 yuv420p 则不做任何转换。
+    """
+
+    def __init__(self, video_path: str, size: Tuple[int, int], pix_fmt: str = 'rgb24'):
+        """
+        Args:
+            video_path: 视频文件路径
+            size: 输出帧尺寸 (宽, 高)，通常取 VideoFileClip.size（已考虑旋转）
+            pix_fmt: 输出像素格式 rgb24 或 yuv420p（帧形状见 raw_frame_shape）
+        """
+        width, height = size
+        self.frame_shape = raw_frame_shape(size, pix_fmt)
+        self.frame_bytes = int(np.prod(self.frame_shape))
+
+        cmd = [
+            get_ffmpeg_binary(), '-i', video_path, '-loglevel', 'error',
+            '-f', 'image2pipe', '-vf', f'scale={width}:{height}', '-sws_flags', 'bicubic',
+            '-pix_fmt', pix_fmt, '-vcodec', 'rawvideo', '-'
+        ]
+        # 无缓冲管道：readinto 直接写入目标内存，不经过 Python 的读缓冲区
+        popen_params = cross_platform_popen_params({
+            'bufsize': 0,
+            'stdout': subprocess.PIPE,
+            'stderr': subprocess.DEVNULL,
+            'stdin': subprocess.DEVNULL,
+        })
+        self.proc = subprocess.Popen(cmd, **popen_params)
+
+    def read_into(self, buffer: np.ndarray) -> bool:
+        """把下一帧读入 buffer（C 连续、形状为 frame_shape 的 uint8 数组）
+
+        Returns:
+            是否读到了完整的一帧；到达结尾时返回 False，buffer 内容无效
+        """
+        view = memoryview(buffer).cast('B')
+        filled = 0
+        while filled < self.frame_bytes:
+            count = self.proc.stdout.readinto(view[filled:])
+            if not count:
+                return False
+            filled += count
+        return True
+
+    def close(self) -> None:
+        """结束解码进程"""
+        if self.proc is not None:
+            self.proc.stdout.close()
+            if self.proc.poll() is None:
+                self.proc.terminate()
+            self.proc.wait()
+            self.proc = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class FrameWriter(FFMPEG_VideoWriter):
+    """moviepy 编码器的零拷贝版本：直接把数组内存写入管道（命令行参数完全相同）"""
+
+    def write_frame(self, img_array):
+        frame = np.ascontiguousarray(img_array)
+        try:
+            self.proc.stdin.write(memoryview(frame).cast('B'))
+        except IOError:
+            # 编码器已退出：交给 moviepy 收集 ffmpeg 的错误信息并抛出
+            super().write_frame(frame)
+
+
+class RawFrameWriter:
+    """把原始帧写入 ffmpeg 编码器，输入像素格式可选
+
+    moviepy 的 FFMPEG_VideoWriter 固定以 rgb24/rgba 作为输入；YUV 合成时帧已是 yuv420p，
+    直接交给编码器可省去 RGB→YUV 转换。其余命令行参数与 FFMPEG_VideoWriter 相同。
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        size: Tuple[int, int],
+        fps: float,
+        pix_fmt: str = 'yuv420p',
+        codec: str = 'libx264',
+        preset: str = 'medium',
+        audiofile: Optional[str] = None,
+        audio_codec: Optional[str] = None,
+        threads: Optional[int] = None
+    ):
+        """
+        Args:
+            filename: 输出视频文件路径
+            size: 帧尺寸 (宽, 高)
+            fps: 帧率
+            pix_fmt: 输入帧的像素格式（同时作为输出像素格式）
+            codec: 视频编码器
+            preset: 编码预设
+            audiofile: 要封装的音频文件
+            audio_codec: 音频编码器，None 表示直接复制
+            threads: 编码线程数
+        """
+        self.filename = filename
+        width, height = size
+        cmd = [
+            get_ffmpeg_binary(), '-y', '-loglevel', 'error',
+            '-f', 'rawvideo', '-vcodec', 'rawvideo', '-s', f'{width}x{height}',
+            '-pix_fmt', pix_fmt, '-r', '%.02f' % fps, '-an', '-i', '-'
+        ]
+        if audiofile is not None:
+            cmd += ['-i', audiofile, '-acodec', audio_codec or 'copy']
+        cmd += ['-vcodec', codec, '-preset', preset]
+        if threads is not None:
+            cmd += ['-threads', str(threads)]
+        cmd += ['-pix_fmt', pix_fmt, ffmpeg_escape_filename(filename)]
+
+        popen_params = cross_platform_popen_params({
+            'stdout': subprocess.DEVNULL,
+            'stderr': subprocess.PIPE,
+            'stdin': subprocess.PIPE,
+        })
+        self.proc = subprocess.Popen(cmd, **popen_params)
+
+    def write_frame(self, frame: np.ndarray) -> None:
+        """写入一帧（直接写出数组内存）"""
+        try:
+            self.proc.stdin.write(memoryview(np.ascontiguousarray(frame)).cast('B'))
+        except IOError as e:
+            # 编码进程已回收，close 不再重复报错
+            proc, self.proc = self.proc, None
+            _, error = proc.communicate()
+            raise IOError(f'{e}\n\nFFmpeg 写入 {self.filename} 失败: '
+                          f'{error.decode("utf-8", errors="replace")}')
+
+    def close(self) -> None:
+        """结束编码进程，ffmpeg 返回码非零时抛出 RuntimeError（附 stderr 末尾几行）"""
+        if self.proc is None:
+            return
+        proc, self.proc = self.proc, None
+        proc.stdin.close()
+        stderr = b''
+        if proc.stderr is not None:
+            stderr = proc.stderr.read()
+            proc.stderr.close()
+        proc.wait()
+        if proc.returncode != 0:
+            lines = stderr.decode('utf-8', errors='replace').strip().splitlines()
+            error = '\n'.join(lines[-_STDERR_TAIL_LINES:])
+            raise RuntimeError(f'FFmpeg 执行失败（返回码 {proc.returncode}）: {error}')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
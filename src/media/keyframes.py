@@ -0,0 +1,239 @@
+"""关键帧索引：只读取数据包头（不解码）建立关键帧时间表，以紧凑二进制格式缓存，支持 O(log n) 查询"""
+
+import bisect
+import hashlib
+import os
+import struct
+import sys
+import tempfile
+import threading
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+from .ffmpeg_tools import run_ffprobe
+
+# 索引文件格式：魔数、版本、帧数、关键帧数，随后是关键帧时间（float64 小端）
+INDEX_MAGIC = b'KFIX'
+INDEX_VERSION = 1
+_HEADER = struct.Struct('<4sHII')
+
+# 指定索引缓存目录的环境变量，设为空字符串时禁用磁盘缓存
+KEYFRAME_DIR_ENV = 'VIDEO_WATERMARK_KEYFRAME_DIR'
+
+# 磁盘缓存容量上限（字节），超出时按最近使用时间淘汰索引文件
+KEYFRAME_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# 切点与关键帧的时间误差容限（秒）
+KEYFRAME_TOLERANCE = 1e-3
+
+# 进程内缓存：绝对路径 -> ((大小, 修改时间), 索引)
+_memory_cache: Dict[str, Tuple[Tuple[int, int], 'KeyframeIndex']] = {}
+_memory_lock = threading.Lock()
+
+
+class KeyframeIndex:
+    """视频流的关键帧时间表（秒，相对于视频流起点，升序）"""
+
+    def __init__(self, times: List[float], frame_count: int = 0):
+        self._times = array('d', sorted(times))
+        self.frame_count = frame_count
+
+    @property
+    def times(self) -> List[float]:
+        return self._times.tolist()
+
+    def __len__(self) -> int:
+        return len(self._times)
+
+    def before(self, t: float) -> float:
+        """不晚于 t 的最近关键帧（没有时返回 0）"""
+        index = bisect.bisect_right(self._times, t + KEYFRAME_TOLERANCE) - 1
+        return self._times[index] if index >= 0 else 0.0
+
+    def after(self, t: float) -> Optional[float]:
+        """晚于 t 的最近关键帧（没有时返回 None，表示到视频结尾）"""
+        index = bisect.bisect_right(self._times, t + KEYFRAME_TOLERANCE)
+        return self._times[index] if index < len(self._times) else None
+
+    def nearest(self, t: float) -> Optional[float]:
+        """离 t 最近的关键帧（没有关键帧时返回 None）"""
+        index = bisect.bisect_left(self._times, t)
+        candidates = self._times[max(index - 1, 0):index + 1]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda k: abs(k - t))
+
+    def is_keyframe(self, t: float) -> bool:
+        """t 是否落在关键帧上（误差在 KEYFRAME_TOLERANCE 以内）"""
+        nearest = self.nearest(t)
+        return nearest is not None and abs(nearest - t) < KEYFRAME_TOLERANCE
+
+    def to_bytes(self) -> bytes:
+        header = _HEADER.pack(INDEX_MAGIC, INDEX_VERSION, self.frame_count, len(self._times))
+        times = array('d', self._times)
+        if sys.byteorder == 'big':
+            times.byteswap()
+        return header + times.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'KeyframeIndex':
+        """解析索引文件内容，格式不符时抛出 ValueError"""
+        if len(data) < _HEADER.size:
+            raise ValueError('关键帧索引文件不完整')
+        magic, version, frame_count, count = _HEADER.unpack_from(data)
+        if magic != INDEX_MAGIC or version != INDEX_VERSION:
+            raise ValueError('关键帧索引文件格式不匹配')
+        if len(data) != _HEADER.size + count * 8:
+            raise ValueError('关键帧索引文件不完整')
+        times = array('d')
+        times.frombytes(data[_HEADER.size:])
+        if sys.byteorder == 'big':
+            times.byteswap()
+        return cls(times.tolist(), frame_count)
+
+
+def default_keyframe_dir() -> Optional[str]:
+    """默认索引缓存目录：环境变量 VIDEO_WATERMARK_KEYFRAME_DIR，否则在用户缓存目录下
+
+    Returns:
+        目录路径；环境变量设为空字符串时返回 None（禁用磁盘缓存）
+    """
+    if KEYFRAME_DIR_ENV in os.environ:
+        return os.environ[KEYFRAME_DIR_ENV] or None
+    from ..watermark.asset_cache import user_cache_dir
+    return os.path.join(user_cache_dir(), 'keyframes')
+
+
+def scan_keyframes(video_path: str) -> KeyframeIndex:
+    """扫描视频流的数据包头建立关键帧索引（不解码）"""
+    data = run_ffprobe([
+        '-select_streams', 'v:0',
+        '-show_entries', 'packet=pts_time,flags',
+        video_path
+    ])
+
+    pts_list = []
+    keyframes = []
+    for packet in data.get('packets', []):
+        pts_time = packet.get('pts_time')
+        if pts_time in (None, 'N/A'):
+            continue
+        pts = float(pts_time)
+        pts_list.append(pts)
+        if 'K' in packet.get('flags', ''):
+            keyframes.append(pts)
+
+    if not pts_list:
+        return KeyframeIndex([], 0)
+
+    origin = min(pts_list)
+    return KeyframeIndex([t - origin for t in keyframes], len(pts_list))
+
+
+def load_keyframe_index(video_path: str, cache_dir: Optional[str] = None) -> KeyframeIndex:
+    """获取视频的关键帧索引：依次查进程内缓存、磁盘缓存，都未命中时扫描并写入缓存
+
+    缓存键为 (绝对路径, 文件大小, 修改时间)，文件变化后自动重建；
+    磁盘缓存超过 KEYFRAME_CACHE_MAX_BYTES 时淘汰最久未使用的索引文件。
+
+    Args:
+        video_path: 视频文件路径
+        cache_dir: 索引缓存目录，None 表示使用 default_keyframe_dir()
+    """
+    path = os.path.abspath(video_path)
+    stat = os.stat(path)
+    signature = (stat.st_size, stat.st_mtime_ns)
+
+    with _memory_lock:
+        cached = _memory_cache.get(path)
+        if cached and cached[0] == signature:
+            return cached[1]
+
+    cache_dir = cache_dir if cache_dir is not None else default_keyframe_dir()
+    index_path = None
+    if cache_dir:
+        key = hashlib.sha256(repr((path,) + signature).encode('utf-8')).hexdigest()
+        index_path = os.path.join(cache_dir, f'{key}.kfi')
+
+    index = _read_index(index_path) if index_path else None
+    if index is None:
+        index = scan_keyframes(path)
+        if index_path:
+            _write_index(index_path, index)
+            evict_keyframe_cache(cache_dir)
+
+    with _memory_lock:
+        _memory_cache[path] = (signature, index)
+    return index
+
+
+def _read_index(index_path: str) -> Optional[KeyframeIndex]:
+    """读取索引文件，不存在或损坏时返回 None"""
+    try:
+        with open(index_path, 'rb') as f:
+            index = KeyframeIndex.from_bytes(f.read())
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError):
+        try:
+            os.remove(index_path)
+        except OSError:
+            pass
+        return None
+
+    try:
+        # 更新修改时间作为最近使用时间
+        os.utime(index_path)
+    except OSError:
+        pass
+    return index
+
+
+def evict_keyframe_cache(cache_dir: str, max_bytes: int = KEYFRAME_CACHE_MAX_BYTES) -> None:
+    """淘汰最久未使用的索引文件，直到缓存目录总大小不超过上限"""
+    entries = []
+    total = 0
+    try:
+        with os.scandir(cache_dir) as it:
+            for entry in it:
+                if not entry.name.endswith('.kfi'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+                total += stat.st_size
+    except FileNotFoundError:
+        return
+
+    entries.sort()
+    for _, size, path in entries:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            # 其他进程可能已删除
+            pass
+
+
+def _write_index(index_path: str, index: KeyframeIndex) -> None:
+    """原子写入索引文件（先写临时文件再替换），失败时忽略"""
+    try:
+        directory = os.path.dirname(index_path)
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(index.to_bytes())
+            os.replace(temp_path, index_path)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+    except OSError:
+        pass
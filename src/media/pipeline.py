@@ -0,0 +1,579 @@
+"""流水线渲染：解码、合成、编码分别在独立线程中运行，由有界帧队列连接
+
+moviepy 的 write_videofile 在同一个线程里依次解码、合成、写入编码器管道，等待管道时 CPU 空闲。
+这里把三个阶段放到各自的线程：管道读写和 NumPy 混合都会释放 GIL，各阶段可以重叠执行；
+有界队列限制在途帧数（内存占用），输出与 write_videofile 逐帧一致。
+
+解码线程把帧放入帧缓冲区池中的可复用缓冲区，编码线程写完后归还，逐帧不分配新的帧数组；
+给出源文件路径时直接从解码管道读入缓冲区，帧数据到编码管道不产生副本（见 frame_io）。
+
+合成函数的 Python 部分（时间轴查找、动态文字排版等）受 GIL 限制时，可以让解码和若干合成工作者
+运行在独立进程中（compose_processes）：帧存放在 multiprocessing.shared_memory 的环形缓冲区里，
+队列只传递帧序号和槽位号，编码前按帧序号重新排序，帧数据不经过 pickle。
+
+给出源文件且视频为偶数宽高时，还可以直接在 YUV420 中合成（pix_fmt='yuv420p'）：解码器输出原始
+yuv420p 帧，水印预先转换为 Y、U、V 平面上的图块逐平面混合，编码器直接接收 yuv420p。
+每帧数据量减半，并省去解码端 YUV→RGB 和编码端 RGB→YUV 两次转换（误差见 overlay.rgb_tile_to_yuv420）。
+
+帧缓冲区池（多进程时为共享内存槽位）也是在途帧数和帧内存的硬上限：可用 max_frames / max_memory 参数
+（或环境变量 VIDEO_WATERMARK_MAX_FRAMES / VIDEO_WATERMARK_MAX_MEMORY）限制，
+使同一台机器上并发的多个任务峰值内存可预估。
+"""
+
+import logging
+import multiprocessing
+import os
+import pickle
+import queue
+import re
+import shutil
+import tempfile
+import threading
+import time
+from multiprocessing import shared_memory
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+from .frame_io import FramePool, FrameWriter, RawFrameReader, RawFrameWriter, raw_frame_shape
+
+logger = logging.getLogger('video_watermark')
+
+# 阶段之间队列的默认容量（帧）
+PIPELINE_QUEUE_SIZE = 8
+
+# 限制在途帧数、帧内存（字节）的环境变量，批量处理的工作进程同样生效
+MAX_FRAMES_ENV = 'VIDEO_WATERMARK_MAX_FRAMES'
+MAX_MEMORY_ENV = 'VIDEO_WATERMARK_MAX_MEMORY'
+
+# 合成进程数的环境变量（0 或未设置表示在本进程的线程中合成）
+COMPOSE_PROCESSES_ENV = 'VIDEO_WATERMARK_COMPOSE_PROCESSES'
+
+# 可选的合成像素格式及指定它的环境变量
+COMPOSITE_FORMATS = ['rgb24', 'yuv420p']
+COMPOSITE_FORMAT_ENV = 'VIDEO_WATERMARK_COMPOSITE_FORMAT'
+
+# 内存大小的单位后缀
+_SIZE_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+
+# 队列等待的轮询间隔（秒），用于及时响应其他阶段的失败
+_POLL_INTERVAL = 0.1
+
+# 帧流结束标记
+_END = object()
+
+
+class _Cancelled(Exception):
+    """其他阶段失败，本阶段提前退出"""
+
+
+class StageStats:
+    """单个阶段的统计：处理帧数、工作时间和等待队列的时间（秒）"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.frames = 0
+        self.busy = 0.0
+        self.waiting = 0.0
+
+    def utilization(self, wall: float) -> float:
+        """工作时间占总耗时的比例"""
+        return self.busy / wall if wall > 0 else 0.0
+
+
+class PipelineStats:
+    """一次流水线渲染的统计"""
+
+    def __init__(self, stages: List[StageStats], wall: float):
+        self.stages = stages
+        self.wall = wall
+
+    def describe(self) -> str:
+        """可读的各阶段利用率报告"""
+        lines = [f'流水线渲染耗时 {self.wall:.2f}秒']
+        for stage in self.stages:
+            lines.append(
+                f'  {stage.name}: {stage.frames} 帧，工作 {stage.busy:.2f}秒'
+                f'（利用率 {stage.utilization(self.wall):.0%}），等待 {stage.waiting:.2f}秒'
+            )
+        return '\n'.join(lines)
+
+
+def parse_memory_size(text: str) -> int:
+    """解析内存大小，如 "512M"、"2G"、"1.5GB"、"1048576"（不带单位为字节）
+
+    Raises:
+        ValueError: 格式无效
+    """
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([KMGT]?)(?:I?B)?\s*', str(text), re.IGNORECASE)
+    if not match:
+        raise ValueError(f"无效的内存大小 '{text}'，示例：512M、2G")
+    return int(float(match.group(1)) * _SIZE_UNITS[match.group(2).upper()])
+
+
+def plan_frame_pool(
+    frame_bytes: int,
+    queue_size: int = PIPELINE_QUEUE_SIZE,
+    max_frames: Optional[int] = None,
+    max_memory: Optional[int] = None
+) -> int:
+    """计算帧缓冲区池的缓冲区数量（即在途帧数上限）
+
+    默认为两个队列、三个阶段各持有一帧，另加解码阶段预读的一帧；再按 max_frames 和
+    max_memory 取较小值。max_frames、max_memory 为 None 时读取对应的环境变量。
+
+    Args:
+        frame_bytes: 每帧字节数
+        queue_size: 阶段之间队列的容量（帧）
+        max_frames: 在途帧数上限
+        max_memory: 帧缓冲区的内存上限（字节）
+
+    Returns:
+        缓冲区数量
+
+    Raises:
+        ValueError: 上限不足以容纳流水线运行所需的 2 帧
+    """
+    if max_frames is None and os.environ.get(MAX_FRAMES_ENV):
+        max_frames = int(os.environ[MAX_FRAMES_ENV])
+    if max_memory is None and os.environ.get(MAX_MEMORY_ENV):
+        max_memory = parse_memory_size(os.environ[MAX_MEMORY_ENV])
+
+    count = 2 * queue_size + 4
+    if max_frames is not None:
+        count = min(count, max_frames)
+    if max_memory is not None:
+        count = min(count, max_memory // frame_bytes)
+    if count < 2:
+        raise ValueError(
+            f'在途帧上限不足：流水线至少需要 2 帧（每帧 {frame_bytes / 1024 ** 2:.1f}MB），'
+            f'当前 max_frames={max_frames}，max_memory={max_memory}'
+        )
+    return count
+
+
+def process_compositing_available() -> bool:
+    """当前进程能否使用多进程合成（需要 fork 启动方式，且守护进程不能再创建子进程）"""
+    return ('fork' in multiprocessing.get_all_start_methods() and
+            not multiprocessing.current_process().daemon)
+
+
+def render_pipelined(
+    clip,
+    output_path: str,
+    process: Optional[Callable[[np.ndarray, float], np.ndarray]] = None,
+    threads: Optional[int] = None,
+    queue_size: int = PIPELINE_QUEUE_SIZE,
+    codec: str = 'libx264',
+    audio_codec: str = 'aac',
+    source_path: Optional[str] = None,
+    max_frames: Optional[int] = None,
+    max_memory: Optional[int] = None,
+    compose_processes: Optional[int] = None,
+    pix_fmt: Optional[str] = None
+) -> PipelineStats:
+    """以流水线方式渲染视频，参数与 write_videofile 的默认编码设置一致
+
+    Args:
+        clip: 要解码的视频剪辑（逐帧 get_frame 在解码线程中调用）
+        output_path: 输出视频文件路径
+        process: 合成函数 (帧, 时间) -> 帧，在合成线程中调用；帧来自帧缓冲区池，
+                 可以原地修改。yuv420p 时帧为 (高 × 3/2, 宽) 的二维数组（见 overlay.yuv420_planes）。
+                 None 表示不合成（解码、编码两个阶段）
+        threads: 编码线程数
+        queue_size: 阶段之间队列的容量（帧）
+        codec: 视频编码器
+        audio_codec: 音频编码器（音轨先完整编码，再在封装时直接复制）
+        source_path: clip 对应的视频文件（clip 须为该文件未经变换的 VideoFileClip）。
+                     给出时绕过 moviepy 的读取器，零拷贝解码到复用缓冲区；
+                     None 表示逐帧调用 clip.get_frame（适用于拼接、变换后的剪辑）
+        max_frames: 在途帧数上限，None 表示读取环境变量 VIDEO_WATERMARK_MAX_FRAMES
+        max_memory: 帧缓冲区内存上限（字节），None 表示读取环境变量 VIDEO_WATERMARK_MAX_MEMORY
+        compose_processes: 合成进程数，None 表示读取环境变量 VIDEO_WATERMARK_COMPOSE_PROCESSES。
+                           大于 0 时解码和合成在独立进程中运行（process 由 fork 继承，无需可 pickle）；
+                           需要给出 source_path、平台支持 fork，否则仍在本进程的线程中合成
+        pix_fmt: 合成像素格式 rgb24 或 yuv420p，None 表示读取环境变量 VIDEO_WATERMARK_COMPOSITE_FORMAT
+                 （默认 rgb24）。yuv420p 需要给出 source_path、偶数宽高、libx264 编码且没有遮罩，
+                 否则仍在 RGB 中合成
+
+    Returns:
+        各阶段的统计
+
+    Raises:
+        ValueError: 上限不足以容纳 2 帧，或像素格式无效
+    """
+    if pix_fmt is None:
+        pix_fmt = os.environ.get(COMPOSITE_FORMAT_ENV) or 'rgb24'
+    if pix_fmt not in COMPOSITE_FORMATS:
+        raise ValueError(f"合成像素格式必须是 {COMPOSITE_FORMATS} 之一， got '{pix_fmt}'")
+    width, height = clip.size
+    if pix_fmt == 'yuv420p' and (not source_path or width % 2 or height % 2 or
+                                 codec != 'libx264' or clip.mask is not None):
+        logger.debug('YUV420 合成需要源文件路径、偶数宽高、libx264 编码且没有遮罩，改为在 RGB 中合成')
+        pix_fmt = 'rgb24'
+
+    if pix_fmt == 'yuv420p':
+        shape = raw_frame_shape(clip.size, pix_fmt)
+    else:
+        shape = (height, width, 4 if clip.mask is not None else 3)
+    count = plan_frame_pool(int(np.prod(shape)), queue_size, max_frames, max_memory)
+
+    if compose_processes is None:
+        compose_processes = int(os.environ.get(COMPOSE_PROCESSES_ENV) or 0)
+    if compose_processes > 0 and not (process is not None and source_path and
+                                      process_compositing_available()):
+        logger.debug('多进程合成需要源文件路径且平台支持 fork，改为在线程中合成')
+        compose_processes = 0
+
+    # 缓冲区在任务开始前一次性分配，渲染过程中循环复用（多进程时改用共享内存槽位）
+    pool = FramePool(shape, count) if compose_processes == 0 else None
+
+    temp_dir = tempfile.mkdtemp(prefix='pipeline_')
+    try:
+        # 与 write_videofile 相同：先编码音轨，写视频时直接复制
+        audio_path = None
+        if clip.audio is not None:
+            audio_path = os.path.join(temp_dir, 'audio.m4a')
+            clip.audio.write_audiofile(audio_path, fps=44100, codec=audio_codec, logger=None)
+
+        if pix_fmt == 'yuv420p':
+            writer = RawFrameWriter(output_path, clip.size, clip.fps, pix_fmt, codec=codec,
+                                    audiofile=audio_path, threads=threads)
+        else:
+            writer = FrameWriter(
+                output_path, clip.size, clip.fps, codec=codec, preset='medium',
+                with_mask=clip.mask is not None, audiofile=audio_path,
+                audio_codec='copy' if audio_path else None, threads=threads
+            )
+        try:
+            if compose_processes > 0:
+                stats = _run_processes(clip, writer, process, count, source_path,
+                                       compose_processes, pix_fmt)
+            else:
+                stats = _run_stages(clip, writer, process, pool, queue_size, source_path,
+                                    pix_fmt)
+        finally:
+            writer.close()
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    logger.info(stats.describe())
+    return stats
+
+
+def _run_stages(
+    clip,
+    writer: FrameWriter,
+    process,
+    pool: FramePool,
+    queue_size: int,
+    source_path: Optional[str],
+    pix_fmt: str = 'rgb24'
+) -> PipelineStats:
+    """启动解码、合成线程，在当前线程写入编码器，任一阶段失败时全部停止并抛出原异常
+
+    队列中的每项为 (时间, 帧, 缓冲区)：帧总是解码到帧缓冲区池的缓冲区中，由编码阶段写完后归还，
+    因此在途帧数不超过池的容量。
+    """
+    stop = threading.Event()
+    errors: List[BaseException] = []
+
+    read_stats = StageStats('解码')
+    compose_stats = StageStats('合成')
+    write_stats = StageStats('编码')
+
+    decoded: queue.Queue = queue.Queue(maxsize=queue_size)
+    composed: queue.Queue = queue.Queue(maxsize=queue_size) if process is not None else decoded
+
+    def run(stage: Callable[[], None]) -> None:
+        try:
+            stage()
+        except _Cancelled:
+            pass
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+
+    def read() -> None:
+        frames = clip.iter_frames(fps=clip.fps, with_times=True, dtype='uint8')
+        while True:
+            buffer = None
+            started = time.perf_counter()
+            item = next(frames, _END)
+            read_stats.busy += time.perf_counter() - started
+            if item is not _END:
+                # moviepy 可能复用返回的数组，复制到池中的缓冲区后可供合成阶段原地修改
+                buffer, waited = _acquire(pool, stop)
+                read_stats.waiting += waited
+                started = time.perf_counter()
+                t, frame = item
+                np.copyto(buffer[:, :, :3], frame)
+                if clip.mask is not None:
+                    np.copyto(buffer[:, :, 3], 255 * clip.mask.get_frame(t), casting='unsafe')
+                item = (t, buffer, buffer)
+                read_stats.busy += time.perf_counter() - started
+            read_stats.waiting += _put(decoded, item, stop)
+            if item is _END:
+                return
+            read_stats.frames += 1
+
+    def read_file() -> None:
+        frame_count = int(clip.duration * clip.fps)
+        with RawFrameReader(source_path, clip.size, pix_fmt) as reader:
+            # 已读出、尚未放入队列的一帧：源视频帧数不足时用于重复最后一帧（与 moviepy 一致）
+            held = None
+            for index in range(frame_count):
+                buffer, waited = _acquire(pool, stop)
+                read_stats.waiting += waited
+                started = time.perf_counter()
+                if not reader.read_into(buffer):
+                    if held is None:
+                        raise IOError(f'无法读取视频帧: {source_path}')
+                    np.copyto(buffer, held[1])
+                read_stats.busy += time.perf_counter() - started
+
+                if held is not None:
+                    read_stats.waiting += _put(decoded, held, stop)
+                    read_stats.frames += 1
+                held = (index / clip.fps, buffer, buffer)
+
+            if held is not None:
+                read_stats.waiting += _put(decoded, held, stop)
+                read_stats.frames += 1
+        read_stats.waiting += _put(decoded, _END, stop)
+
+    def compose() -> None:
+        while True:
+            item, waited = _get(decoded, stop)
+            compose_stats.waiting += waited
+            if item is not _END:
+                started = time.perf_counter()
+                t, frame, buffer = item
+                item = (t, process(frame, t), buffer)
+                compose_stats.busy += time.perf_counter() - started
+                compose_stats.frames += 1
+            compose_stats.waiting += _put(composed, item, stop)
+            if item is _END:
+                return
+
+    def write() -> None:
+        while True:
+            item, waited = _get(composed, stop)
+            write_stats.waiting += waited
+            if item is _END:
+                return
+            started = time.perf_counter()
+            _, frame, buffer = item
+            writer.write_frame(frame)
+            write_stats.busy += time.perf_counter() - started
+            write_stats.frames += 1
+            pool.release(buffer)
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=run, args=(read_file if source_path else read,),
+                                name='pipeline-read', daemon=True)]
+    if process is not None:
+        workers.append(threading.Thread(target=run, args=(compose,), name='pipeline-compose',
+                                        daemon=True))
+    for worker in workers:
+        worker.start()
+    run(write)
+    for worker in workers:
+        worker.join()
+    wall = time.perf_counter() - started
+
+    if errors:
+        raise errors[0]
+
+    stages = [read_stats] + ([compose_stats] if process is not None else []) + [write_stats]
+    return PipelineStats(stages, wall)
+
+
+def _run_processes(
+    clip,
+    writer: FrameWriter,
+    process,
+    slots: int,
+    source_path: str,
+    processes: int,
+    pix_fmt: str = 'rgb24'
+) -> PipelineStats:
+    """解码、合成各在独立进程中运行，当前进程按帧序号重排后写入编码器，任一进程失败时全部停止
+
+    帧存放在共享内存的 slots 个槽位中，队列只传递槽位号：
+    free（空闲槽位）→ 解码进程 → decoded (帧序号, 槽位) → 合成进程 → results → 编码（写完归还 free）。
+    results 中另有各进程结束时的统计 ('done', StageStats) 和错误 ('error', 异常)。
+    """
+    context = multiprocessing.get_context('fork')
+    stop = context.Event()
+    free = context.Queue()
+    decoded = context.Queue()
+    results = context.Queue()
+
+    shape = raw_frame_shape(clip.size, pix_fmt)
+    memory = shared_memory.SharedMemory(create=True, size=slots * int(np.prod(shape)))
+    frames = np.ndarray((slots,) + shape, np.uint8, buffer=memory.buf)
+
+    def decode() -> StageStats:
+        stats = StageStats('解码')
+        frame_count = int(clip.duration * clip.fps)
+        with RawFrameReader(source_path, clip.size, pix_fmt) as reader:
+            # 已读出、尚未交给合成进程的一帧：源视频帧数不足时用于重复最后一帧
+            held: Optional[Tuple[int, int]] = None
+            for index in range(frame_count):
+                slot, waited = _get(free, stop)
+                stats.waiting += waited
+                started = time.perf_counter()
+                if not reader.read_into(frames[slot]):
+                    if held is None:
+                        raise IOError(f'无法读取视频帧: {source_path}')
+                    np.copyto(frames[slot], frames[held[1]])
+                stats.busy += time.perf_counter() - started
+
+                if held is not None:
+                    decoded.put(held)
+                    stats.frames += 1
+                held = (index, slot)
+
+            if held is not None:
+                decoded.put(held)
+                stats.frames += 1
+        # 每个合成进程收到一个结束标记
+        for _ in range(processes):
+            decoded.put(None)
+        return stats
+
+    def compose(name: str) -> Callable[[], StageStats]:
+        def stage() -> StageStats:
+            stats = StageStats(name)
+            while True:
+                item, waited = _get(decoded, stop)
+                stats.waiting += waited
+                if item is None:
+                    return stats
+                started = time.perf_counter()
+                index, slot = item
+                frame = frames[slot]
+                result = process(frame, index / clip.fps)
+                if result is not frame:
+                    np.copyto(frame, result)
+                results.put(('frame', index, slot))
+                stats.busy += time.perf_counter() - started
+                stats.frames += 1
+        return stage
+
+    def run(stage: Callable[[], StageStats]) -> None:
+        try:
+            results.put(('done', stage()))
+        except _Cancelled:
+            pass
+        except BaseException as e:
+            # 异常须能 pickle 才能传回主进程
+            try:
+                pickle.dumps(e)
+            except Exception:
+                e = RuntimeError(f'{type(e).__name__}: {e}')
+            results.put(('error', e))
+            stop.set()
+
+    names = ['合成'] if processes == 1 else [f'合成{i + 1}' for i in range(processes)]
+    workers = [context.Process(target=run, args=(decode,), name='pipeline-decode', daemon=True)]
+    workers += [context.Process(target=run, args=(compose(name),), name='pipeline-compose',
+                                daemon=True)
+                for name in names]
+
+    started = time.perf_counter()
+    write_stats = StageStats('编码')
+    finished = {}
+    try:
+        for worker in workers:
+            worker.start()
+        # 子进程启动后再放入空闲槽位：队列的后台发送线程不能在 fork 之前启动
+        for slot in range(slots):
+            free.put(slot)
+
+        # 合成进程完成的顺序不确定，按帧序号缓存并依次写出
+        pending = {}
+        next_index = 0
+        while len(finished) < len(workers):
+            waited = time.perf_counter()
+            try:
+                message = results.get(timeout=_POLL_INTERVAL)
+            except queue.Empty:
+                if any(worker.exitcode not in (None, 0) for worker in workers):
+                    raise RuntimeError('流水线子进程异常退出')
+                continue
+            finally:
+                write_stats.waiting += time.perf_counter() - waited
+
+            if message[0] == 'error':
+                raise message[1]
+            if message[0] == 'done':
+                finished[message[1].name] = message[1]
+                continue
+
+            _, index, slot = message
+            pending[index] = slot
+            while next_index in pending:
+                slot = pending.pop(next_index)
+                write_started = time.perf_counter()
+                writer.write_frame(frames[slot])
+                write_stats.busy += time.perf_counter() - write_started
+                write_stats.frames += 1
+                free.put(slot)
+                next_index += 1
+    finally:
+        stop.set()
+        for worker in workers:
+            worker.join(timeout=5)
+            if worker.is_alive():
+                worker.terminate()
+                worker.join()
+        # 释放对共享内存的引用后才能关闭；出错时异常的回溯可能仍引用帧，交给垃圾回收
+        del frames
+        try:
+            memory.close()
+        except BufferError:
+            pass
+        memory.unlink()
+
+    wall = time.perf_counter() - started
+    stages = [finished['解码']] + [finished[name] for name in names] + [write_stats]
+    return PipelineStats(stages, wall)
+
+
+def _put(target: queue.Queue, item, stop: threading.Event) -> float:
+    """放入队列（队列满时阻塞），返回等待时间；其他阶段失败时抛出 _Cancelled"""
+    started = time.perf_counter()
+    while True:
+        if stop.is_set():
+            raise _Cancelled()
+        try:
+            target.put(item, timeout=_POLL_INTERVAL)
+            return time.perf_counter() - started
+        except queue.Full:
+            continue
+
+
+def _acquire(pool: FramePool, stop: threading.Event):
+    """从帧缓冲区池取出空闲缓冲区（池空时阻塞），返回 (缓冲区, 等待时间)"""
+    started = time.perf_counter()
+    while True:
+        if stop.is_set():
+            raise _Cancelled()
+        buffer = pool.acquire(timeout=_POLL_INTERVAL)
+        if buffer is not None:
+            return buffer, time.perf_counter() - started
+
+
+def _get(source: queue.Queue, stop: threading.Event):
+    """从队列取出一项（队列空时阻塞），返回 (项, 等待时间)；其他阶段失败时抛出 _Cancelled"""
+    started = time.perf_counter()
+    while True:
+        if stop.is_set():
+            raise _Cancelled()
+        try:
+            item = source.get(timeout=_POLL_INTERVAL)
+            return item, time.perf_counter() - started
+        except queue.Empty:
+            continue
@@ -0,0 +1,249 @@
+"""轻量媒体信息探测：一次 ffprobe 调用获取时长、帧率、分辨率、编码和音频布局，结果持久缓存
+
+只需要元数据的场景（参数校验、默认结束时间、批量预检等）用 probe_media 代替
+VideoFileClip，避免启动帧读取器和音频读取器。
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from fractions import Fraction
+from typing import NamedTuple, Optional, Tuple
+
+from .ffmpeg_tools import run_ffprobe
+
+# 缓存格式版本，探测字段变化时递增以使旧缓存失效
+PROBE_CACHE_VERSION = 2
+
+# 缓存条目上限，超出时删除最久未使用的条目（临时文件的探测结果也会进入缓存）
+PROBE_CACHE_MAX_ENTRIES = 5000
+
+# 指定缓存数据库路径的环境变量，设为空字符串时禁用持久缓存
+PROBE_DB_ENV = 'VIDEO_WATERMARK_PROBE_DB'
+
+# 估算关键帧间隔时读取的视频开头时长（秒），只读数据包头，不解码
+KEYFRAME_SCAN_SECONDS = 20
+
+
+class MediaInfo(NamedTuple):
+    """媒体文件信息（视频流、音频流取第一个）"""
+    duration: float
+    width: int
+    height: int
+    fps: float
+    video_codec: Optional[str]
+    pix_fmt: Optional[str]
+    keyframe_interval: Optional[float]    # 平均关键帧间隔（秒），开头只有一个关键帧时为 None
+    audio_codec: Optional[str]
+    sample_rate: int
+    channels: int
+    channel_layout: Optional[str]
+    video_stream: Optional[dict]          # ffprobe 原始流信息
+    audio_stream: Optional[dict]
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        return self.width, self.height
+
+    @property
+    def has_video(self) -> bool:
+        return self.video_stream is not None
+
+    @property
+    def has_audio(self) -> bool:
+        return self.audio_stream is not None
+
+
+def default_probe_db_path() -> Optional[str]:
+    """默认缓存数据库路径：环境变量 VIDEO_WATERMARK_PROBE_DB，否则在用户缓存目录下
+
+    Returns:
+        数据库路径；环境变量设为空字符串时返回 None（禁用缓存）
+    """
+    if PROBE_DB_ENV in os.environ:
+        return os.environ[PROBE_DB_ENV] or None
+    from ..watermark.asset_cache import user_cache_dir
+    return os.path.join(user_cache_dir(), 'probe.sqlite3')
+
+
+class ProbeCache:
+    """探测结果的 SQLite 缓存，键为 (绝对路径, 文件大小, 修改时间)
+
+    每次操作单独打开连接，多个进程可同时读写；数据库不可用时视为未命中。
+    """
+
+    def __init__(self, db_path: Optional[str] = None, max_entries: int = PROBE_CACHE_MAX_ENTRIES):
+        """
+        Args:
+            db_path: 数据库路径，None 表示使用 default_probe_db_path()
+            max_entries: 缓存条目上限
+        """
+        self._db_path = db_path
+        self.max_entries = max_entries
+        self._initialized = False
+        self._lock = threading.Lock()
+
+    @property
+    def db_path(self) -> Optional[str]:
+        # 默认路径在首次使用时确定（避免导入时依赖 watermark 包）
+        if self._db_path is None:
+            self._db_path = default_probe_db_path() or ''
+        return self._db_path
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        if not self._initialized:
+            with self._lock, conn:
+                conn.execute(
+                    'CREATE TABLE IF NOT EXISTS probes ('
+                    'path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, '
+                    'version INTEGER, used REAL, data TEXT)'
+                )
+                self._initialized = True
+        return conn
+
+    def get(self, path: str, stat: os.stat_result) -> Optional[dict]:
+        """读取缓存的探测结果，文件已变化或未命中时返回 None"""
+        if not self.db_path:
+            return None
+        try:
+            with closing(self._connect()) as conn, conn:
+                row = conn.execute(
+                    'SELECT data FROM probes WHERE path = ? AND size = ? AND mtime_ns = ? '
+                    'AND version = ?',
+                    (path, stat.st_size, stat.st_mtime_ns, PROBE_CACHE_VERSION)
+                ).fetchone()
+                if row is None:
+                    return None
+                conn.execute('UPDATE probes SET used = ? WHERE path = ?', (time.time(), path))
+            return json.loads(row[0])
+        except (sqlite3.Error, ValueError):
+            return None
+
+    def put(self, path: str, stat: os.stat_result, data: dict) -> None:
+        """写入探测结果，超出条目上限时删除最久未使用的条目"""
+        if not self.db_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            with closing(self._connect()) as conn, conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO probes VALUES (?, ?, ?, ?, ?, ?)',
+                    (path, stat.st_size, stat.st_mtime_ns, PROBE_CACHE_VERSION,
+                     time.time(), json.dumps(data))
+                )
+                count = conn.execute('SELECT COUNT(*) FROM probes').fetchone()[0]
+                if count > self.max_entries:
+                    conn.execute(
+                        'DELETE FROM probes WHERE path IN '
+                        '(SELECT path FROM probes ORDER BY used LIMIT ?)',
+                        (count - self.max_entries,)
+                    )
+        except (OSError, sqlite3.Error):
+            pass
+
+    def clear(self) -> None:
+        """删除全部缓存条目"""
+        if not self.db_path or not os.path.exists(self.db_path):
+            return
+        try:
+            with closing(self._connect()) as conn, conn:
+                conn.execute('DELETE FROM probes')
+        except sqlite3.Error:
+            pass
+
+
+probe_cache = ProbeCache()
+
+
+def probe_media(path: str, use_cache: bool = True) -> MediaInfo:
+    """获取媒体文件信息（单次 ffprobe 调用，结果按文件大小和修改时间持久缓存）
+
+    Args:
+        path: 媒体文件路径
+        use_cache: 是否使用持久缓存
+
+    Returns:
+        MediaInfo
+
+    Raises:
+        FileNotFoundError: 文件不存在
+        RuntimeError: ffprobe 无法解析文件
+    """
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+
+    data = probe_cache.get(path, stat) if use_cache else None
+    if data is None:
+        data = _probe(path)
+        if use_cache:
+            probe_cache.put(path, stat, data)
+    return MediaInfo(**data)
+
+
+def _probe(path: str) -> dict:
+    """执行 ffprobe：流信息、容器时长和开头一段的数据包（用于估算关键帧间隔）
+
+    视频流同时记录编码档次、级别和编码器全局头（SPS/PPS）的哈希，用于判断片段能否流复制拼接。
+    """
+    data = run_ffprobe([
+        '-read_intervals', f'%+{KEYFRAME_SCAN_SECONDS}',
+        '-show_data_hash', 'SHA256',
+        '-show_entries',
+        'stream=index,codec_type,codec_name,profile,level,extradata_hash,pix_fmt,width,height,'
+        'sample_aspect_ratio,start_time,time_base,r_frame_rate,sample_rate,channels,channel_layout'
+        ':format=duration'
+        ':packet=stream_index,pts_time,flags',
+        path
+    ])
+
+    video_stream = None
+    audio_stream = None
+    for stream in data.get('streams', []):
+        if stream.get('codec_type') == 'video' and video_stream is None:
+            video_stream = stream
+        elif stream.get('codec_type') == 'audio' and audio_stream is None:
+            audio_stream = stream
+
+    video = video_stream or {}
+    audio = audio_stream or {}
+    return {
+        'duration': float(data.get('format', {}).get('duration') or 0),
+        'width': int(video.get('width') or 0),
+        'height': int(video.get('height') or 0),
+        'fps': _parse_rate(video.get('r_frame_rate')),
+        'video_codec': video.get('codec_name'),
+        'pix_fmt': video.get('pix_fmt'),
+        'keyframe_interval': _keyframe_interval(data.get('packets', []), video.get('index')),
+        'audio_codec': audio.get('codec_name'),
+        'sample_rate': int(audio.get('sample_rate') or 0),
+        'channels': int(audio.get('channels') or 0),
+        'channel_layout': audio.get('channel_layout'),
+        'video_stream': video_stream,
+        'audio_stream': audio_stream,
+    }
+
+
+def _parse_rate(rate: Optional[str]) -> float:
+    """解析 ffprobe 的分数形式帧率（如 '30000/1001'），无效时返回 0"""
+    try:
+        return float(Fraction(rate))
+    except (TypeError, ValueError, ZeroDivisionError):
+        return 0.0
+
+
+def _keyframe_interval(packets: list, stream_index: Optional[int]) -> Optional[float]:
+    """由数据包标志计算平均关键帧间隔"""
+    if stream_index is None:
+        return None
+    keyframes = sorted(
+        float(packet['pts_time']) for packet in packets
+        if packet.get('stream_index') == stream_index and 'K' in packet.get('flags', '')
+        and packet.get('pts_time') not in (None, 'N/A')
+    )
+    if len(keyframes) < 2:
+        return None
+    return (keyframes[-1] - keyframes[0]) / (len(keyframes) - 1)
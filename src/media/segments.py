@@ -0,0 +1,377 @@
+"""视频分段工具：关键帧查询、按关键帧无损切分与拼接"""
+
+import bisect
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+from .ffmpeg_tools import run_ffmpeg
+from .keyframes import load_keyframe_index
+from .probe import probe_media
+
+# 重编码片段由 libx264 输出 yuv420p，只有与之一致的源才能无损拼接
+SMART_RENDER_CODECS = ('h264',)
+SMART_RENDER_PIX_FMTS = ('yuv420p',)
+
+
+def probe_streams(video_path: str) -> Tuple[Optional[dict], Optional[dict], float]:
+    """获取第一个视频流、第一个音频流的信息和文件时长（经由 probe_media 缓存）
+
+    Returns:
+        (视频流信息, 音频流信息, 时长秒数)，流不存在时对应项为 None
+    """
+    info = probe_media(video_path)
+    return info.video_stream, info.audio_stream, info.duration
+
+
+def list_keyframes(video_path: str) -> List[float]:
+    """列出视频流所有关键帧的时间（秒，相对于视频流起点）
+
+    只读取数据包头，不解码；结果经由关键帧索引缓存（见 load_keyframe_index）。
+    """
+    return load_keyframe_index(video_path).times
+
+
+def video_streams_match(first: Optional[dict], second: Optional[dict]) -> bool:
+    """判断两个视频流的编码参数是否一致（可直接流复制拼接）
+
+    比较编码格式、档次、级别、编码器全局头（SPS/PPS）、分辨率、像素格式、时间基和帧率。
+    拼接结果只保留第一个片段的全局头，全局头不同的片段拼接后无法正确解码。
+    """
+    if first is None or second is None:
+        return False
+    keys = ('codec_name', 'profile', 'level', 'extradata_hash', 'width', 'height', 'pix_fmt',
+            'time_base', 'r_frame_rate')
+    return all(first.get(key) == second.get(key) for key in keys)
+
+
+def segments_match(reference: Optional[dict], segment_paths: List[str]) -> bool:
+    """判断重编码得到的片段能否与参考视频流无损拼接（见 video_streams_match）"""
+    return all(video_streams_match(reference, probe_streams(path)[0]) for path in segment_paths)
+
+
+def copy_sample_aspect_ratio(segment_path: str, reference: Optional[dict]) -> None:
+    """把参考流的样本宽高比写入 h264 片段的 SPS（只改写码流头，不重编码）
+
+    经原始帧管道编码的片段不带样本宽高比，SPS 因此与源不同，无法与源的GOP拼接。
+    """
+    if reference is None or reference.get('codec_name') != 'h264':
+        return
+    sar = reference.get('sample_aspect_ratio')
+    stream = probe_streams(segment_path)[0]
+    if not sar or sar == '0:1' or stream is None or stream.get('sample_aspect_ratio') == sar:
+        return
+    fixed_path = os.path.splitext(segment_path)[0] + '_sar.mp4'
+    run_ffmpeg(['-i', segment_path, '-map', '0', '-c', 'copy',
+                '-bsf:v', f"h264_metadata=sample_aspect_ratio={sar.replace(':', '/')}", fixed_path])
+    os.replace(fixed_path, segment_path)
+
+
+def plan_reencode_window(
+    keyframes: List[float],
+    start: float,
+    end: float
+) -> Optional[Tuple[float, Optional[float]]]:
+    """计算覆盖 [start, end) 所需重编码的关键帧区间
+
+    Returns:
+        (a, b)：a 为 start 之前最近的关键帧，b 为 end 之后最近的关键帧
+        （None 表示到视频结尾）；整个视频都需要重编码时返回 None
+    """
+    index = bisect.bisect_right(keyframes, start + 1e-6) - 1
+    a = keyframes[index] if index >= 0 else 0.0
+
+    index = bisect.bisect_left(keyframes, end - 1e-6)
+    b = keyframes[index] if index < len(keyframes) else None
+
+    if a <= 0 and b is None:
+        return None
+    return a, b
+
+
+def plan_parallel_cuts(keyframes: List[float], duration: float, count: int) -> List[float]:
+    """把视频大致等分为 count 段，每个切点取离等分点最近的关键帧
+
+    Returns:
+        升序、去重后的切点列表（不含 0 和视频结尾），关键帧不足时少于 count - 1 个
+    """
+    cuts: List[float] = []
+    for i in range(1, count):
+        target = duration * i / count
+        index = bisect.bisect_left(keyframes, target)
+        candidates = keyframes[max(index - 1, 0):index + 1]
+        if not candidates:
+            continue
+        t = min(candidates, key=lambda k: abs(k - target))
+        if 0 < t < duration and (not cuts or t > cuts[-1] + 1e-6):
+            cuts.append(t)
+    return cuts
+
+
+def split_at_keyframes(video_path: str, cut_times: List[float], output_dir: str) -> List[str]:
+    """在给定的关键帧时间处把视频流无损切分为 mp4 片段（仅视频流）
+
+    Args:
+        video_path: 输入视频路径
+        cut_times: 切分点（必须是关键帧时间，升序）
+        output_dir: 片段输出目录
+
+    Returns:
+        按时间顺序排列的片段路径列表（长度为 len(cut_times) + 1）
+    """
+    if not cut_times:
+        # 不切分：整个视频流重新封装为单个片段
+        segment = os.path.join(output_dir, 'segment_000.mp4')
+        run_ffmpeg(['-i', video_path, '-map', '0:v:0', '-c', 'copy', segment])
+        return [segment]
+
+    # 分段器在不早于给定时间的第一个关键帧处切分，略微提前以避开浮点误差
+    times = ','.join(f'{max(t - 0.001, 0):.6f}' for t in cut_times)
+    pattern = os.path.join(output_dir, 'segment_%03d.mp4')
+    run_ffmpeg(['-i', video_path, '-map', '0:v:0', '-c', 'copy',
+                '-f', 'segment', '-segment_format', 'mp4', '-reset_timestamps', '1',
+                '-segment_times', times, pattern])
+
+    segments = [os.path.join(output_dir, f'segment_{i:03d}.mp4')
+                for i in range(len(cut_times) + 1)]
+    missing = [path for path in segments if not os.path.isfile(path)]
+    if missing:
+        raise RuntimeError(f'视频切分结果不完整，缺少片段: {missing}')
+    return segments
+
+
+def encode_segment(
+    segment_path: str,
+    output_path: str,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    threads: Optional[int] = None,
+    size: Optional[Tuple[int, int]] = None,
+    frame_rate: Optional[str] = None
+) -> str:
+    """把片段的 [start, end) 部分精确解码并重编码为 h264/yuv420p（仅视频流）
+
+    用于切点不在关键帧上时，只重编码切点所在的那一小段GOP；
+    指定 size / frame_rate 时同时缩放并转换帧率，使片段可与其他片段拼接。
+
+    Returns:
+        输出文件路径
+    """
+    args = []
+    if start is not None and start > 0:
+        args += ['-ss', f'{start:.6f}']
+    args += ['-i', segment_path]
+    if end is not None:
+        args += ['-t', f'{end - (start or 0):.6f}']
+    args += ['-map', '0:v:0']
+
+    filters = []
+    if size is not None:
+        filters += [f'scale={size[0]}:{size[1]}', 'setsar=1']
+    if frame_rate is not None:
+        filters.append(f'fps={frame_rate}')
+    if filters:
+        args += ['-vf', ','.join(filters)]
+
+    args += ['-c:v', 'libx264', '-preset', 'medium', '-pix_fmt', 'yuv420p', '-an']
+    if threads:
+        args += ['-threads', str(threads)]
+    args += [output_path]
+    run_ffmpeg(args)
+    return output_path
+
+
+def concat_segments(
+    segment_paths: List[str],
+    output_path: str,
+    audio_source: Optional[str] = None,
+    audio_codec: str = 'copy'
+) -> None:
+    """用 concat 分离器无损拼接视频片段，音频取自 audio_source
+
+    Args:
+        segment_paths: 按顺序排列的视频片段
+        output_path: 输出文件路径
+        audio_source: 提供音轨的文件（None 表示无音频）
+        audio_codec: 音频编码器，'copy' 表示直接复制
+    """
+    list_path = os.path.join(os.path.dirname(os.path.abspath(segment_paths[0])), 'concat_list.txt')
+    with open(list_path, 'w', encoding='utf-8') as f:
+        for path in segment_paths:
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+
+    args = ['-f', 'concat', '-safe', '0', '-i', list_path]
+    if audio_source:
+        args += ['-i', audio_source, '-map', '0:v', '-map', '1:a?',
+                 '-c:v', 'copy', '-c:a', audio_codec]
+    else:
+        args += ['-map', '0:v', '-c:v', 'copy']
+    run_ffmpeg(args + [output_path])
+
+
+def render_window_only(
+    video_path: str,
+    output_path: str,
+    start_time: Optional[float],
+    end_time: Optional[float],
+    render_segment: Callable[[str, str, float, float], None]
+) -> bool:
+    """只重编码与 [start_time, end_time) 重叠的GOP，其余部分流复制后无损拼接
+
+    Args:
+        video_path: 输入视频路径
+        output_path: 输出视频路径
+        start_time: 处理开始时间（秒），None 表示视频开始
+        end_time: 处理结束时间（秒），None 表示视频结束
+        render_segment: 重编码回调 (片段路径, 输出路径, 片段内开始时间, 片段内结束时间)，
+                        输出必须是 h264/yuv420p
+
+    Returns:
+        是否完成了部分重编码；返回 False（含重编码结果与源的编码参数不一致）时调用方应走完整渲染流程
+    """
+    video_stream, audio_stream, duration = probe_streams(video_path)
+    if video_stream is None:
+        return False
+    if (video_stream.get('codec_name') not in SMART_RENDER_CODECS or
+            video_stream.get('pix_fmt') not in SMART_RENDER_PIX_FMTS):
+        return False
+
+    start = start_time or 0.0
+    end = duration if end_time is None else min(end_time, duration)
+    if end <= start:
+        return False
+
+    window = plan_reencode_window(list_keyframes(video_path), start, end)
+    if window is None:
+        return False
+    a, b = window
+
+    cut_times = [t for t in (a, b) if t is not None and t > 0]
+    temp_dir = tempfile.mkdtemp(prefix='smart_render_')
+    try:
+        segments = split_at_keyframes(video_path, cut_times, temp_dir)
+
+        # 需要重编码的片段：a > 0 时前面还有一段流复制的片段
+        index = 1 if a > 0 else 0
+        rendered_path = os.path.join(temp_dir, 'rendered.mp4')
+        render_segment(segments[index], rendered_path, start - a, end - a)
+        # 档次、级别或全局头与源不一致时不能与流复制的GOP拼接
+        copy_sample_aspect_ratio(rendered_path, video_stream)
+        if not segments_match(video_stream, [rendered_path]):
+            return False
+        segments[index] = rendered_path
+
+        audio_codec = 'copy'
+        if audio_stream is not None and audio_stream.get('codec_name') != 'aac':
+            audio_codec = 'aac'
+        concat_segments(
+            segments, output_path,
+            audio_source=video_path if audio_stream is not None else None,
+            audio_codec=audio_codec
+        )
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    return True
+
+
+def render_segments_parallel(
+    video_path: str,
+    output_path: str,
+    segments: int,
+    render_func: Callable[..., None],
+    render_kwargs: dict,
+    start_time: Optional[float] = None,
+    end_time: Optional[float] = None,
+    threads: Optional[int] = None
+) -> bool:
+    """分段并行渲染：在关键帧处把视频切为约 segments 段，由多个工作进程分别处理后无损拼接
+
+    每段调用 render_func(video_path=片段, output_path=输出, start_time=, end_time=, threads=,
+    **render_kwargs)，时间范围换算为片段内的局部时间，保证水印在全局时间轴上的位置不变。
+    与 [start_time, end_time) 不重叠的片段：源为 h264/yuv420p 时直接流复制，否则只做重编码。
+
+    Args:
+        video_path: 输入视频路径
+        output_path: 输出视频路径
+        segments: 目标分段数（即并行进程数）
+        render_func: 模块级渲染函数（需可被进程池序列化），输出必须是 h264/yuv420p
+        render_kwargs: 渲染函数的其余参数
+        start_time: 处理开始时间（秒），None 表示视频开始
+        end_time: 处理结束时间（秒），None 表示视频结束
+        threads: 每个工作进程的编码线程数，默认按分段数平均分配CPU核心
+
+    Returns:
+        是否完成了分段渲染；返回 False（关键帧不足以切分、各段编码参数不一致等）时
+        调用方应走单进程渲染流程
+    """
+    if segments < 2:
+        return False
+    video_stream, audio_stream, duration = probe_streams(video_path)
+    if video_stream is None:
+        return False
+
+    cuts = plan_parallel_cuts(list_keyframes(video_path), duration, segments)
+    if not cuts:
+        return False
+
+    copyable = (video_stream.get('codec_name') in SMART_RENDER_CODECS and
+                video_stream.get('pix_fmt') in SMART_RENDER_PIX_FMTS)
+    bounds = [0.0] + cuts + [duration]
+    start = start_time or 0.0
+    end = duration if end_time is None else min(end_time, duration)
+    threads = threads or max(1, (os.cpu_count() or 1) // len(bounds[1:]))
+
+    temp_dir = tempfile.mkdtemp(prefix='parallel_render_')
+    try:
+        chunks = split_at_keyframes(video_path, cuts, temp_dir)
+        outputs = list(chunks)
+
+        with ProcessPoolExecutor(max_workers=len(chunks)) as executor:
+            futures = []
+            for index, chunk in enumerate(chunks):
+                a, b = bounds[index], bounds[index + 1]
+                chunk_output = os.path.join(temp_dir, f'rendered_{index:03d}.mp4')
+                if start < b and end > a:
+                    # 全局时间 -> 片段内时间
+                    kwargs = dict(render_kwargs)
+                    kwargs.update(
+                        video_path=chunk, output_path=chunk_output,
+                        start_time=max(start - a, 0.0),
+                        end_time=None if end >= b else end - a,
+                        threads=threads
+                    )
+                    future = executor.submit(render_func, **kwargs)
+                elif copyable:
+                    continue
+                else:
+                    future = executor.submit(encode_segment, chunk, chunk_output, threads=threads)
+                futures.append((index, future, chunk_output))
+
+            for index, future, chunk_output in futures:
+                future.result()
+                outputs[index] = chunk_output
+
+        # 重编码的段与流复制的源片段（或各段之间）档次、级别或全局头不一致时不能拼接
+        rendered = [chunk_output for _, _, chunk_output in futures]
+        for path in rendered:
+            copy_sample_aspect_ratio(path, video_stream)
+        reference = video_stream if len(rendered) < len(chunks) else probe_streams(rendered[0])[0]
+        if not segments_match(reference, rendered):
+            return False
+
+        audio_codec = 'copy'
+        if audio_stream is not None and audio_stream.get('codec_name') != 'aac':
+            audio_codec = 'aac'
+        concat_segments(
+            outputs, output_path,
+            audio_source=video_path if audio_stream is not None else None,
+            audio_codec=audio_codec
+        )
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    return True
@@ -21,6 +21,7 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
 from src.watermark import add_image_watermark, add_text_watermark
 from src.watermark.combo_watermark import add_combo_watermark
 from src.insert import insert_video
+from src.batch import preflight_batch
 from src.logger_config import setup_logger
 from src.cli import POSITIONS
 
@@ -114,6 +115,28 @@ class ProcessingThread(QThread):
             self.finished.emit(False, str(e))
 
 
+class PreflightThread(QThread):
+    """预检线程类：在后台并发探测批量处理的所有视频，避免阻塞界面"""
+    finished = pyqtSignal(object, str)
+
+    def __init__(self, task_type, inputs, output_dir, params):
+        super().__init__()
+        self.task_type = task_type
+        self.inputs = inputs
+        self.output_dir = output_dir
+        self.params = params
+        self.logger = logging.getLogger('video_watermark_ui')
+
+    def run(self):
+        try:
+            self.logger.info(f"后台线程开始预检: {len(self.inputs)} 个文件")
+            report = preflight_batch(self.task_type, self.inputs, self.output_dir, self.params)
+            self.finished.emit(report, "")
+        except Exception as e:
+            self.logger.exception(f"后台线程预检失败: {str(e)}")
+            self.finished.emit(None, str(e))
+
+
 class VideoWatermarkWindow(QMainWindow):
     """视频水印工具主窗口"""
 
@@ -764,139 +787,224 @@ class VideoWatermarkWindow(QMainWindow):
 
             self.logger.info(f"UI: 找到 {len(video_files_to_process)} 个视频文件需要处理")
 
-            # 确保输出文件夹存在
-            Path(output_path).mkdir(parents=True, exist_ok=True)
-            self.logger.info(f"UI: 输出文件夹已创建/已存在: {output_path}")
+            # 预检：在后台线程并发探测所有文件，提前发现损坏文件和超出时长的参数，
+            # 预检结束后由 on_preflight_finished 开始批量处理
+            self.preflight_folder(current_tab, video_files_to_process, output_path)
 
-            # 初始化批量处理状态
-            self.cancel_requested = False
+    def process_folder(self, current_tab, video_files_to_process, output_path):
+        """批量处理通过预检的视频文件"""
+        # 确保输出文件夹存在
+        Path(output_path).mkdir(parents=True, exist_ok=True)
+        self.logger.info(f"UI: 输出文件夹已创建/已存在: {output_path}")
 
-            # 禁用按钮
-            self.btn_process.setEnabled(False)
-            self.btn_process.setText("⏳ 批量处理中...")
-            self.btn_browse_input.setEnabled(False)
-            self.btn_browse_folder.setEnabled(False)
-            self.status_bar.showMessage("批量处理中...")
-
-            # 清空进度条
-            self.progress_bar.setValue(0)
-
-            # 批量处理每个视频
-            success_count = 0
-            fail_count = 0
-
-            for i, video_file in enumerate(video_files_to_process):
-                # 检查是否请求取消
-                if self.cancel_requested:
-                    self.logger.info("UI: 用户请求取消批量处理")
-                    self.status_bar.showMessage("批量处理已取消")
-                    break
-
-                try:
-                    self.logger.info(f"处理第 {i+1}/{len(video_files_to_process)} 个视频: {video_file}")
-                    self.status_bar.showMessage(f"处理中: {video_file.name} ({i+1}/{len(video_files_to_process)})")
-
-                    # 生成输出文件名
-                    output_file_path = Path(output_path) / f"{video_file.stem}_wmarked.mp4"
-
-                    # 根据当前标签页准备参数并处理
-                    if current_tab == 0:  # 图片水印
-                        position_value = self.position_combo.currentData()
-                        position_tuple = _convert_position_value(position_value)
+        # 初始化批量处理状态
+        self.cancel_requested = False
+
+        # 禁用按钮
+        self.btn_process.setEnabled(False)
+        self.btn_process.setText("⏳ 批量处理中...")
+        self.btn_browse_input.setEnabled(False)
+        self.btn_browse_folder.setEnabled(False)
+        self.status_bar.showMessage("批量处理中...")
+
+        # 清空进度条
+        self.progress_bar.setValue(0)
+
+        # 批量处理每个视频
+        success_count = 0
+        fail_count = 0
+
+        for i, video_file in enumerate(video_files_to_process):
+            # 检查是否请求取消
+            if self.cancel_requested:
+                self.logger.info("UI: 用户请求取消批量处理")
+                self.status_bar.showMessage("批量处理已取消")
+                break
+
+            try:
+                self.logger.info(f"处理第 {i+1}/{len(video_files_to_process)} 个视频: {video_file}")
+                self.status_bar.showMessage(f"处理中: {video_file.name} ({i+1}/{len(video_files_to_process)})")
+
+                # 生成输出文件名
+                output_file_path = Path(output_path) / f"{video_file.stem}_wmarked.mp4"
+
+                # 根据当前标签页准备参数并处理
+                if current_tab == 0:  # 图片水印
+                    position_value = self.position_combo.currentData()
+                    position_tuple = _convert_position_value(position_value)
+                    params = {
+                        'video_path': str(video_file),
+                        'watermark_path': self.watermark_edit.text(),
+                        'output_path': str(output_file_path),
+                        'opacity': self.opacity_spin.value(),
+                        'start_time': float(self.start_time_edit.text() or 0),
+                        'position': position_tuple,
+                    }
+                    if self.end_time_edit.text():
+                        params['end_time'] = float(self.end_time_edit.text())
+                    add_image_watermark(**params)
+
+                elif current_tab == 1:  # 文字水印/组合水印
+                    # 检查是否选择了Logo文件
+                    position_value = self.position_combo.currentData()
+                    position_tuple = _convert_position_value(position_value)
+
+                    if self.logo_edit.text():
+                        # 使用组合水印（整体位置使用position参数）
                         params = {
                             'video_path': str(video_file),
-                            'watermark_path': self.watermark_edit.text(),
                             'output_path': str(output_file_path),
-                            'opacity': self.opacity_spin.value(),
+                            'text': self.text_edit.text(),
+                            'watermark_path': self.logo_edit.text() or None,
+                            'combine_mode': True,
+                            'combine_layout': 'horizontal' if self.layout_combo.currentIndex() == 0 else 'vertical',
+                            'combine_spacing': self.spacing_spin.value(),
+                            'font_size': self.font_size_spin.value(),
+                            'color': self.color_button.get_color(),
+                            'stroke_width': self.stroke_width_spin.value(),
+                            'stroke_color': self.stroke_color_button.get_color(),
                             'start_time': float(self.start_time_edit.text() or 0),
-                            'position': position_tuple,
+                            'position': position_tuple,  # 整体水印位置
+                            'logo_opacity': self.logo_opacity_spin.value(),
+                            'logo_scale_factor': self.logo_scale_spin.value(),
                         }
                         if self.end_time_edit.text():
                             params['end_time'] = float(self.end_time_edit.text())
-                        add_image_watermark(**params)
-
-                    elif current_tab == 1:  # 文字水印/组合水印
-                        # 检查是否选择了Logo文件
-                        position_value = self.position_combo.currentData()
-                        position_tuple = _convert_position_value(position_value)
-
-                        if self.logo_edit.text():
-                            # 使用组合水印（整体位置使用position参数）
-                            params = {
-                                'video_path': str(video_file),
-                                'output_path': str(output_file_path),
-                                'text': self.text_edit.text(),
-                                'watermark_path': self.logo_edit.text() or None,
-                                'combine_mode': True,
-                                'combine_layout': 'horizontal' if self.layout_combo.currentIndex() == 0 else 'vertical',
-                                'combine_spacing': self.spacing_spin.value(),
-                                'font_size': self.font_size_spin.value(),
-                                'color': self.color_button.get_color(),
-                                'stroke_width': self.stroke_width_spin.value(),
-                                'stroke_color': self.stroke_color_button.get_color(),
-                                'start_time': float(self.start_time_edit.text() or 0),
-                                'position': position_tuple,  # 整体水印位置
-                                'logo_opacity': self.logo_opacity_spin.value(),
-                                'logo_scale_factor': self.logo_scale_spin.value(),
-                            }
-                            if self.end_time_edit.text():
-                                params['end_time'] = float(self.end_time_edit.text())
-                            add_combo_watermark(**params)
-                        else:
-                            # 使用纯文字水印
-                            params = {
-                                'video_path': str(video_file),
-                                'text': self.text_edit.text(),
-                                'output_path': str(output_file_path),
-                                'font_size': self.font_size_spin.value(),
-                                'color': self.color_button.get_color(),
-                                'opacity': 0.9,
-                                'stroke_width': self.stroke_width_spin.value(),
-                                'stroke_color': self.stroke_color_button.get_color(),
-                                'start_time': float(self.start_time_edit.text() or 0),
-                                'position': position_tuple,
-                            }
-                            if self.end_time_edit.text():
-                                params['end_time'] = float(self.end_time_edit.text())
-                            add_text_watermark(**params)
-
-                    else:  # 插入视频
+                        add_combo_watermark(**params)
+                    else:
+                        # 使用纯文字水印
                         params = {
-                            'main_video_path': str(video_file),
-                            'insert_video_path': self.insert_video_edit.text(),
+                            'video_path': str(video_file),
+                            'text': self.text_edit.text(),
                             'output_path': str(output_file_path),
-                            'insert_position': float(self.insert_position_edit.text()),
-                            'audio_mode': self.audio_mode_combo.currentText(),
+                            'font_size': self.font_size_spin.value(),
+                            'color': self.color_button.get_color(),
+                            'opacity': 0.9,
+                            'stroke_width': self.stroke_width_spin.value(),
+                            'stroke_color': self.stroke_color_button.get_color(),
+                            'start_time': float(self.start_time_edit.text() or 0),
+                            'position': position_tuple,
                         }
-                        insert_video(**params)
+                        if self.end_time_edit.text():
+                            params['end_time'] = float(self.end_time_edit.text())
+                        add_text_watermark(**params)
 
-                    success_count += 1
-                    self.logger.info(f"成功处理: {video_file.name}")
+                else:  # 插入视频
+                    params = {
+                        'main_video_path': str(video_file),
+                        'insert_video_path': self.insert_video_edit.text(),
+                        'output_path': str(output_file_path),
+                        'insert_position': float(self.insert_position_edit.text()),
+                        'audio_mode': self.audio_mode_combo.currentText(),
+                    }
+                    insert_video(**params)
+
+                success_count += 1
+                self.logger.info(f"成功处理: {video_file.name}")
+
+            except Exception as e:
+                fail_count += 1
+                self.logger.exception(f"处理失败 {video_file.name}: {str(e)}")
+                QMessageBox.warning(self, "警告", f"处理失败: {video_file.name}\n错误: {str(e)}")
+
+            # 更新进度条
+            progress = int((i + 1) / len(video_files_to_process) * 100)
+            self.progress_bar.setValue(progress)
+            QApplication.processEvents()  # 处理UI事件
+
+        # 恢复按钮状态
+        self.restore_buttons()
+
+        # 显示结果
+        if self.cancel_requested:
+            QMessageBox.information(self, "批量处理已取消", f"批量处理已取消！\n成功处理: {success_count} 个\n失败: {fail_count} 个")
+            self.status_bar.showMessage("批量处理已取消")
+            self.logger.info(f"UI: 批量处理取消, 成功: {success_count}, 失败: {fail_count}")
+        elif fail_count == 0:
+            QMessageBox.information(self, "完成", f"批量处理完成！\n成功: {success_count}/{len(video_files_to_process)}")
+            self.status_bar.showMessage("批量处理完成")
+        else:
+            QMessageBox.warning(self, "完成(有错误)", f"批量处理完成！\n成功: {success_count}\n失败: {fail_count}")
+            self.status_bar.showMessage(f"批量处理完成, {fail_count}个失败")
 
-                except Exception as e:
-                    fail_count += 1
-                    self.logger.exception(f"处理失败 {video_file.name}: {str(e)}")
-                    QMessageBox.warning(self, "警告", f"处理失败: {video_file.name}\n错误: {str(e)}")
+    def preflight_folder(self, current_tab, video_files, output_path):
+        """在后台线程预检所有视频，完成后由 on_preflight_finished 处理结果"""
+        try:
+            start_time = float(self.start_time_edit.text() or 0)
+            end_time = float(self.end_time_edit.text()) if self.end_time_edit.text() else None
 
-                # 更新进度条
-                progress = int((i + 1) / len(video_files_to_process) * 100)
-                self.progress_bar.setValue(progress)
-                QApplication.processEvents()  # 处理UI事件
+            if current_tab == 0:  # 图片水印
+                task_type = 'watermark'
+                params = {'watermark_path': self.watermark_edit.text(),
+                          'start_time': start_time, 'end_time': end_time}
+            elif current_tab == 1:  # 文字水印/组合水印
+                task_type = 'watermark_combo' if self.logo_edit.text() else 'watermark_text'
+                params = {'watermark_path': self.logo_edit.text() or None,
+                          'start_time': start_time, 'end_time': end_time}
+            else:  # 插入视频
+                task_type = 'insert'
+                params = {'insert_video_path': self.insert_video_edit.text(),
+                          'insert_position': float(self.insert_position_edit.text())}
+        except ValueError as e:
+            self.logger.error(f"UI: 预检失败: {e}")
+            QMessageBox.warning(self, "警告", f"预检失败：{e}")
+            return
 
-            # 恢复按钮状态
-            self.restore_buttons()
+        # 预检期间禁用按钮
+        self.btn_process.setEnabled(False)
+        self.btn_process.setText("⏳ 预检中...")
+        self.btn_browse_input.setEnabled(False)
+        self.btn_browse_folder.setEnabled(False)
+        self.status_bar.showMessage("正在预检视频文件...")
+
+        # 启动预检线程
+        self.preflight_thread = PreflightThread(task_type, [str(path) for path in video_files],
+                                                output_path, params)
+        self.preflight_thread.finished.connect(
+            lambda report, error: self.on_preflight_finished(
+                report, error, current_tab, video_files, output_path))
+        self.preflight_thread.start()
+
+    def on_preflight_finished(self, report, error, current_tab, video_files, output_path):
+        """预检完成回调：提示未通过的文件，用户确认后批量处理通过预检的文件"""
+        self.restore_buttons()
+        if report is None:
+            self.logger.error(f"UI: 预检失败: {error}")
+            QMessageBox.warning(self, "警告", f"预检失败：{error}")
+            self.status_bar.showMessage("预检失败")
+            return
 
-            # 显示结果
-            if self.cancel_requested:
-                QMessageBox.information(self, "批量处理已取消", f"批量处理已取消！\n成功处理: {success_count} 个\n失败: {fail_count} 个")
+        self.logger.info(f"UI: 预检通过 {len(report['ready'])}/{len(video_files)} 个文件")
+        problems = [f"{Path(item['input']).name}: {item['error']}" for item in report['rejected']]
+        for problem in problems:
+            self.logger.warning(f"UI: 预检未通过: {problem}")
+        if not report['enough_space']:
+            problems.append(
+                f"磁盘空间可能不足：预计输出 {report['estimated_bytes'] / (1024 * 1024):.0f} MB，"
+                f"可用 {report['free_bytes'] / (1024 * 1024):.0f} MB"
+            )
+
+        if not report['ready']:
+            QMessageBox.warning(self, "警告", "没有通过预检的视频文件！\n" + "\n".join(problems))
+            self.status_bar.showMessage("预检未通过")
+            return
+        if problems:
+            msg = QMessageBox.question(
+                self,
+                "预检结果",
+                f"{len(report['ready'])}/{len(video_files)} 个文件通过预检，以下问题需要注意：\n"
+                + "\n".join(problems) + "\n\n是否继续处理通过预检的文件？",
+                QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
+                QMessageBox.StandardButton.Yes
+            )
+            if msg != QMessageBox.StandardButton.Yes:
+                self.logger.info("UI: 用户在预检后取消批量处理")
                 self.status_bar.showMessage("批量处理已取消")
-                self.logger.info(f"UI: 批量处理取消, 成功: {success_count}, 失败: {fail_count}")
-            elif fail_count == 0:
-                QMessageBox.information(self, "完成", f"批量处理完成！\n成功: {success_count}/{len(video_files_to_process)}")
-                self.status_bar.showMessage("批量处理完成")
-            else:
-                QMessageBox.warning(self, "完成(有错误)", f"批量处理完成！\n成功: {success_count}\n失败: {fail_count}")
-                self.status_bar.showMessage(f"批量处理完成, {fail_count}个失败")
+                return
+
+        ready = set(report['ready'])
+        self.process_folder(current_tab, [path for path in video_files if str(path) in ready],
+                            output_path)
 
     def on_processing_finished(self, success, message):
         """处理完成回调"""
@@ -3,5 +3,8 @@
 from .image_watermark import add_image_watermark
 from .text_watermark_v2 import add_text_watermark
 from .combo_watermark import add_combo_watermark
+from .personalized import add_personalized_watermarks
+from .dynamic_text import add_dynamic_text_watermark
 
-__all__ = ['add_image_watermark', 'add_text_watermark', 'add_combo_watermark']
+__all__ = ['add_image_watermark', 'add_text_watermark', 'add_combo_watermark',
+           'add_personalized_watermarks', 'add_dynamic_text_watermark']
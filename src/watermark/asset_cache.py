@@ -0,0 +1,184 @@
+"""水印素材磁盘缓存：按内容哈希缓存预处理好的 RGBA 叠加图（跨进程、跨命令复用）"""
+
+import hashlib
+import os
+import tempfile
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+# 缓存格式版本，渲染规则变化时递增以使旧缓存失效
+CACHE_VERSION = 1
+
+# 默认容量上限（字节）
+DEFAULT_CACHE_BYTES = 256 * 1024 * 1024
+
+# 指定缓存目录的环境变量，设为空字符串时禁用磁盘缓存
+CACHE_DIR_ENV = 'VIDEO_WATERMARK_CACHE_DIR'
+
+# 文件哈希的进程内缓存：路径 -> ((大小, 修改时间), 哈希)
+_digest_cache: Dict[str, Tuple[Tuple[int, int], str]] = {}
+_digest_lock = threading.Lock()
+
+
+def user_cache_dir() -> str:
+    """本工具的用户缓存根目录（Windows 为 %LOCALAPPDATA%，其他系统为 ~/.cache）"""
+    if os.name == 'nt' and os.environ.get('LOCALAPPDATA'):
+        base = os.environ['LOCALAPPDATA']
+    else:
+        base = os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'video_watermark')
+
+
+def default_cache_dir() -> Optional[str]:
+    """默认缓存目录：环境变量 VIDEO_WATERMARK_CACHE_DIR，否则为用户缓存目录
+
+    Returns:
+        缓存目录路径；环境变量设为空字符串时返回 None（禁用缓存）
+    """
+    if CACHE_DIR_ENV in os.environ:
+        return os.environ[CACHE_DIR_ENV] or None
+    return os.path.join(user_cache_dir(), 'overlays')
+
+
+def file_digest(path: str) -> str:
+    """计算文件内容的 SHA-256（按文件大小和修改时间在进程内缓存）"""
+    stat = os.stat(path)
+    signature = (stat.st_size, stat.st_mtime_ns)
+    with _digest_lock:
+        cached = _digest_cache.get(path)
+        if cached and cached[0] == signature:
+            return cached[1]
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    value = digest.hexdigest()
+
+    with _digest_lock:
+        _digest_cache[path] = (signature, value)
+    return value
+
+
+class OverlayAssetCache:
+    """内容寻址的叠加图磁盘缓存
+
+    键为素材内容哈希与渲染参数的哈希，值为 RGBA uint8 数组，以 .npy 格式保存，
+    读取时内存映射（只读、不复制）。写入先写临时文件再原子替换，多个工作进程可同时读写；
+    总大小超过上限时按最近使用时间（读取时更新文件修改时间）淘汰。
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, max_bytes: int = DEFAULT_CACHE_BYTES):
+        """
+        Args:
+            cache_dir: 缓存目录，None 表示使用 default_cache_dir()
+            max_bytes: 缓存总大小上限（字节）
+        """
+        self.cache_dir = cache_dir if cache_dir is not None else default_cache_dir()
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def make_key(*parts) -> str:
+        """由渲染参数生成缓存键（参数需有稳定的 repr，文件请先用 file_digest 转为哈希）"""
+        payload = repr((CACHE_VERSION,) + parts).encode('utf-8')
+        return hashlib.sha256(payload).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f'{key}.npy')
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """读取缓存（只读内存映射），未命中或文件损坏时返回 None"""
+        if not self.cache_dir:
+            return None
+        path = self._path(key)
+        try:
+            array = np.load(path, mmap_mode='r')
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            # 损坏的缓存文件：删除后视为未命中
+            _remove_quietly(path)
+            return None
+
+        try:
+            # 更新修改时间作为最近使用时间
+            os.utime(path)
+        except OSError:
+            pass
+        return array
+
+    def put(self, key: str, array: np.ndarray) -> np.ndarray:
+        """写入缓存并按容量淘汰，返回写入后的只读内存映射（无法写入时返回原数组）"""
+        if not self.cache_dir:
+            return array
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    np.save(f, np.ascontiguousarray(array))
+                os.replace(temp_path, self._path(key))
+            except BaseException:
+                _remove_quietly(temp_path)
+                raise
+        except OSError:
+            return array
+
+        self.evict()
+        cached = self.get(key)
+        return array if cached is None else cached
+
+    def get_or_render(self, key: str, render: Callable[[], np.ndarray]) -> np.ndarray:
+        """命中时直接返回内存映射，否则调用 render 生成并写入缓存"""
+        array = self.get(key)
+        if array is None:
+            array = self.put(key, render())
+        return array
+
+    def evict(self) -> None:
+        """淘汰最久未使用的缓存文件，直到总大小不超过上限"""
+        entries = []
+        total = 0
+        try:
+            with os.scandir(self.cache_dir) as it:
+                for entry in it:
+                    if not entry.name.endswith('.npy'):
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+                    total += stat.st_size
+        except FileNotFoundError:
+            return
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            # 其他进程可能已删除，或（Windows）文件仍被映射，跳过即可
+            if _remove_quietly(path):
+                total -= size
+
+    def clear(self) -> None:
+        """删除全部缓存文件"""
+        if not self.cache_dir or not os.path.isdir(self.cache_dir):
+            return
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(('.npy', '.tmp')):
+                _remove_quietly(os.path.join(self.cache_dir, name))
+
+
+def _remove_quietly(path: str) -> bool:
+    """删除文件，失败时忽略；返回是否删除成功"""
+    try:
+        os.remove(path)
+        return True
+    except OSError:
+        return False
+
+
+overlay_cache = OverlayAssetCache()
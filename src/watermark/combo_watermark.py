@@ -1,11 +1,18 @@
 """组合水印功能模块 - 支持图片(可选) + 文字(必选)"""
 
 import os
-import tempfile
 from typing import Optional, Tuple
 
-from PIL import Image, ImageDraw, ImageFont
-from moviepy import VideoFileClip, ImageClip, CompositeVideoClip
+import numpy as np
+from PIL import Image
+from moviepy import VideoFileClip, ImageClip
+
+from ..media.pipeline import render_pipelined
+from ..media.segments import render_segments_parallel, render_window_only
+from .asset_cache import file_digest, overlay_cache
+from .overlay import StaticOverlay, image_to_clip
+from .text_render import font_digest, render_text_image
+from .timeline import static_overlay_processor
 
 
 def combine_images(
@@ -69,7 +76,7 @@ def create_text_image(
     stroke_color: str = 'black',
     bg_padding: int = 20
 ) -> Tuple[Image.Image, int]:
-    """创建文本图片（使用PIL）
+    """创建文本图片（使用PIL，字体和渲染结果在进程内缓存）
 
     Args:
         text: 文本内容
@@ -83,88 +90,93 @@ def create_text_image(
     Returns:
         Tuple[PIL Image 对象, 文本高度]
     """
-    # 创建字体对象
-    if font_path and os.path.exists(font_path):
-        font = ImageFont.truetype(font_path, font_size)
+    return render_text_image(
+        text, font_path, font_size, color, stroke_width, stroke_color, bg_padding
+    )
+
+
+def _render_combined_image(
+    watermark_path: str,
+    text: str,
+    font_path: Optional[str],
+    font_size: int,
+    color: str,
+    stroke_width: int,
+    stroke_color: str,
+    logo_width: Optional[int],
+    logo_height: Optional[int],
+    logo_scale_factor: float,
+    combine_layout: str,
+    combine_spacing: int
+) -> Image.Image:
+    """合并模式：缩放Logo并与文字图片合并为一张水印图"""
+    # 创建文本图片并获取文本高度
+    text_image, text_height = create_text_image(
+        text=text,
+        font_path=font_path,
+        font_size=font_size,
+        color=color,
+        stroke_width=stroke_width,
+        stroke_color=stroke_color,
+        bg_padding=20
+    )
+
+    # 加载并调整logo大小
+    logo_image = Image.open(watermark_path)
+
+    # 调整logo大小
+    if logo_width or logo_height:
+        # 使用指定尺寸
+        if logo_width and logo_height:
+            logo_image = logo_image.resize((logo_width, logo_height), Image.Resampling.LANCZOS)
+        elif logo_width:
+            ratio = logo_width / logo_image.width
+            new_height = int(logo_image.height * ratio)
+            logo_image = logo_image.resize((logo_width, new_height), Image.Resampling.LANCZOS)
+        else:
+            ratio = logo_height / logo_image.height
+            new_width = int(logo_image.width * ratio)
+            logo_image = logo_image.resize((new_width, logo_height), Image.Resampling.LANCZOS)
     else:
-        # 使用系统默认字体（跨平台）
-        font = None
-        if os.name == 'nt':  # Windows
-            windows_fonts = [
-                "C:\\Windows\\Fonts\\arial.ttf",
-                "C:\\Windows\\Fonts\\segoeui.ttf",
-                "C:\\Windows\\Fonts\\calibri.ttf",
-                "C:\\Windows\\Fonts\\tahoma.ttf",
-                "C:\\Windows\\Fonts\\verdana.ttf"
-            ]
-            for win_font in windows_fonts:
-                try:
-                    font = ImageFont.truetype(win_font, font_size)
-                    break
-                except:
-                    continue
-        else:  # Linux/macOS
-            linux_fonts = [
-                "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
-                "/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf",
-                "/usr/share/fonts/truetype/ubuntu/Ubuntu-R.ttf",
-                "/System/Library/Fonts/Helvetica.ttc",
-                "/System/Library/Fonts/Arial.ttf"
-            ]
-            for linux_font in linux_fonts:
-                try:
-                    font = ImageFont.truetype(linux_font, font_size)
-                    break
-                except:
-                    continue
-
-        if font is None:
-            try:
-                font = ImageFont.load_default()
-            except:
-                font = ImageFont.load_default()
-
-    # 创建临时图像来测量文本尺寸
-    temp_img = Image.new('RGBA', (1, 1), (0, 0, 0, 0))
-    temp_draw = ImageDraw.Draw(temp_img)
-
-    # 获取文本边界框
-    bbox = temp_draw.textbbox((0, 0), text, font=font)
-    text_width = bbox[2] - bbox[0]
-    text_height = bbox[3] - bbox[1]
-
-    # 添加额外的垂直空间给字母上下延
-    extra_vertical = int(font_size * 0.4)
-
-    # 计算最终图像尺寸
-    img_width = text_width + bg_padding * 2
-    img_height = text_height + bg_padding * 2 + extra_vertical
-
-    # 创建透明背景图像
-    image = Image.new('RGBA', (img_width, img_height), (0, 0, 0, 0))
-    draw = ImageDraw.Draw(image)
-
-    # 计算文本位置
-    x = bg_padding - bbox[0]
-    y = bg_padding - bbox[1] + extra_vertical // 2
-
-    # 绘制描边
-    if stroke_width > 0:
-        try:
-            draw.text(
-                (x, y), text, font=font, fill=color,
-                stroke_width=stroke_width, stroke_fill=stroke_color
-            )
-        except:
-            for dx in range(-stroke_width, stroke_width + 1):
-                for dy in range(-stroke_width, stroke_width + 1):
-                    if dx != 0 or dy != 0:
-                        draw.text((x + dx, y + dy), text, font=font, fill=stroke_color)
-            draw.text((x, y), text, font=font, fill=color)
+        # 自动缩放到文本高度
+        target_height = int(text_height * logo_scale_factor)
+        ratio = target_height / logo_image.height
+        new_width = int(logo_image.width * ratio)
+        logo_image = logo_image.resize((new_width, target_height), Image.Resampling.LANCZOS)
+
+    # 合并logo和文字
+    return combine_images(
+        logo_image=logo_image,
+        text_image=text_image,
+        layout=combine_layout,
+        spacing=combine_spacing
+    )
+
+
+def _render_logo_image(
+    watermark_path: str,
+    logo_width: Optional[int],
+    logo_height: Optional[int]
+) -> np.ndarray:
+    """分离模式：按 moviepy 的 resized 规则缩放Logo，返回 (h, w, 4) 的 RGBA uint8 数组
+
+    画面和遮罩分别缩放（与 ImageClip(路径).resized(...) 逐像素一致），
+    遮罩缩放时已量化为 uint8，转回 alpha 通道没有精度损失。
+    """
+    logo = ImageClip(watermark_path)
+    if logo_width and logo_height:
+        logo = logo.resized((logo_width, logo_height))
+    elif logo_width:
+        logo = logo.resized(width=logo_width)
     else:
-        draw.text((x, y), text, font=font, fill=color)
+        logo = logo.resized(height=logo_height)
 
-    return image, img_height
+    rgb = logo.get_frame(0).astype(np.uint8)
+    if logo.mask is not None:
+        alpha = np.round(logo.mask.get_frame(0) * 255).astype(np.uint8)
+    else:
+        alpha = np.full(rgb.shape[:2], 255, dtype=np.uint8)
+    return np.dstack([rgb, alpha])
 
 
 def add_combo_watermark(
@@ -191,7 +203,10 @@ def add_combo_watermark(
     end_time: Optional[float] = None,
     combine_mode: bool = False,
     combine_layout: str = 'horizontal',
-    combine_spacing: int = 10
+    combine_spacing: int = 10,
+    smart_render: bool = False,
+    threads: Optional[int] = None,
+    segments: Optional[int] = None
 ) -> None:
     """向视频添加组合水印（图片 + 文字）
 
@@ -220,7 +235,41 @@ def add_combo_watermark(
         combine_mode: 是否合并Logo和文字为一张图片
         combine_layout: 合并布局 ('horizontal' 水平, 'vertical' 垂直)
         combine_spacing: 合并时的间距（像素）
+        smart_render: 仅重编码与水印时间范围重叠的GOP，其余部分流复制
+                      （源视频需为 h264/yuv420p，否则自动回退为完整渲染）
+        threads: 编码线程数，默认使用全部CPU核心（批量并行处理时由调度方分配；
+                 分段并行时为每段的线程数）
+        segments: 分段并行编码的段数：在关键帧处切分，由多个进程分别处理后无损拼接
+                  （适合长视频；不指定或为1时单进程处理）
     """
+    if segments and segments > 1:
+        render_kwargs = dict(
+            text=text, watermark_path=watermark_path, position=position,
+            logo_position=logo_position, logo_opacity=logo_opacity, logo_margin=logo_margin,
+            logo_width=logo_width, logo_height=logo_height, logo_scale_factor=logo_scale_factor,
+            text_position=text_position, font_size=font_size, color=color, font_path=font_path,
+            text_opacity=text_opacity, stroke_width=stroke_width, stroke_color=stroke_color,
+            vertical_margin=vertical_margin, combine_mode=combine_mode,
+            combine_layout=combine_layout, combine_spacing=combine_spacing
+        )
+        if render_segments_parallel(video_path, output_path, segments, add_combo_watermark,
+                                    render_kwargs, start_time, end_time, threads):
+            return
+
+    if smart_render:
+        def render_segment(segment_path, segment_output, local_start, local_end):
+            add_combo_watermark(
+                segment_path, segment_output, text, watermark_path, position,
+                logo_position, logo_opacity, logo_margin, logo_width, logo_height,
+                logo_scale_factor, text_position, font_size, color, font_path,
+                text_opacity, stroke_width, stroke_color, vertical_margin,
+                local_start, local_end, combine_mode, combine_layout, combine_spacing,
+                threads=threads
+            )
+
+        if render_window_only(video_path, output_path, start_time, end_time, render_segment):
+            return
+
     # 加载视频
     video = VideoFileClip(video_path)
 
@@ -230,80 +279,39 @@ def add_combo_watermark(
     if end_time is None:
         end_time = video.duration
 
-    # 准备视频层列表
-    layers = [video]
+    # 静态水印层列表（先添加的在下层）
+    overlays = []
 
     # 初始化变量，用于资源清理
     text_watermark = None
     logo = None
-    final_video = None
-    temp_text_path = None
 
     # 如果提供了logo且处于合并模式，将logo和文字合并为一张图片
     if watermark_path and os.path.exists(watermark_path) and combine_mode:
-        # 创建文本图片并获取文本高度
-        text_image, text_height = create_text_image(
-            text=text,
-            font_path=font_path,
-            font_size=font_size,
-            color=color,
-            stroke_width=stroke_width,
-            stroke_color=stroke_color,
-            bg_padding=20
+        # 合并后的水印图按素材内容和渲染参数缓存到磁盘，重复任务跳过 PIL 缩放和绘制
+        key = overlay_cache.make_key(
+            'combo', file_digest(watermark_path), text, font_path,
+            font_digest(font_path, font_size, text), font_size, color, stroke_width, stroke_color,
+            logo_width, logo_height, logo_scale_factor, combine_layout, combine_spacing
         )
 
-        # 加载并调整logo大小
-        from PIL import Image
-        logo_image = Image.open(watermark_path)
+        def render():
+            image = _render_combined_image(
+                watermark_path, text, font_path, font_size, color, stroke_width, stroke_color,
+                logo_width, logo_height, logo_scale_factor, combine_layout, combine_spacing
+            )
+            return np.asarray(image.convert('RGBA'))
 
-        # 调整logo大小
-        if logo_width or logo_height:
-            # 使用指定尺寸
-            if logo_width and logo_height:
-                logo_image = logo_image.resize((logo_width, logo_height), Image.Resampling.LANCZOS)
-            elif logo_width:
-                ratio = logo_width / logo_image.width
-                new_height = int(logo_image.height * ratio)
-                logo_image = logo_image.resize((logo_width, new_height), Image.Resampling.LANCZOS)
-            else:
-                ratio = logo_height / logo_image.height
-                new_width = int(logo_image.width * ratio)
-                logo_image = logo_image.resize((new_width, logo_height), Image.Resampling.LANCZOS)
-        else:
-            # 自动缩放到文本高度
-            target_height = int(text_height * logo_scale_factor)
-            ratio = target_height / logo_image.height
-            new_width = int(logo_image.width * ratio)
-            logo_image = logo_image.resize((new_width, target_height), Image.Resampling.LANCZOS)
-
-        # 合并logo和文字
-        combined_image = combine_images(
-            logo_image=logo_image,
-            text_image=text_image,
-            layout=combine_layout,
-            spacing=combine_spacing
-        )
+        combined_image = overlay_cache.get_or_render(key, render)
 
-        # 保存合并后的图片到临时文件
-        temp_combined_file = tempfile.NamedTemporaryFile(suffix='.png', delete=False)
-        temp_combined_path = temp_combined_file.name
-        temp_combined_file.close()
-        combined_image.save(temp_combined_path, "PNG")
-
-        # 创建水印剪辑
-        watermark = ImageClip(temp_combined_path)
-        watermark = watermark.with_start(start_time)
-        watermark = watermark.with_end(end_time)
-        watermark = watermark.with_duration(end_time - start_time)
-        watermark = watermark.with_opacity(logo_opacity)  # 使用logo透明度作为整体透明度
-
-        # 设置位置（使用position参数）
-        watermark = watermark.with_position(
-            _get_position_function(video, watermark, position, logo_margin)
-        )
+        # 创建水印剪辑（直接使用缓存的内存映射）
+        watermark = image_to_clip(combined_image)
 
-        # 添加到图层
-        layers.append(watermark)
+        # 设置位置（使用position参数），使用logo透明度作为整体透明度
+        position_func = _get_position_function(video, watermark, position, logo_margin)
+        overlays.append(StaticOverlay.from_clip(
+            watermark, position_func(start_time), video.size, logo_opacity, start_time, end_time
+        ))
 
     elif watermark_path and os.path.exists(watermark_path):
         # 分离模式：分别处理logo和文字
@@ -319,46 +327,30 @@ def add_combo_watermark(
             bg_padding=20
         )
 
-        # 保存文本图片到临时文件
-        temp_text_file = tempfile.NamedTemporaryFile(suffix='.png', delete=False)
-        temp_text_path = temp_text_file.name
-        temp_text_file.close()
-        text_image.save(temp_text_path, "PNG")
-
-        # 创建文字水印剪辑
-        text_watermark = ImageClip(temp_text_path)
-        text_watermark = text_watermark.with_start(start_time)
-        text_watermark = text_watermark.with_end(end_time)
-        text_watermark = text_watermark.with_duration(end_time - start_time)
-        text_watermark = text_watermark.with_opacity(text_opacity)
-        text_watermark = text_watermark.with_position(
-            _get_position_function(video, text_watermark, text_position, vertical_margin)
+        # 创建文字水印剪辑（直接使用内存中的图像）
+        text_watermark = image_to_clip(text_image)
+        position_func = _get_position_function(video, text_watermark, text_position, vertical_margin)
+        text_overlay = StaticOverlay.from_clip(
+            text_watermark, position_func(start_time), video.size, text_opacity, start_time, end_time
         )
-        layers.append(text_watermark)
 
-        # 创建logo水印
-        logo = ImageClip(watermark_path)
-
-        # 调整logo大小
+        # 创建logo水印：缩放后的logo按素材内容和目标尺寸缓存到磁盘，重复任务跳过缩放
         if logo_width or logo_height:
-            if logo_width and logo_height:
-                logo = logo.resized((logo_width, logo_height))
-            elif logo_width:
-                logo = logo.resized(width=logo_width)
-            else:
-                logo = logo.resized(height=logo_height)
+            logo_size = (logo_width, logo_height)
         else:
-            target_height = int(text_height * logo_scale_factor)
-            logo = logo.resized(height=target_height)
-
-        logo = logo.with_start(start_time)
-        logo = logo.with_end(end_time)
-        logo = logo.with_duration(end_time - start_time)
-        logo = logo.with_opacity(logo_opacity)
-        logo = logo.with_position(
-            _get_position_function(video, logo, logo_position, logo_margin)
+            # 自动缩放到文本高度
+            logo_size = (None, int(text_height * logo_scale_factor))
+        key = overlay_cache.make_key('logo', file_digest(watermark_path), *logo_size)
+        logo_image = overlay_cache.get_or_render(
+            key, lambda: _render_logo_image(watermark_path, *logo_size))
+        logo = image_to_clip(logo_image)
+        position_func = _get_position_function(video, logo, logo_position, logo_margin)
+        logo_overlay = StaticOverlay.from_clip(
+            logo, position_func(start_time), video.size, logo_opacity, start_time, end_time
         )
-        layers.insert(1, logo)
+
+        # logo在下层，文字在上层
+        overlays.extend([logo_overlay, text_overlay])
 
     else:
         # 只有文字，没有logo
@@ -373,34 +365,17 @@ def add_combo_watermark(
             bg_padding=20
         )
 
-        # 保存文本图片到临时文件
-        temp_text_file = tempfile.NamedTemporaryFile(suffix='.png', delete=False)
-        temp_text_path = temp_text_file.name
-        temp_text_file.close()
-        text_image.save(temp_text_path, "PNG")
-
-        # 创建文字水印剪辑
-        text_watermark = ImageClip(temp_text_path)
-        text_watermark = text_watermark.with_start(start_time)
-        text_watermark = text_watermark.with_end(end_time)
-        text_watermark = text_watermark.with_duration(end_time - start_time)
-        text_watermark = text_watermark.with_opacity(text_opacity)
-        text_watermark = text_watermark.with_position(
-            _get_position_function(video, text_watermark, text_position, vertical_margin)
-        )
-        layers.append(text_watermark)
-
-    # 合成视频
-    final_video = CompositeVideoClip(layers, size=video.size)
-
-    # 写出视频
-    final_video.write_videofile(
-        output_path,
-        codec='libx264',
-        audio_codec='aac',
-        threads=os.cpu_count(),
-        logger=None
-    )
+        # 创建文字水印剪辑（直接使用内存中的图像）
+        text_watermark = image_to_clip(text_image)
+        position_func = _get_position_function(video, text_watermark, text_position, vertical_margin)
+        overlays.append(StaticOverlay.from_clip(
+            text_watermark, position_func(start_time), video.size, text_opacity, start_time, end_time
+        ))
+
+    # 合成视频（逐帧只混合水印所在区域），解码、合成、编码流水线并行，帧零拷贝读入复用缓冲区
+    process = static_overlay_processor(overlays, video.duration)
+    render_pipelined(video, output_path, process, threads=threads or os.cpu_count(),
+                     source_path=video_path)
 
     # 清理资源
     try:
@@ -409,25 +384,9 @@ def add_combo_watermark(
             text_watermark.close()
         if logo is not None:
             logo.close()
-        if final_video is not None:
-            final_video.close()
     except Exception as e:
         print(f"清理资源时发生错误: {e}")
 
-    # 删除临时文件
-    if temp_text_path is not None:
-        try:
-            os.remove(temp_text_path)
-        except:
-            pass
-
-    # 删除合并模式的临时文件（如果存在）
-    try:
-        if 'temp_combined_path' in locals():
-            os.remove(temp_combined_path)
-    except:
-        pass
-
 
 def _get_position_function(
     video: VideoFileClip,
@@ -0,0 +1,315 @@
+"""动态文字水印：时间码、帧号、时钟等逐帧变化的文字
+
+每个字形只栅格化一次存入字形图集，逐帧按文字内容用 NumPy 拷贝图集切片拼出文字，
+不再为每帧生成 PIL 图片。
+"""
+
+import math
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from PIL import Image, ImageColor, ImageDraw, ImageFont
+from moviepy import VideoFileClip
+
+from ..media.pipeline import render_pipelined
+from .overlay import blend_tile, rgb_tile_to_yuv420, yuv420_planes
+from .text_render import load_font
+
+
+class Glyph:
+    """图集中的一个字形：填充遮罩、描边遮罩（含填充）和排版参数"""
+
+    __slots__ = ('advance', 'offset', 'fill', 'stroke')
+
+    def __init__(self, advance: float, offset: int, fill: np.ndarray, stroke: Optional[np.ndarray]):
+        self.advance = advance    # 笔位前进量（像素）
+        self.offset = offset      # 单元格左边缘相对笔位的偏移（负数或0）
+        self.fill = fill          # (h, w) uint8
+        self.stroke = stroke      # (h, w) uint8，无描边时为 None
+
+
+class GlyphAtlas:
+    """字形图集：按需栅格化字形（每个字符只绘制一次），所有单元格高度相同、基线对齐"""
+
+    def __init__(self, font: ImageFont.ImageFont, stroke_width: int = 0):
+        self.font = font
+        self.stroke_width = stroke_width
+        ascent, descent = font.getmetrics()
+        self.ascent = ascent
+        self.height = ascent + descent + 2 * stroke_width
+        self._glyphs: Dict[str, Glyph] = {}
+
+    def glyph(self, char: str) -> Glyph:
+        """获取字形（首次使用时栅格化）"""
+        glyph = self._glyphs.get(char)
+        if glyph is None:
+            glyph = self._rasterize(char)
+            self._glyphs[char] = glyph
+        return glyph
+
+    def __len__(self) -> int:
+        return len(self._glyphs)
+
+    def _rasterize(self, char: str) -> Glyph:
+        stroke = self.stroke_width
+        advance = self.font.getlength(char)
+        left, _, right, _ = self.font.getbbox(char, anchor='ls', stroke_width=stroke)
+        pad = max(0, -left)
+        width = max(1, pad + int(math.ceil(max(advance, right))))
+        origin = (pad, stroke + self.ascent)
+
+        fill = Image.new('L', (width, self.height), 0)
+        ImageDraw.Draw(fill).text(origin, char, font=self.font, fill=255, anchor='ls')
+
+        stroke_mask = None
+        if stroke > 0:
+            outline = Image.new('L', (width, self.height), 0)
+            ImageDraw.Draw(outline).text(origin, char, font=self.font, fill=255, anchor='ls',
+                                         stroke_width=stroke, stroke_fill=255)
+            stroke_mask = np.asarray(outline)
+
+        return Glyph(advance, -pad, np.asarray(fill), stroke_mask)
+
+
+class DynamicTextLayer:
+    """逐帧变化的文字水印图层
+
+    文字由模板生成，可用字段：
+        {timecode}  时间码 HH:MM:SS:FF（按取整后的帧率，非丢帧）
+        {frame}     帧号（从0开始）
+        {time}      播放时间 HH:MM:SS.mmm
+        {seconds}   播放时间（秒，浮点数，可用格式说明如 {seconds:.2f}）
+        {clock}     时钟 = clock_start + 播放时间（datetime，可用格式说明如 {clock:%Y-%m-%d %H:%M:%S}）
+    """
+
+    def __init__(
+        self,
+        template: str,
+        frame_size: Tuple[int, int],
+        fps: float,
+        position: Tuple[str, str] = ('right', 'bottom'),
+        font_size: int = 24,
+        color: str = 'white',
+        font_path: Optional[str] = None,
+        opacity: float = 0.9,
+        stroke_width: int = 0,
+        stroke_color: str = 'black',
+        start_time: float = 0,
+        end_time: Optional[float] = None,
+        margin: int = 15,
+        clock_start: Optional[datetime] = None
+    ):
+        self.template = template
+        self.frame_size = frame_size
+        self.fps = fps
+        self.position = position
+        self.margin = margin
+        self.start_time = start_time
+        self.end_time = end_time
+        self.clock_start = clock_start or datetime.now().replace(microsecond=0)
+
+        # 模板中的固定文字用于选择能渲染它的字体
+        font = load_font(font_path, font_size, template)
+        self.atlas = GlyphAtlas(font, stroke_width)
+
+        self._fill_rgb = np.array(ImageColor.getrgb(color)[:3], np.uint32)
+        self._stroke_rgb = np.array(ImageColor.getrgb(stroke_color)[:3], np.uint32)
+        self._opacity = int(round(opacity * 255))
+
+        # 拼接用的遮罩缓冲区（按需增长）
+        self._fill_strip = np.zeros((self.atlas.height, 0), np.uint8)
+        self._stroke_strip = np.zeros((self.atlas.height, 0), np.uint8)
+
+        # 最近一次渲染的结果：(文字, 左上角坐标, 预乘颜色+128, 反向alpha)
+        self._last_text = None
+        self._last_render = None
+        # 最近一次渲染结果在 yuv420p 帧上的图块（按需转换）
+        self._last_yuv420 = None
+
+    def is_active(self, t: float) -> bool:
+        """判断 t 时刻水印是否显示"""
+        if t < self.start_time:
+            return False
+        return self.end_time is None or t < self.end_time
+
+    def text_at(self, t: float) -> str:
+        """t 时刻的文字内容"""
+        frame = int(round(t * self.fps))
+        rate = max(1, int(round(self.fps)))
+        seconds, frames = divmod(frame, rate)
+        minutes, seconds = divmod(seconds, 60)
+        hours, minutes = divmod(minutes, 60)
+        millis = int(round(t * 1000))
+        return self.template.format(
+            timecode=f'{hours:02d}:{minutes:02d}:{seconds:02d}:{frames:02d}',
+            frame=frame,
+            time=(f'{millis // 3600000:02d}:{millis // 60000 % 60:02d}:'
+                  f'{millis // 1000 % 60:02d}.{millis % 1000:03d}'),
+            seconds=t,
+            clock=self.clock_start + timedelta(seconds=t),
+        )
+
+    def blend(self, frame: np.ndarray, t: float) -> None:
+        """把 t 时刻的文字原地混合到可写帧上（RGB 帧或 yuv420p 帧）"""
+        if not self.is_active(t):
+            return
+        text = self.text_at(t)
+        if text != self._last_text:
+            self._last_text = text
+            self._last_render = self._render(text)
+            self._last_yuv420 = None
+        if self._last_render is None:
+            return
+
+        (x, y), premultiplied, inverse_alpha = self._last_render
+        height, width = inverse_alpha.shape[:2]
+        planes = yuv420_planes(frame) if frame.ndim == 2 else None
+        frame_h, frame_w = (planes[0] if planes else frame).shape[:2]
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + width, frame_w), min(y + height, frame_h)
+        if x1 <= x0 or y1 <= y0:
+            return
+        region = (slice(y0, y1), slice(x0, x1))
+        local = (slice(y0 - y, y1 - y), slice(x0 - x, x1 - x))
+
+        if planes is None:
+            blend_tile(frame[region], premultiplied[local], inverse_alpha[local])
+            return
+        # 同一段文字只转换一次
+        if self._last_yuv420 is None:
+            self._last_yuv420 = rgb_tile_to_yuv420(region, premultiplied[local],
+                                                   inverse_alpha[local])
+        for plane, plane_region, plane_premultiplied, plane_inverse in self._last_yuv420:
+            blend_tile(planes[plane][plane_region], plane_premultiplied, plane_inverse)
+
+    def _render(self, text: str):
+        """用图集拼出文字，返回 (左上角坐标, 预乘颜色+128, 反向alpha)"""
+        glyphs = [self.atlas.glyph(char) for char in text]
+        if not glyphs:
+            return None
+
+        # 排版：笔位累加前进量，单元格按偏移放置，整体右移使最左单元格从0开始
+        pen = 0.0
+        placements = []
+        for glyph in glyphs:
+            placements.append((int(round(pen)) + glyph.offset, glyph))
+            pen += glyph.advance
+        shift = -min(x for x, _ in placements)
+        width = max(x + shift + glyph.fill.shape[1] for x, glyph in placements)
+
+        if self._fill_strip.shape[1] < width:
+            self._fill_strip = np.zeros((self.atlas.height, width * 2), np.uint8)
+            self._stroke_strip = np.zeros_like(self._fill_strip)
+        fill = self._fill_strip[:, :width]
+        fill[...] = 0
+        stroke = None
+        if self.atlas.stroke_width > 0:
+            stroke = self._stroke_strip[:, :width]
+            stroke[...] = 0
+
+        # 相邻字形的遮罩取并集（与 PIL 整串绘制的覆盖方式一致）
+        for x, glyph in placements:
+            columns = slice(x + shift, x + shift + glyph.fill.shape[1])
+            np.maximum(fill[:, columns], glyph.fill, out=fill[:, columns])
+            if stroke is not None:
+                np.maximum(stroke[:, columns], glyph.stroke, out=stroke[:, columns])
+
+        # 填充在描边之上：alpha = 填充 + 描边 × (1 - 填充)
+        fill_alpha = fill.astype(np.uint32)[:, :, None]
+        if stroke is not None:
+            stroke_alpha = stroke[:, :, None] * (255 - fill_alpha) // 255
+            color = self._fill_rgb * fill_alpha + self._stroke_rgb * stroke_alpha
+            alpha = fill_alpha + stroke_alpha
+        else:
+            color = self._fill_rgb * fill_alpha
+            alpha = fill_alpha
+
+        alpha = alpha * self._opacity // 255
+        premultiplied = np.minimum(color * self._opacity // 255, 255 * alpha) + 128
+        position = self._compute_position(width, self.atlas.height)
+        return position, premultiplied, 255 - alpha
+
+    def _compute_position(self, width: int, height: int) -> Tuple[int, int]:
+        """计算文字左上角的整数坐标（规则与静态文字水印一致）"""
+        frame_w, frame_h = self.frame_size
+        horizontal, vertical = self.position
+
+        if horizontal == 'left':
+            x = self.margin
+        elif horizontal == 'center':
+            x = (frame_w - width) / 2
+        else:  # right
+            x = frame_w - width - self.margin
+
+        if vertical == 'top':
+            y = self.margin
+        elif vertical == 'center':
+            y = (frame_h - height) / 2
+        else:  # bottom
+            y = frame_h - height - self.margin
+
+        return int(x), int(y)
+
+
+def add_dynamic_text_watermark(
+    video_path: str,
+    template: str,
+    output_path: str,
+    position: Tuple[str, str] = ('right', 'bottom'),
+    font_size: int = 24,
+    color: str = 'white',
+    font_path: Optional[str] = None,
+    opacity: float = 0.9,
+    stroke_width: int = 0,
+    stroke_color: str = 'black',
+    start_time: Optional[float] = None,
+    end_time: Optional[float] = None,
+    margin: int = 15,
+    clock_start: Optional[datetime] = None,
+    threads: Optional[int] = None
+) -> None:
+    """向视频添加动态文字水印（时间码、帧号、时钟等）
+
+    Args:
+        video_path: 输入视频文件路径
+        template: 文字模板，如 '{timecode}'、'第 {frame} 帧'、'{clock:%Y-%m-%d %H:%M:%S}'
+                  （字段见 DynamicTextLayer）
+        output_path: 输出视频文件路径
+        position: 水印位置元组(horizontal, vertical)
+        font_size: 字体大小（像素）
+        color: 文字颜色
+        font_path: 字体文件路径或字体族名，默认自动选择
+        opacity: 文字透明度（0.0-1.0）
+        stroke_width: 描边宽度（默认0，表示无描边）
+        stroke_color: 描边颜色
+        start_time: 水印开始显示时间（秒），默认从视频开始
+        end_time: 水印结束显示时间（秒），默认到视频结束
+        margin: 边距（像素）
+        clock_start: {clock} 字段在视频开始时刻的时间，默认为当前时间
+        threads: 编码线程数，默认使用全部CPU核心
+    """
+    video = VideoFileClip(video_path)
+
+    layer = DynamicTextLayer(
+        template, video.size, video.fps, position, font_size, color, font_path,
+        opacity, stroke_width, stroke_color, start_time or 0, end_time, margin, clock_start
+    )
+    # 提前检查模板字段，避免编码中途出错
+    layer.text_at(0)
+
+    def process(frame, t):
+        if not layer.is_active(t):
+            return frame
+        # 解码器返回的帧是只读的且会被复用，需要先复制；流水线缓冲区中的帧可直接修改
+        if not frame.flags.writeable:
+            frame = frame.copy()
+        layer.blend(frame, t)
+        return frame
+
+    # 解码、合成、编码流水线并行，帧零拷贝读入复用缓冲区
+    render_pipelined(video, output_path, process, threads=threads or os.cpu_count(),
+                     source_path=video_path)
+
+    video.close()
@@ -0,0 +1,378 @@
+"""系统字体索引：扫描标准字体目录，记录字体族、样式和 Unicode 覆盖范围
+
+索引只在首次使用时构建，并持久化为 JSON 缓存文件；之后按目录修改时间判断是否需要
+重新扫描，且只重新解析新增或修改过的字体文件。字体文件只读取 name 表和 cmap 表，不加载字形。
+"""
+
+import bisect
+import json
+import os
+import struct
+import sys
+import tempfile
+import threading
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from .asset_cache import user_cache_dir
+
+# 索引格式版本，解析规则变化时递增以使旧缓存失效
+INDEX_VERSION = 1
+
+FONT_EXTENSIONS = ('.ttf', '.otf', '.ttc', '.otc')
+
+# 缓存中表示“目录不存在”的修改时间
+MISSING_DIR = -1
+
+# 未指定字体时依次尝试的字体族（与原先的系统字体列表顺序一致）
+DEFAULT_FAMILIES = [
+    'DejaVu Sans', 'Liberation Sans', 'Ubuntu', 'Helvetica', 'Arial',
+    'Segoe UI', 'Calibri', 'Tahoma', 'Verdana',
+]
+
+# 优先选择的常规样式名
+REGULAR_STYLES = ('regular', 'book', 'normal', 'roman', 'medium')
+
+
+class FontInfo(NamedTuple):
+    """索引中的一个字体（TTC 字体集合中的每个字体单独记录）"""
+    path: str
+    index: int                        # 字体集合内的序号（传给 ImageFont.truetype 的 index）
+    family: str
+    style: str
+    ranges: List[Tuple[int, int]]     # 已合并、升序的码位区间 [start, end]
+
+    def covers(self, text: str) -> bool:
+        """判断字体是否包含 text 中所有字符（空白字符除外）"""
+        starts = [start for start, _ in self.ranges]
+        for char in set(text):
+            if char.isspace():
+                continue
+            code = ord(char)
+            position = bisect.bisect_right(starts, code) - 1
+            if position < 0 or code > self.ranges[position][1]:
+                return False
+        return True
+
+
+def default_font_dirs() -> List[str]:
+    """当前系统的标准字体目录"""
+    home = os.path.expanduser('~')
+    if os.name == 'nt':
+        windir = os.environ.get('WINDIR', 'C:\\Windows')
+        dirs = [os.path.join(windir, 'Fonts')]
+        if os.environ.get('LOCALAPPDATA'):
+            dirs.append(os.path.join(os.environ['LOCALAPPDATA'], 'Microsoft', 'Windows', 'Fonts'))
+        return dirs
+    if sys.platform == 'darwin':
+        return ['/System/Library/Fonts', '/Library/Fonts', os.path.join(home, 'Library', 'Fonts')]
+    return ['/usr/share/fonts', '/usr/local/share/fonts',
+            os.path.join(home, '.local', 'share', 'fonts'), os.path.join(home, '.fonts')]
+
+
+def default_index_path() -> str:
+    """默认索引缓存文件路径"""
+    return os.path.join(user_cache_dir(), 'font_index.json')
+
+
+class FontIndex:
+    """字体索引：按字体族名快速查找，按文字内容筛选可用字体"""
+
+    def __init__(self, fonts: List[FontInfo]):
+        self.fonts = fonts
+        # 字体族名（小写）-> 该族的字体列表
+        self._families: Dict[str, List[FontInfo]] = {}
+        for font in fonts:
+            self._families.setdefault(font.family.lower(), []).append(font)
+
+    def families(self) -> List[str]:
+        """所有字体族名（排序后）"""
+        return sorted({font.family for font in self.fonts})
+
+    def find(self, family: str, style: Optional[str] = None) -> Optional[FontInfo]:
+        """按字体族名查找字体（不区分大小写）
+
+        Args:
+            family: 字体族名，如 'DejaVu Sans'
+            style: 样式名，如 'Bold'；None 表示优先常规样式
+
+        Returns:
+            匹配的字体，找不到时返回 None
+        """
+        candidates = self._families.get(family.lower())
+        if not candidates:
+            return None
+        if style is not None:
+            for font in candidates:
+                if font.style.lower() == style.lower():
+                    return font
+            return None
+        return _prefer_regular(candidates)
+
+    def fonts_for_text(self, text: str) -> List[FontInfo]:
+        """能完整渲染 text 的所有字体（常规样式在前）"""
+        fonts = [font for font in self.fonts if font.covers(text)]
+        fonts.sort(key=lambda font: (font.style.lower() not in REGULAR_STYLES,
+                                     font.family.lower(), font.path, font.index))
+        return fonts
+
+    def default_font(self, text: str = '') -> Optional[FontInfo]:
+        """选择默认字体：优先 DEFAULT_FAMILIES 中能渲染 text 的字体，
+        否则选择任意能渲染 text 的字体（如 CJK 字幕），都没有时退回第一个默认字体族"""
+        preferred = [self.find(family) for family in DEFAULT_FAMILIES]
+        preferred = [font for font in preferred if font is not None]
+        for font in preferred:
+            if font.covers(text):
+                return font
+        covering = self.fonts_for_text(text)
+        if covering:
+            return covering[0]
+        return preferred[0] if preferred else None
+
+
+def build_font_index(
+    font_dirs: Optional[Iterable[str]] = None,
+    cache_path: Optional[str] = None,
+    refresh: bool = False
+) -> FontIndex:
+    """构建字体索引（优先使用缓存文件）
+
+    缓存中记录了扫描过的每个目录的修改时间；所有目录都未变化时直接使用缓存，
+    否则重新遍历目录，只解析新增或大小/修改时间变化的字体文件。
+
+    Args:
+        font_dirs: 要扫描的字体目录，默认为系统标准字体目录
+        cache_path: 索引缓存文件路径，默认为用户缓存目录下的 font_index.json，
+                    空字符串表示不使用缓存
+        refresh: 忽略已有缓存，重新解析所有字体文件（结果仍写入缓存）
+
+    Returns:
+        字体索引
+    """
+    font_dirs = [os.path.abspath(d) for d in (font_dirs or default_font_dirs())]
+    if cache_path is None:
+        cache_path = default_index_path()
+
+    cached = _load_cache(cache_path, font_dirs) if cache_path and not refresh else None
+    if cached is not None and _dirs_unchanged(cached['dirs']):
+        return FontIndex(_fonts_from_entries(cached['files']))
+
+    old_files = cached['files'] if cached else {}
+    dirs: Dict[str, int] = {}
+    files: Dict[str, dict] = {}
+    for root_dir in font_dirs:
+        if not os.path.isdir(root_dir):
+            # 记录不存在的目录，之后创建时重新扫描
+            dirs[root_dir] = MISSING_DIR
+            continue
+        for dirpath, _, filenames in os.walk(root_dir):
+            try:
+                dirs[dirpath] = os.stat(dirpath).st_mtime_ns
+            except OSError:
+                continue
+            for filename in filenames:
+                if not filename.lower().endswith(FONT_EXTENSIONS):
+                    continue
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                signature = [stat.st_size, stat.st_mtime_ns]
+                old = old_files.get(path)
+                if old and old['signature'] == signature:
+                    files[path] = old
+                else:
+                    files[path] = {'signature': signature, 'faces': _parse_font_file(path)}
+
+    if cache_path:
+        _save_cache(cache_path, font_dirs, dirs, files)
+    return FontIndex(_fonts_from_entries(files))
+
+
+_index: Optional[FontIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_font_index(refresh: bool = False) -> FontIndex:
+    """获取系统字体索引（进程内只构建一次，refresh 为 True 时重新扫描）"""
+    global _index
+    with _index_lock:
+        if _index is None or refresh:
+            _index = build_font_index(refresh=refresh)
+        return _index
+
+
+def _prefer_regular(fonts: List[FontInfo]) -> FontInfo:
+    """在同一字体族中优先选择常规样式"""
+    for style in REGULAR_STYLES:
+        for font in fonts:
+            if font.style.lower() == style:
+                return font
+    return fonts[0]
+
+
+def _fonts_from_entries(files: Dict[str, dict]) -> List[FontInfo]:
+    """由缓存条目生成字体列表（按路径排序，保证结果稳定）"""
+    fonts = []
+    for path in sorted(files):
+        for face in files[path]['faces']:
+            fonts.append(FontInfo(path, face['index'], face['family'], face['style'],
+                                  [tuple(r) for r in face['ranges']]))
+    return fonts
+
+
+def _dirs_unchanged(dirs: Dict[str, int]) -> bool:
+    """缓存中记录的目录修改时间是否全部未变化（新增/删除文件会改变所在目录的修改时间）"""
+    for path, mtime in dirs.items():
+        try:
+            if os.stat(path).st_mtime_ns != mtime:
+                return False
+        except OSError:
+            if mtime != MISSING_DIR:
+                return False
+    return True
+
+
+def _load_cache(cache_path: str, font_dirs: List[str]) -> Optional[dict]:
+    """读取索引缓存，版本或扫描目录不一致时返回 None"""
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if data.get('version') != INDEX_VERSION or data.get('roots') != font_dirs:
+        return None
+    return data
+
+
+def _save_cache(cache_path: str, font_dirs: List[str], dirs: Dict[str, int],
+                files: Dict[str, dict]) -> None:
+    """原子写入索引缓存（写入失败时忽略）"""
+    data = {'version': INDEX_VERSION, 'roots': font_dirs, 'dirs': dirs, 'files': files}
+    try:
+        directory = os.path.dirname(os.path.abspath(cache_path))
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(temp_path, cache_path)
+    except OSError:
+        pass
+
+
+def _parse_font_file(path: str) -> List[dict]:
+    """解析字体文件中每个字体的族名、样式和码位覆盖范围，无法解析时返回空列表"""
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+        if data[:4] == b'ttcf':
+            count = struct.unpack_from('>I', data, 8)[0]
+            offsets = struct.unpack_from(f'>{count}I', data, 12)
+        else:
+            offsets = (0,)
+
+        faces = []
+        for index, offset in enumerate(offsets):
+            tables = _read_table_directory(data, offset)
+            if 'name' not in tables or 'cmap' not in tables:
+                continue
+            family, style = _read_names(data, tables['name'])
+            if not family:
+                continue
+            faces.append({
+                'index': index,
+                'family': family,
+                'style': style or 'Regular',
+                'ranges': _read_cmap_ranges(data, tables['cmap']),
+            })
+        return faces
+    except (OSError, struct.error, ValueError, UnicodeDecodeError):
+        return []
+
+
+def _read_table_directory(data: bytes, offset: int) -> Dict[str, int]:
+    """读取 sfnt 表目录：表标签 -> 表偏移"""
+    num_tables = struct.unpack_from('>H', data, offset + 4)[0]
+    tables = {}
+    for i in range(num_tables):
+        tag, _, table_offset, _ = struct.unpack_from('>4sIII', data, offset + 12 + 16 * i)
+        tables[tag.decode('latin-1')] = table_offset
+    return tables
+
+
+def _read_names(data: bytes, offset: int) -> Tuple[Optional[str], Optional[str]]:
+    """读取 name 表中的字体族名和样式名（优先排版族名 16/17，优先英文 Windows 记录）"""
+    _, count, string_offset = struct.unpack_from('>HHH', data, offset)
+    names: Dict[int, Tuple[int, str]] = {}
+    for i in range(count):
+        platform, encoding, language, name_id, length, name_offset = struct.unpack_from(
+            '>6H', data, offset + 6 + 12 * i)
+        if name_id not in (1, 2, 16, 17):
+            continue
+        start = offset + string_offset + name_offset
+        raw = data[start:start + length]
+        if platform == 3 or platform == 0:
+            value = raw.decode('utf-16-be', errors='replace')
+            priority = 0 if language == 0x409 or platform == 0 else 1
+        elif platform == 1 and encoding == 0:
+            value = raw.decode('latin-1')
+            priority = 2
+        else:
+            continue
+        if name_id not in names or priority < names[name_id][0]:
+            names[name_id] = (priority, value)
+
+    family = names.get(16, names.get(1, (0, None)))[1]
+    style = names.get(17, names.get(2, (0, None)))[1]
+    return family, style
+
+
+def _read_cmap_ranges(data: bytes, offset: int) -> List[List[int]]:
+    """读取 cmap 表的码位覆盖范围（支持 format 4 和 format 12），返回合并后的区间"""
+    _, num_tables = struct.unpack_from('>HH', data, offset)
+    subtables = {}
+    for i in range(num_tables):
+        platform, encoding, sub_offset = struct.unpack_from('>HHI', data, offset + 4 + 8 * i)
+        subtables[(platform, encoding)] = offset + sub_offset
+
+    # 优先完整 Unicode 子表（format 12），其次 BMP 子表（format 4）
+    for key in ((3, 10), (0, 6), (0, 4), (3, 1), (0, 3), (0, 2), (0, 1), (0, 0)):
+        if key not in subtables:
+            continue
+        sub = subtables[key]
+        fmt = struct.unpack_from('>H', data, sub)[0]
+        if fmt == 12:
+            return _merge_ranges(_cmap_format12(data, sub))
+        if fmt == 4:
+            return _merge_ranges(_cmap_format4(data, sub))
+    return []
+
+
+def _cmap_format4(data: bytes, offset: int) -> List[Tuple[int, int]]:
+    """format 4：分段映射（只记录有字形的区间，忽略结束标记 0xFFFF）"""
+    seg_count = struct.unpack_from('>H', data, offset + 6)[0] // 2
+    ends_offset = offset + 14
+    ends = struct.unpack_from(f'>{seg_count}H', data, ends_offset)
+    starts = struct.unpack_from(f'>{seg_count}H', data, ends_offset + 2 * seg_count + 2)
+    return [(start, end) for start, end in zip(starts, ends) if start != 0xFFFF]
+
+
+def _cmap_format12(data: bytes, offset: int) -> List[Tuple[int, int]]:
+    """format 12：分组映射（覆盖全部 Unicode 平面）"""
+    num_groups = struct.unpack_from('>I', data, offset + 12)[0]
+    ranges = []
+    for i in range(num_groups):
+        start, end, _ = struct.unpack_from('>III', data, offset + 16 + 12 * i)
+        ranges.append((start, end))
+    return ranges
+
+
+def _merge_ranges(ranges: List[Tuple[int, int]]) -> List[List[int]]:
+    """合并相交或相邻的区间"""
+    merged: List[List[int]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
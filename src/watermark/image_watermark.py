@@ -3,7 +3,18 @@
 import os
 from typing import Optional, Tuple
 
-from moviepy import VideoFileClip, ImageClip, CompositeVideoClip
+from PIL import Image
+from moviepy import VideoFileClip, ImageClip
+
+from ..media.ffmpeg_tools import run_ffmpeg
+from ..media.pipeline import render_pipelined
+from ..media.probe import probe_media
+from ..media.segments import render_segments_parallel, render_window_only
+from .overlay import StaticOverlay
+from .timeline import static_overlay_processor
+
+# 可选的处理后端
+BACKENDS = ['moviepy', 'ffmpeg']
 
 
 def add_image_watermark(
@@ -16,7 +27,11 @@ def add_image_watermark(
     start_time: Optional[float] = None,
     end_time: Optional[float] = None,
     width: Optional[int] = None,
-    height: Optional[int] = None
+    height: Optional[int] = None,
+    backend: str = 'moviepy',
+    smart_render: bool = False,
+    threads: Optional[int] = None,
+    segments: Optional[int] = None
 ) -> None:
     """向视频添加图片水印
 
@@ -33,10 +48,76 @@ def add_image_watermark(
         end_time: 水印结束显示时间（秒），默认到视频结束
         width: 水印宽度（像素），保持宽高比
         height: 水印高度（像素），保持宽高比
+        backend: 处理后端
+                 'moviepy': 逐帧在Python中合成（默认）
+                 'ffmpeg': 构建滤镜图由单个ffmpeg进程完成，帧不进入Python
+        smart_render: 仅重编码与水印时间范围重叠的GOP，其余部分流复制
+                      （源视频需为 h264/yuv420p，否则自动回退为完整渲染）
+        threads: 编码线程数，默认使用全部CPU核心（批量并行处理时由调度方分配；
+                 分段并行时为每段的线程数）
+        segments: 分段并行编码的段数：在关键帧处切分，由多个进程分别处理后无损拼接
+                  （适合长视频；不指定或为1时单进程处理）
     """
+    if backend not in BACKENDS:
+        raise ValueError(f"后端必须是 {BACKENDS} 之一， got '{backend}'")
+
+    if segments and segments > 1:
+        render_kwargs = dict(
+            watermark_path=watermark_path, position=position, opacity=opacity,
+            margin=margin, width=width, height=height, backend=backend
+        )
+        if render_segments_parallel(video_path, output_path, segments, add_image_watermark,
+                                    render_kwargs, start_time, end_time, threads):
+            return
+
+    if smart_render:
+        def render_segment(segment_path, segment_output, local_start, local_end):
+            add_image_watermark(
+                segment_path, watermark_path, segment_output, position, opacity,
+                margin, local_start, local_end, width, height, backend,
+                threads=threads
+            )
+
+        if render_window_only(video_path, output_path, start_time, end_time, render_segment):
+            return
+
+    if backend == 'ffmpeg':
+        _add_image_watermark_ffmpeg(
+            video_path, watermark_path, output_path, position, opacity,
+            margin, start_time, end_time, width, height, threads
+        )
+        return
+
     # 加载视频
     video = VideoFileClip(video_path)
 
+    # 预先计算静态图片水印
+    overlay = build_image_overlay(
+        video, watermark_path, position, opacity, margin,
+        start_time, end_time, width, height
+    )
+
+    # 合成视频（逐帧只混合水印所在区域），解码、合成、编码流水线并行，帧零拷贝读入复用缓冲区
+    process = static_overlay_processor([overlay], video.duration)
+    render_pipelined(video, output_path, process, threads=threads or os.cpu_count(),
+                     source_path=video_path)
+
+    # 释放资源
+    video.close()
+
+
+def build_image_overlay(
+    video: VideoFileClip,
+    watermark_path: str,
+    position: Tuple[str, str] = ('right', 'bottom'),
+    opacity: float = 0.8,
+    margin: int = 10,
+    start_time: Optional[float] = None,
+    end_time: Optional[float] = None,
+    width: Optional[int] = None,
+    height: Optional[int] = None
+) -> StaticOverlay:
+    """生成图片水印的静态合成器（参数含义同 add_image_watermark）"""
     # 加载水印图片
     watermark = ImageClip(watermark_path)
 
@@ -59,35 +140,12 @@ def add_image_watermark(
     if end_time is None:
         end_time = video.duration
 
-    watermark = watermark.with_start(start_time)
-    watermark = watermark.with_end(end_time)
-    watermark = watermark.with_duration(end_time - start_time)
-
-    # 设置水印位置
+    # 计算水印位置，预先计算静态水印的混合数据（含透明度）
     position_func = _get_position_function(video, watermark, position, margin)
-    watermark = watermark.with_position(position_func)
-
-    # 设置透明度
-    watermark = watermark.with_opacity(opacity)
-
-    # 合成视频
-    final_video = CompositeVideoClip([video, watermark], size=video.size)
-
-    # 写出视频
-    # 使用原视频的编解码器参数
-    final_video.write_videofile(
-        output_path,
-        codec='libx264',
-        audio_codec='aac',
-        threads=os.cpu_count(),
-        logger=None  # 禁用日志输出
+    return StaticOverlay.from_clip(
+        watermark, position_func(start_time), video.size, opacity, start_time, end_time
     )
 
-    # 释放资源
-    video.close()
-    watermark.close()
-    final_video.close()
-
 
 def _get_position_function(
     video: VideoFileClip,
@@ -106,24 +164,114 @@ def _get_position_function(
     Returns:
         位置函数
     """
-    horizontal, vertical = position
-    
+    x, y = _compute_position(video.size, watermark.size, position, margin)
+
     def position_func(t):
-        # 计算水印位置
-        if horizontal == 'left':
-            x = margin
-        elif horizontal == 'center':
-            x = (video.w - watermark.w) / 2
-        else:  # right
-            x = video.w - watermark.w - margin
-        
-        if vertical == 'top':
-            y = margin
-        elif vertical == 'center':
-            y = (video.h - watermark.h) / 2
-        else:  # bottom
-            y = video.h - watermark.h - margin
-        
         return (x, y)
-    
+
     return position_func
+
+
+def _add_image_watermark_ffmpeg(
+    video_path: str,
+    watermark_path: str,
+    output_path: str,
+    position: Tuple[str, str],
+    opacity: float,
+    margin: int,
+    start_time: Optional[float],
+    end_time: Optional[float],
+    width: Optional[int],
+    height: Optional[int],
+    threads: Optional[int] = None
+) -> None:
+    """使用 ffmpeg 滤镜图添加图片水印（scale + colorchannelmixer + overlay）
+
+    尺寸、位置、透明度和时间范围的计算与 moviepy 路径保持一致。
+    """
+    # 只探测元数据，不启动帧读取器
+    info = probe_media(video_path)
+    video_w, video_h = info.size
+    duration = info.duration
+
+    with Image.open(watermark_path) as image:
+        image_w, image_h = image.size
+
+    wm_w, wm_h = _compute_watermark_size(
+        (image_w, image_h), video_w, width, height
+    )
+
+    if start_time is None:
+        start_time = 0
+    if end_time is None:
+        end_time = duration
+
+    x, y = _compute_position((video_w, video_h), (wm_w, wm_h), position, margin)
+
+    filter_graph = (
+        f"[1:v]format=rgba,scale={wm_w}:{wm_h}:flags=lanczos,"
+        f"colorchannelmixer=aa={opacity:.4f}[wm];"
+        f"[0:v][wm]overlay=x={x}:y={y}:"
+        f"enable='gte(t,{start_time:.6f})*lt(t,{end_time:.6f})'[out]"
+    )
+
+    run_ffmpeg([
+        '-i', video_path,
+        '-i', watermark_path,
+        '-filter_complex', filter_graph,
+        '-map', '[out]',
+        '-map', '0:a?',
+        '-c:v', 'libx264',
+        '-preset', 'medium',
+        '-pix_fmt', 'yuv420p',
+        '-c:a', 'aac',
+        '-threads', str(threads or os.cpu_count()),
+        output_path
+    ])
+
+
+def _compute_watermark_size(
+    image_size: Tuple[int, int],
+    video_w: int,
+    width: Optional[int],
+    height: Optional[int]
+) -> Tuple[int, int]:
+    """计算水印缩放后的尺寸（与 moviepy 的 resized 取整规则一致）"""
+    image_w, image_h = image_size
+    if width and height:
+        return int(width), int(height)
+    if width:
+        return int(width), int(image_h * width / image_w)
+    if height:
+        return int(image_w * height / image_h), int(height)
+    # 默认比例：视频宽度的1/6
+    target_w = int(video_w / 6)
+    return target_w, int(image_h * target_w / image_w)
+
+
+def _compute_position(
+    video_size: Tuple[int, int],
+    watermark_size: Tuple[int, int],
+    position: Tuple[str, str],
+    margin: int
+) -> Tuple[int, int]:
+    """计算水印左上角的整数坐标（取整规则与 moviepy 的 compute_position 一致）"""
+    video_w, video_h = video_size
+    wm_w, wm_h = watermark_size
+    horizontal, vertical = position
+
+    if horizontal == 'left':
+        x = margin
+    elif horizontal == 'center':
+        x = (video_w - wm_w) / 2
+    else:  # right
+        x = video_w - wm_w - margin
+
+    if vertical == 'top':
+        y = margin
+    elif vertical == 'center':
+        y = (video_h - wm_h) / 2
+    else:  # bottom
+        y = video_h - wm_h - margin
+
+    return int(x), int(y)
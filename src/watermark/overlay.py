@@ -0,0 +1,322 @@
+"""水印叠加层工具：由内存中的 PIL 图像构建剪辑，以及静态水印的区域合成"""
+
+import threading
+from typing import List, Optional, Tuple, Union
+
+import numpy as np
+from PIL import Image
+from moviepy import ImageClip
+from moviepy.tools import compute_position
+
+# 混合时每次处理的行数：中间结果只占一条带的复用缓冲区，而不是整个图块大小的临时数组
+BLEND_STRIP_ROWS = 64
+
+# 每个线程各自的混合缓冲区（合成线程、批量处理的各进程互不共享）
+_scratch = threading.local()
+
+# BT.601 有限范围的 RGB -> YUV 系数（行依次为 Y、U、V，作用于 0-255 的 RGB）及各分量的偏移
+_YUV_MATRIX = np.array([
+    [65.481, 128.553, 24.966],
+    [-37.797, -74.203, 112.0],
+    [112.0, -93.786, -18.214],
+]) / 255.0
+_YUV_OFFSETS = (16, 128, 128)
+
+
+def image_to_clip(image: Union[Image.Image, np.ndarray]) -> ImageClip:
+    """把 PIL 图像转换为带遮罩的 ImageClip，不经过临时 PNG 文件
+
+    RGB 通道作为画面，alpha 通道只转换一次作为遮罩，
+    结果与 ImageClip(png路径) 读取同一张图片完全一致。
+
+    Args:
+        image: 水印图像（任意模式，内部转换为 RGBA），
+               或 (h, w, 4) 的 RGBA uint8 数组（如磁盘缓存的内存映射）
+
+    Returns:
+        带 alpha 遮罩的 ImageClip
+    """
+    if isinstance(image, np.ndarray):
+        rgba = image
+    else:
+        rgba = np.asarray(image.convert('RGBA'))
+    clip = ImageClip(np.ascontiguousarray(rgba[:, :, :3]))
+    clip.mask = ImageClip(rgba[:, :, 3] / 255.0, is_mask=True)
+    return clip
+
+
+class StaticOverlay:
+    """静态水印合成器
+
+    创建时一次性计算水印的预乘颜色、反向 alpha 和整数放置区域（图块），
+    逐帧只对图块区域做整数向量化混合，开销与水印面积成正比而不是整帧。
+    单个图层的混合结果与 moviepy 合成所用的 PIL alpha_composite（不透明背景）逐像素一致。
+    同时显示的多个图层可由 merge_overlays 合并为一个带若干图块的合成器。
+    """
+
+    def __init__(
+        self,
+        rgb: np.ndarray,
+        alpha: np.ndarray,
+        position: Tuple[int, int],
+        frame_size: Tuple[int, int],
+        start_time: float = 0,
+        end_time: Optional[float] = None
+    ):
+        """
+        Args:
+            rgb: 水印颜色 (h, w, 3) uint8
+            alpha: 水印不透明度 (h, w) uint8，已包含整体透明度
+            position: 水印左上角在画面中的整数坐标 (x, y)，允许超出画面
+            frame_size: 画面尺寸 (宽, 高)
+            start_time: 开始显示时间（秒）
+            end_time: 结束显示时间（秒，不含），None 表示到视频结束
+        """
+        self.start_time = start_time
+        self.end_time = end_time
+        # 图块列表：(区域切片, 预乘颜色+舍入偏置, 反向alpha)
+        self.tiles = []
+        self._yuv420 = None
+
+        # 裁剪到画面范围内
+        x, y = position
+        frame_w, frame_h = frame_size
+        height, width = alpha.shape
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + width, frame_w), min(y + height, frame_h)
+        if x1 <= x0 or y1 <= y0:
+            return
+
+        rgb = rgb[y0 - y:y1 - y, x0 - x:x1 - x]
+        alpha = alpha[y0 - y:y1 - y, x0 - x:x1 - x, None].astype(np.uint32)
+        # 预乘颜色（含四舍五入偏置）和反向 alpha，逐帧只需一次乘加
+        self.tiles.append((
+            (slice(y0, y1), slice(x0, x1)),
+            rgb.astype(np.uint32) * alpha + 128,
+            255 - alpha
+        ))
+
+    @classmethod
+    def from_clip(
+        cls,
+        clip: ImageClip,
+        position: Tuple[float, float],
+        frame_size: Tuple[int, int],
+        opacity: float = 1.0,
+        start_time: float = 0,
+        end_time: Optional[float] = None
+    ) -> 'StaticOverlay':
+        """由（已缩放的）ImageClip 创建合成器
+
+        位置取整和透明度换算与 moviepy 的 with_position/with_opacity 保持一致。
+        """
+        rgb = clip.get_frame(0).astype('uint8')
+        if clip.mask is not None:
+            mask = clip.mask.get_frame(0)
+        else:
+            mask = np.ones(rgb.shape[:2])
+        alpha = ((opacity * mask) * 255).astype('uint8')
+        position = compute_position(clip.size, frame_size, position)
+        return cls(rgb, alpha, position, frame_size, start_time, end_time)
+
+    def is_active(self, t: float) -> bool:
+        """判断 t 时刻水印是否显示"""
+        if not self.tiles or t < self.start_time:
+            return False
+        return self.end_time is None or t < self.end_time
+
+    def blend(self, frame: np.ndarray) -> None:
+        """把水印原地混合到可写帧上"""
+        for region, premultiplied, inverse_alpha in self.tiles:
+            blend_tile(frame[region], premultiplied, inverse_alpha)
+
+    def yuv420(self) -> 'Yuv420Overlay':
+        """转换为 yuv420p 帧上的合成器（首次调用时转换，之后复用）"""
+        if self._yuv420 is None:
+            tiles = [tile for region, premultiplied, inverse_alpha in self.tiles
+                     for tile in rgb_tile_to_yuv420(region, premultiplied, inverse_alpha)]
+            self._yuv420 = Yuv420Overlay(tiles, self.start_time, self.end_time)
+        return self._yuv420
+
+
+def blend_tile(roi: np.ndarray, premultiplied: np.ndarray, inverse_alpha: np.ndarray) -> None:
+    """把一个图块原地混合到帧的区域上
+
+    按 BLEND_STRIP_ROWS 行一条带分批计算，uint32 中间结果写入当前线程复用的缓冲区，
+    逐帧不分配与图块等大的临时数组（全画面水印在 4K 下每个临时数组约 100MB）。
+
+    Args:
+        roi: 帧上的可写区域 (h, w, 3) uint8，或 YUV 平面上的区域 (h, w)
+        premultiplied: 预乘颜色 + 128 舍入偏置，形状与 roi 相同的 uint32
+        inverse_alpha: 255 - alpha (h, w, 1) 或 (h, w) uint32
+    """
+    height, width = roi.shape[:2]
+    value_buffer, shifted_buffer = _scratch_buffers(width, roi.shape[2:])
+    for top in range(0, height, BLEND_STRIP_ROWS):
+        rows = slice(top, min(top + BLEND_STRIP_ROWS, height))
+        strip = roi[rows]
+        value = value_buffer[:len(strip)]
+        shifted = shifted_buffer[:len(strip)]
+        # 定点除以255：((x >> 8) + x) >> 8。PIL alpha_composite 先左移 7 位
+        # （(((x << 7) >> 8) + (x << 7)) >> 15），在 x ≤ 255 × 255 + 128 的取值范围内两者逐值相同
+        np.multiply(strip, inverse_alpha[rows], out=value)
+        value += premultiplied[rows]
+        np.right_shift(value, 8, out=shifted)
+        shifted += value
+        shifted >>= 8
+        np.copyto(strip, shifted, casting='unsafe')
+
+
+def _scratch_buffers(width: int, channels: Tuple[int, ...]) -> Tuple[np.ndarray, np.ndarray]:
+    """取当前线程的混合缓冲区（两条 uint32 条带），宽度不足时重新分配"""
+    if not hasattr(_scratch, 'buffers'):
+        _scratch.buffers = {}
+    buffers = _scratch.buffers.get(channels)
+    if buffers is None or buffers[0].shape[1] < width:
+        shape = (BLEND_STRIP_ROWS, width) + tuple(channels)
+        buffers = (np.empty(shape, np.uint32), np.empty(shape, np.uint32))
+        _scratch.buffers[channels] = buffers
+    return buffers[0][:, :width], buffers[1][:, :width]
+
+
+def yuv420_planes(frame: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """把 yuv420p 帧（(高 × 3/2, 宽) 的 C 连续 uint8 数组）拆成 Y、U、V 三个平面的视图"""
+    width = frame.shape[1]
+    height = frame.shape[0] * 2 // 3
+    luma_size = width * height
+    chroma_size = luma_size // 4
+    flat = frame.reshape(-1)
+    return (
+        flat[:luma_size].reshape(height, width),
+        flat[luma_size:luma_size + chroma_size].reshape(height // 2, width // 2),
+        flat[luma_size + chroma_size:].reshape(height // 2, width // 2),
+    )
+
+
+def rgb_tile_to_yuv420(
+    region: Tuple[slice, slice],
+    premultiplied: np.ndarray,
+    inverse_alpha: np.ndarray
+) -> List[tuple]:
+    """把画面上的一个 RGB 图块转换为 Y、U、V 三个平面上的图块
+
+    按 BT.601 有限范围（ffmpeg 对未标注色彩信息的视频的默认矩阵）转换预乘颜色；
+    U、V 平面为半分辨率，每个色度样本取对应 2×2 像素预乘颜色与 alpha 的平均值
+    （图块未覆盖的像素按透明计入）。YUV 是 RGB 的仿射变换，按平面混合与先在 RGB 中混合再转换等价，
+    差异只来自舍入和色度下采样的方式：亮度不超过 ±2，色度在水印边缘一般不超过 ±6。
+
+    Args:
+        region: 图块在画面上的区域 (行切片, 列切片)
+        premultiplied: 预乘颜色 + 128 舍入偏置 (h, w, 3) uint32
+        inverse_alpha: 255 - alpha (h, w, 1) uint32
+
+    Returns:
+        [(平面序号 0/1/2, 平面上的区域, 预乘值 + 128, 反向alpha), ...]，可直接交给 blend_tile
+    """
+    rows, columns = region
+    alpha = 255.0 - inverse_alpha[:, :, 0]
+    color = premultiplied - 128.0
+
+    tiles = []
+    luma = np.clip(np.rint(color @ _YUV_MATRIX[0] + _YUV_OFFSETS[0] * alpha), 0, 255 * alpha)
+    tiles.append((0, region, luma.astype(np.uint32) + 128, inverse_alpha[:, :, 0]))
+
+    # 扩展到偶数对齐的区域后按 2×2 求和
+    y0, x0 = rows.start // 2, columns.start // 2
+    y1, x1 = (rows.stop + 1) // 2, (columns.stop + 1) // 2
+    top, left = rows.start - 2 * y0, columns.start - 2 * x0
+    height, width = alpha.shape
+    padded_alpha = np.zeros((2 * (y1 - y0), 2 * (x1 - x0)))
+    padded_alpha[top:top + height, left:left + width] = alpha
+    padded_color = np.zeros(padded_alpha.shape + (3,))
+    padded_color[top:top + height, left:left + width] = color
+
+    chroma_alpha = np.rint(padded_alpha.reshape(y1 - y0, 2, x1 - x0, 2).sum(axis=(1, 3)) / 4)
+    chroma_color = padded_color.reshape(y1 - y0, 2, x1 - x0, 2, 3).sum(axis=(1, 3)) / 4
+    chroma_region = (slice(y0, y1), slice(x0, x1))
+    for plane in (1, 2):
+        value = np.clip(np.rint(chroma_color @ _YUV_MATRIX[plane] +
+                                _YUV_OFFSETS[plane] * chroma_alpha), 0, 255 * chroma_alpha)
+        tiles.append((plane, chroma_region, value.astype(np.uint32) + 128,
+                      (255 - chroma_alpha).astype(np.uint32)))
+    return tiles
+
+
+class Yuv420Overlay:
+    """静态水印在 yuv420p 帧上的合成器：图块已预先转换到 Y、U、V 平面（见 rgb_tile_to_yuv420）"""
+
+    def __init__(self, tiles: List[tuple], start_time: float = 0, end_time: Optional[float] = None):
+        self.tiles = tiles
+        self.start_time = start_time
+        self.end_time = end_time
+
+    def blend(self, frame: np.ndarray) -> None:
+        """把水印原地混合到可写的 yuv420p 帧上"""
+        planes = yuv420_planes(frame)
+        for plane, region, premultiplied, inverse_alpha in self.tiles:
+            blend_tile(planes[plane][region], premultiplied, inverse_alpha)
+
+
+def merge_overlays(overlays: List[StaticOverlay]) -> StaticOverlay:
+    """把一组同时显示的图层按叠加顺序合并为一个合成器
+
+    合并结果的显示时间为各图层显示时间的交集。
+    """
+    if len(overlays) == 1:
+        return overlays[0]
+
+    tiles = [tile for overlay in overlays for tile in overlay.tiles]
+    boxes = _merge_boxes([(region[0].start, region[0].stop, region[1].start, region[1].stop)
+                          for region, _, _ in tiles])
+
+    ends = [overlay.end_time for overlay in overlays if overlay.end_time is not None]
+    merged = StaticOverlay.__new__(StaticOverlay)
+    merged.start_time = max(overlay.start_time for overlay in overlays)
+    merged.end_time = min(ends) if ends else None
+    merged.tiles = []
+    merged._yuv420 = None
+
+    for y0, y1, x0, x1 in boxes:
+        # 在包围盒内按叠加顺序合成：color 为预乘颜色（0-255），transmittance 为背景保留比例
+        color = np.zeros((y1 - y0, x1 - x0, 3))
+        transmittance = np.ones((y1 - y0, x1 - x0, 1))
+        for region, premultiplied, inverse_alpha in tiles:
+            ys, xs = region
+            if ys.start < y0 or ys.stop > y1 or xs.start < x0 or xs.stop > x1:
+                continue
+            sub = (slice(ys.start - y0, ys.stop - y0), slice(xs.start - x0, xs.stop - x0))
+            keep = inverse_alpha / 255.0
+            color[sub] = color[sub] * keep + (premultiplied - 128) / 255.0
+            transmittance[sub] *= keep
+
+        inverse_alpha = np.rint(transmittance * 255).astype(np.uint32)
+        # 限制预乘颜色不超过 255 × alpha，避免舍入后溢出 uint8
+        premultiplied = np.minimum(np.rint(color * 255).astype(np.uint32),
+                                   255 * (255 - inverse_alpha))
+        merged.tiles.append((
+            (slice(y0, y1), slice(x0, x1)),
+            premultiplied + 128,
+            inverse_alpha
+        ))
+
+    return merged
+
+
+def _merge_boxes(boxes: List[Tuple[int, int, int, int]]) -> List[Tuple[int, int, int, int]]:
+    """把相交或相邻的矩形 (y0, y1, x0, x1) 合并为包围盒，直到互不相交"""
+    boxes = list(boxes)
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(boxes)):
+            for j in range(i + 1, len(boxes)):
+                a, b = boxes[i], boxes[j]
+                if a[0] <= b[1] and b[0] <= a[1] and a[2] <= b[3] and b[2] <= a[3]:
+                    boxes[i] = (min(a[0], b[0]), max(a[1], b[1]),
+                                min(a[2], b[2]), max(a[3], b[3]))
+                    del boxes[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return boxes
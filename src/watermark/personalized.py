@@ -0,0 +1,185 @@
+"""个性化水印批量渲染：一次解码，为多个接收者分别合成并编码"""
+
+import os
+import queue
+import shutil
+import tempfile
+import threading
+from typing import Callable, List, Optional
+
+from moviepy import VideoFileClip
+from moviepy.video.io.ffmpeg_writer import FFMPEG_VideoWriter
+
+from ..media.pipeline import PIPELINE_QUEUE_SIZE, _END, _Cancelled, _get, _put
+from .image_watermark import build_image_overlay
+from .text_watermark_v2 import build_text_overlay
+from .timeline import plan_timeline
+
+# 每个接收者可单独设置的参数及默认值（与 add_text_watermark 一致，另加可选Logo）
+RECIPIENT_DEFAULTS = {
+    'text': None,
+    'position': ('right', 'bottom'),
+    'font_size': 24,
+    'color': 'white',
+    'font_path': None,
+    'opacity': 0.9,
+    'stroke_width': 0,
+    'stroke_color': 'black',
+    'start_time': None,
+    'end_time': None,
+    'margin': 15,
+    'watermark_path': None,
+    'logo_position': ('left', 'top'),
+    'logo_opacity': 0.8,
+    'logo_margin': 10,
+    'logo_width': None,
+    'logo_height': None,
+}
+
+
+def add_personalized_watermarks(
+    video_path: str,
+    recipients: List[dict],
+    max_encoders: Optional[int] = None,
+    threads: Optional[int] = None
+) -> List[str]:
+    """为每个接收者生成带个性化水印（姓名/ID、Logo）的视频，源视频每帧只解码一次
+
+    解码得到的每一帧分发给多个合成+编码线程，每个线程对应一个独立的 ffmpeg 编码进程，各编码并行运行；
+    音轨只编码一次，各输出直接复制。接收者数量超过 max_encoders 时分批处理，
+    每批解码一次。
+
+    Args:
+        video_path: 输入视频文件路径
+        recipients: 接收者参数列表，每项必须包含 'output_path'，
+                    其余键见 RECIPIENT_DEFAULTS（至少提供 'text' 或 'watermark_path'）
+        max_encoders: 同时运行的编码器数量，默认等于CPU核心数
+        threads: 每个编码器的线程数，默认按编码器数量平均分配CPU核心
+
+    Returns:
+        输出文件路径列表（与 recipients 顺序一致）
+    """
+    jobs = [_normalize_recipient(recipient) for recipient in recipients]
+    if not jobs:
+        return []
+
+    max_encoders = max(1, min(max_encoders or os.cpu_count() or 1, len(jobs)))
+    threads = threads or max(1, (os.cpu_count() or 1) // max_encoders)
+
+    video = VideoFileClip(video_path)
+    temp_dir = tempfile.mkdtemp(prefix='personalized_')
+    try:
+        # 音轨只编码一次，所有输出直接复制
+        audio_path = None
+        if video.audio is not None:
+            audio_path = os.path.join(temp_dir, 'audio.m4a')
+            video.audio.write_audiofile(audio_path, fps=44100, codec='aac', logger=None)
+
+        for index in range(0, len(jobs), max_encoders):
+            _render_batch(video, jobs[index:index + max_encoders], audio_path, threads)
+    finally:
+        video.close()
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    return [job['output_path'] for job in jobs]
+
+
+def _normalize_recipient(recipient: dict) -> dict:
+    """校验接收者参数并补齐默认值"""
+    unknown = set(recipient) - set(RECIPIENT_DEFAULTS) - {'output_path'}
+    if unknown:
+        raise ValueError(f"未知的接收者参数: {sorted(unknown)}")
+    if not recipient.get('output_path'):
+        raise ValueError("接收者参数缺少 'output_path'")
+    if not recipient.get('text') and not recipient.get('watermark_path'):
+        raise ValueError(f"接收者 {recipient['output_path']} 至少需要 'text' 或 'watermark_path'")
+
+    job = dict(RECIPIENT_DEFAULTS)
+    job.update(recipient)
+    return job
+
+
+def _build_recipient_plan(video: VideoFileClip, job: dict):
+    """生成单个接收者的时间轴合成计划（Logo 在下层，文字在上层）"""
+    overlays = []
+    if job['watermark_path']:
+        overlays.append(build_image_overlay(
+            video, job['watermark_path'], job['logo_position'], job['logo_opacity'],
+            job['logo_margin'], job['start_time'], job['end_time'],
+            job['logo_width'], job['logo_height']
+        ))
+    if job['text']:
+        overlays.append(build_text_overlay(
+            video, job['text'], job['position'], job['font_size'], job['color'],
+            job['font_path'], job['opacity'], job['stroke_width'], job['stroke_color'],
+            job['start_time'], job['end_time'], job['margin']
+        ))
+    return plan_timeline(overlays, video.duration)
+
+
+def _render_batch(
+    video: VideoFileClip,
+    jobs: List[dict],
+    audio_path: Optional[str],
+    threads: int
+) -> None:
+    """解码一遍源视频，把每帧分发给本批所有接收者的合成+编码线程
+
+    每个接收者一个线程和一个有界队列，合成与写入编码器管道都在该线程中进行，
+    各接收者的编码因此并行；任一线程失败时全部停止并抛出原异常。
+    """
+    plans = [_build_recipient_plan(video, job) for job in jobs]
+    stop = threading.Event()
+    errors: List[BaseException] = []
+    queues = [queue.Queue(maxsize=PIPELINE_QUEUE_SIZE) for _ in jobs]
+
+    def run(stage: Callable[[], None]) -> None:
+        try:
+            stage()
+        except _Cancelled:
+            pass
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+
+    def encode(job: dict, plan, frames: queue.Queue) -> Callable[[], None]:
+        def stage() -> None:
+            writer = FFMPEG_VideoWriter(
+                job['output_path'], video.size, video.fps,
+                codec='libx264', audiofile=audio_path, threads=threads
+            )
+            try:
+                while True:
+                    item, _ = _get(frames, stop)
+                    if item is _END:
+                        return
+                    t, frame = item
+                    overlay = plan.overlay_at(t)
+                    if overlay is not None:
+                        # 源帧由所有接收者共享，只能在副本上混合
+                        frame = frame.copy()
+                        overlay.blend(frame)
+                    writer.write_frame(frame)
+            finally:
+                writer.close()
+        return stage
+
+    workers = [
+        threading.Thread(target=run, args=(encode(job, plan, frames),), daemon=True)
+        for job, plan, frames in zip(jobs, plans, queues)
+    ]
+    for worker in workers:
+        worker.start()
+
+    def decode() -> None:
+        for t, frame in video.iter_frames(fps=video.fps, with_times=True, dtype='uint8'):
+            for frames in queues:
+                _put(frames, (t, frame), stop)
+        for frames in queues:
+            _put(frames, _END, stop)
+
+    run(decode)
+    for worker in workers:
+        worker.join()
+    if errors:
+        raise errors[0]
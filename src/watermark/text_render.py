@@ -0,0 +1,228 @@
+"""文字渲染模块：字体对象缓存与文字图片缓存（文字水印和组合水印共用）"""
+
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Optional, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from .asset_cache import file_digest, overlay_cache
+from .font_index import get_font_index
+
+# 文字图片缓存的容量上限（按 RGBA 像素字节数计算）
+TEXT_IMAGE_CACHE_BYTES = 64 * 1024 * 1024
+
+
+def resolve_font(font_path: Optional[str], text: str = '') -> Tuple[Optional[str], int]:
+    """确定实际使用的字体文件
+
+    Args:
+        font_path: 字体文件路径或字体族名（如 'Noto Sans CJK SC'），None 表示自动选择
+        text: 要渲染的文字，自动选择时优先能完整渲染它的字体（如 CJK 字幕）
+
+    Returns:
+        (字体文件路径, 字体集合内序号)；系统中没有可用字体时路径为 None
+    """
+    if font_path and os.path.exists(font_path):
+        return font_path, 0
+
+    index = get_font_index()
+    font = index.find(font_path) if font_path else None
+    if font is None:
+        font = index.default_font(text)
+    if font is None:
+        return None, 0
+    return font.path, font.index
+
+
+def load_font(font_path: Optional[str], font_size: int, text: str = '') -> ImageFont.ImageFont:
+    """加载字体对象（按 (文件, 字号) 缓存，同一进程内每种字体只加载一次）
+
+    Args:
+        font_path: 字体文件路径或字体族名，None 或找不到时从系统字体索引中自动选择
+        font_size: 字体大小
+        text: 要渲染的文字（用于自动选择能渲染它的字体）
+
+    Returns:
+        字体对象；系统中没有可用字体时返回 PIL 默认字体
+    """
+    path, face_index = resolve_font(font_path, text)
+    return _load_font_file(path, font_size, face_index)
+
+
+@lru_cache(maxsize=64)
+def _load_font_file(path: Optional[str], font_size: int, face_index: int) -> ImageFont.ImageFont:
+    """加载字体文件（带缓存）"""
+    if path is not None:
+        try:
+            return ImageFont.truetype(path, font_size, index=face_index)
+        except OSError:
+            pass
+
+    # 如果都找不到，使用默认字体（无法精确控制大小）
+    font = ImageFont.load_default()
+    if hasattr(font, 'size') and font.size != font_size:
+        print(f"警告：使用默认字体，无法精确控制字体大小为{font_size}")
+    return font
+
+
+def font_digest(font_path: Optional[str], font_size: int, text: str = '') -> Optional[str]:
+    """实际使用的字体文件的内容哈希（用作磁盘缓存键），默认位图字体返回 None"""
+    path = getattr(load_font(font_path, font_size, text), 'path', None)
+    if isinstance(path, str) and os.path.isfile(path):
+        return file_digest(path)
+    return None
+
+
+class TextImageCache:
+    """按样式参数缓存渲染好的文字图片（LRU，按像素字节数限制总容量）"""
+
+    def __init__(self, max_bytes: int = TEXT_IMAGE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: 'OrderedDict[tuple, Tuple[Image.Image, int]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple) -> Optional[Tuple[Image.Image, int]]:
+        """查找缓存，命中时移到最近使用的位置"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: tuple, entry: Tuple[Image.Image, int]) -> None:
+        """加入缓存，超出容量时淘汰最久未使用的图片（单张超过容量的图片不缓存）"""
+        size = _image_bytes(entry[0])
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.current_bytes -= _image_bytes(self._entries.pop(key)[0])
+            self._entries[key] = entry
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, (image, _) = self._entries.popitem(last=False)
+                self.current_bytes -= _image_bytes(image)
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+text_image_cache = TextImageCache()
+
+
+def render_text_image(
+    text: str,
+    font_path: Optional[str],
+    font_size: int,
+    color: str,
+    stroke_width: int = 0,
+    stroke_color: str = 'black',
+    bg_padding: int = 20
+) -> Tuple[Image.Image, int]:
+    """创建文本图片（使用PIL），相同样式参数的结果会被缓存
+
+    先查进程内缓存，再查磁盘素材缓存（键包含字体文件的内容哈希），都未命中时才绘制。
+
+    Args:
+        text: 文本内容
+        font_path: 字体文件路径
+        font_size: 字体大小
+        color: 文本颜色
+        stroke_width: 描边宽度
+        stroke_color: 描边颜色
+        bg_padding: 背景内边距
+
+    Returns:
+        Tuple[PIL Image 对象（带透明背景，调用方可自由修改的副本）, 图片高度]
+    """
+    key = (text, font_path, font_size, color, stroke_width, stroke_color, bg_padding)
+    entry = text_image_cache.get(key)
+    if entry is None:
+        disk_key = overlay_cache.make_key('text', key, font_digest(font_path, font_size, text))
+        rgba = overlay_cache.get_or_render(disk_key, lambda: np.asarray(_draw_text_image(*key)[0]))
+        image = Image.fromarray(rgba)
+        entry = (image, image.height)
+        text_image_cache.put(key, entry)
+    image, height = entry
+    return image.copy(), height
+
+
+def _draw_text_image(
+    text: str,
+    font_path: Optional[str],
+    font_size: int,
+    color: str,
+    stroke_width: int,
+    stroke_color: str,
+    bg_padding: int
+) -> Tuple[Image.Image, int]:
+    """实际绘制文本图片（不经过缓存）"""
+    font = load_font(font_path, font_size, text)
+
+    # 创建临时图像来测量文本尺寸
+    temp_img = Image.new('RGBA', (1, 1), (0, 0, 0, 0))
+    temp_draw = ImageDraw.Draw(temp_img)
+
+    # 获取文本边界框
+    bbox = temp_draw.textbbox((0, 0), text, font=font)
+    text_width = bbox[2] - bbox[0]
+    text_height = bbox[3] - bbox[1]
+
+    # 添加额外的垂直空间给字母上下延（g, j, p, q, y）
+    # 增加字体大小的 40% 作为额外空间
+    extra_vertical = int(font_size * 0.4)
+
+    # 计算最终图像尺寸（包含内边距和额外空间）
+    img_width = text_width + bg_padding * 2
+    img_height = text_height + bg_padding * 2 + extra_vertical
+
+    # 创建透明背景图像
+    image = Image.new('RGBA', (img_width, img_height), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(image)
+
+    # 计算文本位置（垂直居中，考虑额外空间）
+    x = bg_padding - bbox[0]
+    y = bg_padding - bbox[1] + extra_vertical // 2
+
+    # 绘制描边（如果需要）
+    if stroke_width > 0:
+        # PIL 的 textstroke 需要 Pillow 8.0+
+        try:
+            draw.text(
+                (x, y), text, font=font, fill=color,
+                stroke_width=stroke_width, stroke_fill=stroke_color
+            )
+        except TypeError:
+            # 如果不支持 stroke，使用简单描边
+            for dx in range(-stroke_width, stroke_width + 1):
+                for dy in range(-stroke_width, stroke_width + 1):
+                    if dx != 0 or dy != 0:
+                        draw.text((x + dx, y + dy), text, font=font, fill=stroke_color)
+            draw.text((x, y), text, font=font, fill=color)
+    else:
+        draw.text((x, y), text, font=font, fill=color)
+
+    return image, img_height
+
+
+def _image_bytes(image: Image.Image) -> int:
+    """图片占用的像素字节数"""
+    return image.width * image.height * len(image.getbands())
@@ -2,11 +2,16 @@
 
 import os
 import sys
-import tempfile
 from typing import Optional, Tuple
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image
 
-from moviepy import VideoFileClip, ImageClip, CompositeVideoClip
+from moviepy import VideoFileClip, ImageClip
+
+from ..media.pipeline import render_pipelined
+from ..media.segments import render_segments_parallel, render_window_only
+from .overlay import StaticOverlay, image_to_clip
+from .text_render import render_text_image
+from .timeline import static_overlay_processor
 
 
 def create_text_image(
@@ -18,7 +23,7 @@ def create_text_image(
     stroke_color: str = 'black',
     bg_padding: int = 20
 ) -> Image.Image:
-    """创建文本图片（使用PIL）
+    """创建文本图片（使用PIL，字体和渲染结果在进程内缓存）
 
     Args:
         text: 文本内容
@@ -32,100 +37,9 @@ def create_text_image(
     Returns:
         PIL Image 对象（带透明背景）
     """
-    # 创建字体对象
-    if font_path and os.path.exists(font_path):
-        font = ImageFont.truetype(font_path, font_size)
-    else:
-        # 使用系统默认字体（跨平台）
-        font = None
-        if os.name == 'nt':  # Windows
-            # 尝试多个常见的Windows字体
-            windows_fonts = [
-                "C:\\Windows\\Fonts\\arial.ttf",
-                "C:\\Windows\\Fonts\\segoeui.ttf",
-                "C:\\Windows\\Fonts\\calibri.ttf",
-                "C:\\Windows\\Fonts\\tahoma.ttf",
-                "C:\\Windows\\Fonts\\verdana.ttf"
-            ]
-            for win_font in windows_fonts:
-                try:
-                    font = ImageFont.truetype(win_font, font_size)
-                    break
-                except:
-                    continue
-        else:  # Linux/macOS
-            # 尝试多个常见的Linux字体
-            linux_fonts = [
-                "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
-                "/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf",
-                "/usr/share/fonts/truetype/ubuntu/Ubuntu-R.ttf",
-                "/System/Library/Fonts/Helvetica.ttc",  # macOS
-                "/System/Library/Fonts/Arial.ttf"  # macOS
-            ]
-            for linux_font in linux_fonts:
-                try:
-                    font = ImageFont.truetype(linux_font, font_size)
-                    break
-                except:
-                    continue
-
-        # 如果都找不到，使用默认字体
-        if font is None:
-            try:
-                # 尝试从系统加载默认字体
-                font = ImageFont.load_default()
-                # 对于默认字体，我们无法控制大小，需要调整图像缩放
-                # 所以最好创建一个默认大小的字体然后缩放
-                if hasattr(font, 'size') and font.size != font_size:
-                    # 记录警告
-                    print(f"警告：使用默认字体，无法精确控制字体大小为{font_size}")
-            except:
-                # 最后的手段：创建位图字体
-                font = ImageFont.load_default()
-
-    # 创建临时图像来测量文本尺寸
-    temp_img = Image.new('RGBA', (1, 1), (0, 0, 0, 0))
-    temp_draw = ImageDraw.Draw(temp_img)
-
-    # 获取文本边界框
-    bbox = temp_draw.textbbox((0, 0), text, font=font)
-    text_width = bbox[2] - bbox[0]
-    text_height = bbox[3] - bbox[1]
-
-    # 添加额外的垂直空间给字母上下延（g, j, p, q, y）
-    # 增加字体大小的 40% 作为额外空间
-    extra_vertical = int(font_size * 0.4)
-
-    # 计算最终图像尺寸（包含内边距和额外空间）
-    img_width = text_width + bg_padding * 2
-    img_height = text_height + bg_padding * 2 + extra_vertical
-
-    # 创建透明背景图像
-    image = Image.new('RGBA', (img_width, img_height), (0, 0, 0, 0))
-    draw = ImageDraw.Draw(image)
-
-    # 计算文本位置（垂直居中，考虑额外空间）
-    x = bg_padding - bbox[0]
-    y = bg_padding - bbox[1] + extra_vertical // 2
-
-    # 绘制描边（如果需要）
-    if stroke_width > 0:
-        # PIL 的 textstroke 需要 Pillow 8.0+
-        try:
-            draw.text(
-                (x, y), text, font=font, fill=color,
-                stroke_width=stroke_width, stroke_fill=stroke_color
-            )
-        except:
-            # 如果不支持 stroke，使用简单描边
-            for dx in range(-stroke_width, stroke_width + 1):
-                for dy in range(-stroke_width, stroke_width + 1):
-                    if dx != 0 or dy != 0:
-                        draw.text((x + dx, y + dy), text, font=font, fill=stroke_color)
-            draw.text((x, y), text, font=font, fill=color)
-    else:
-        draw.text((x, y), text, font=font, fill=color)
-
+    image, _ = render_text_image(
+        text, font_path, font_size, color, stroke_width, stroke_color, bg_padding
+    )
     return image
 
 
@@ -142,7 +56,10 @@ def add_text_watermark(
     stroke_color: str = 'black',
     start_time: Optional[float] = None,
     end_time: Optional[float] = None,
-    margin: int = 15
+    margin: int = 15,
+    smart_render: bool = False,
+    threads: Optional[int] = None,
+    segments: Optional[int] = None
 ) -> None:
     """向视频添加文字水印（使用PIL生成图片）
 
@@ -162,10 +79,67 @@ def add_text_watermark(
         start_time: 水印开始显示时间（秒），默认从视频开始
         end_time: 水印结束显示时间（秒），默认到视频结束
         margin: 边距（像素，默认：15）
+        smart_render: 仅重编码与水印时间范围重叠的GOP，其余部分流复制
+                      （源视频需为 h264/yuv420p，否则自动回退为完整渲染）
+        threads: 编码线程数，默认使用全部CPU核心（批量并行处理时由调度方分配；
+                 分段并行时为每段的线程数）
+        segments: 分段并行编码的段数：在关键帧处切分，由多个进程分别处理后无损拼接
+                  （适合长视频；不指定或为1时单进程处理）
     """
+    if segments and segments > 1:
+        render_kwargs = dict(
+            text=text, position=position, font_size=font_size, color=color,
+            font_path=font_path, opacity=opacity, stroke_width=stroke_width,
+            stroke_color=stroke_color, margin=margin
+        )
+        if render_segments_parallel(video_path, output_path, segments, add_text_watermark,
+                                    render_kwargs, start_time, end_time, threads):
+            return
+
+    if smart_render:
+        def render_segment(segment_path, segment_output, local_start, local_end):
+            add_text_watermark(
+                segment_path, text, segment_output, position, font_size, color,
+                font_path, opacity, stroke_width, stroke_color,
+                local_start, local_end, margin, threads=threads
+            )
+
+        if render_window_only(video_path, output_path, start_time, end_time, render_segment):
+            return
+
     # 加载视频
     video = VideoFileClip(video_path)
 
+    # 预先计算静态文字水印
+    overlay = build_text_overlay(
+        video, text, position, font_size, color, font_path, opacity,
+        stroke_width, stroke_color, start_time, end_time, margin
+    )
+
+    # 合成视频（逐帧只混合水印所在区域），解码、合成、编码流水线并行，帧零拷贝读入复用缓冲区
+    process = static_overlay_processor([overlay], video.duration)
+    render_pipelined(video, output_path, process, threads=threads or os.cpu_count(),
+                     source_path=video_path)
+
+    # 释放资源
+    video.close()
+
+
+def build_text_overlay(
+    video: VideoFileClip,
+    text: str,
+    position: Tuple[str, str] = ('right', 'bottom'),
+    font_size: int = 24,
+    color: str = 'white',
+    font_path: Optional[str] = None,
+    opacity: float = 0.9,
+    stroke_width: int = 0,
+    stroke_color: str = 'black',
+    start_time: Optional[float] = None,
+    end_time: Optional[float] = None,
+    margin: int = 15
+) -> StaticOverlay:
+    """生成文字水印的静态合成器（参数含义同 add_text_watermark）"""
     # 创建文本图片
     text_image = create_text_image(
         text=text,
@@ -177,14 +151,8 @@ def add_text_watermark(
         bg_padding=20
     )
 
-    # 保存临时图片（跨平台兼容）
-    temp_file = tempfile.NamedTemporaryFile(suffix='.png', delete=False)
-    temp_image_path = temp_file.name
-    temp_file.close()
-    text_image.save(temp_image_path, "PNG")
-
-    # 创建水印剪辑
-    watermark = ImageClip(temp_image_path)
+    # 创建水印剪辑（直接使用内存中的图像）
+    watermark = image_to_clip(text_image)
 
     # 设置持续时间
     if start_time is None:
@@ -192,43 +160,15 @@ def add_text_watermark(
     if end_time is None:
         end_time = video.duration
 
-    watermark = watermark.with_start(start_time)
-    watermark = watermark.with_end(end_time)
-    watermark = watermark.with_duration(end_time - start_time)
-
     # 验证位置参数
     _validate_position_tuple(position)
 
-    # 设置水印位置
+    # 计算水印位置，预先计算静态水印的混合数据（含透明度）
     position_func = _get_position_function(video, watermark, position, margin=margin)
-    watermark = watermark.with_position(position_func)
-
-    # 设置透明度
-    watermark = watermark.with_opacity(opacity)
-
-    # 合成视频
-    final_video = CompositeVideoClip([video, watermark], size=video.size)
-
-    # 写出视频
-    final_video.write_videofile(
-        output_path,
-        codec='libx264',
-        audio_codec='aac',
-        threads=os.cpu_count(),
-        logger=None
+    return StaticOverlay.from_clip(
+        watermark, position_func(start_time), video.size, opacity, start_time, end_time
     )
 
-    # 清理临时文件
-    try:
-        os.remove(temp_image_path)
-    except:
-        pass
-
-    # 释放资源
-    video.close()
-    watermark.close()
-    final_video.close()
-
 
 def _validate_position_tuple(position: Tuple[str, str]):
     """验证位置元组是否合法"""
@@ -0,0 +1,131 @@
+"""时间轴区间规划：把视频时间轴切分为活动图层集合不变的区间"""
+
+import bisect
+import logging
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from .overlay import StaticOverlay, merge_overlays
+
+logger = logging.getLogger('video_watermark')
+
+
+class TimelineInterval(NamedTuple):
+    """时间轴上的一个区间 [start, end)"""
+    start: float
+    end: Optional[float]              # None 表示到视频结尾
+    layers: Tuple[int, ...]           # 活动图层的序号（按叠加顺序）
+    overlay: Optional[StaticOverlay]  # 合并后的合成器，None 表示直通（不合成）
+
+
+class TimelinePlan:
+    """时间轴合成计划
+
+    每个区间内活动图层集合不变，预先合并为一个合成器；
+    没有活动图层的区间标记为直通，逐帧直接返回原帧。
+    """
+
+    def __init__(self, intervals: List[TimelineInterval]):
+        self.intervals = intervals
+        self._starts = [interval.start for interval in intervals]
+
+    def interval_at(self, t: float) -> Optional[TimelineInterval]:
+        """查找 t 时刻所在的区间"""
+        index = bisect.bisect_right(self._starts, t) - 1
+        if index < 0:
+            return None
+        interval = self.intervals[index]
+        if interval.end is not None and t >= interval.end:
+            return None
+        return interval
+
+    def overlay_at(self, t: float) -> Optional[StaticOverlay]:
+        """获取 t 时刻需要混合的合成器，None 表示直通"""
+        interval = self.interval_at(t)
+        return interval.overlay if interval else None
+
+    def describe(self) -> str:
+        """以文本形式输出计划（用于调试）"""
+        lines = []
+        for interval in self.intervals:
+            end = '结束' if interval.end is None else f'{interval.end:.3f}s'
+            if interval.overlay is None:
+                detail = '直通'
+            else:
+                layers = ', '.join(str(i) for i in interval.layers)
+                detail = f'图层 [{layers}]，{len(interval.overlay.tiles)} 个图块'
+            lines.append(f'[{interval.start:.3f}s, {end}) {detail}')
+        return '\n'.join(lines)
+
+
+def plan_timeline(overlays: List[StaticOverlay], duration: Optional[float] = None) -> TimelinePlan:
+    """根据各图层的显示时间把时间轴切分为区间，并预先合并每个区间的图层
+
+    Args:
+        overlays: 静态水印合成器列表，先添加的在下层
+        duration: 视频时长（秒），用于忽略视频结束之后的边界；最后一个区间总是延伸到结尾
+
+    Returns:
+        时间轴合成计划
+    """
+    boundaries = {0.0}
+    for overlay in overlays:
+        for t in (overlay.start_time, overlay.end_time):
+            if t is not None and t > 0 and (duration is None or t < duration):
+                boundaries.add(float(t))
+    boundaries = sorted(boundaries)
+    ends = boundaries[1:] + [None]
+
+    intervals = []
+    merged_cache: Dict[Tuple[int, ...], StaticOverlay] = {}
+    for start, end in zip(boundaries, ends):
+        layers = tuple(i for i, overlay in enumerate(overlays) if overlay.is_active(start))
+
+        # 与上一个区间的活动图层相同则直接延长
+        if intervals and intervals[-1].layers == layers:
+            intervals[-1] = intervals[-1]._replace(end=end)
+            continue
+
+        overlay = None
+        if layers:
+            if layers not in merged_cache:
+                merged_cache[layers] = merge_overlays([overlays[i] for i in layers])
+            overlay = merged_cache[layers]
+        intervals.append(TimelineInterval(start, end, layers, overlay))
+
+    return TimelinePlan(intervals)
+
+
+def static_overlay_processor(
+    overlays: List[StaticOverlay],
+    duration: Optional[float] = None
+) -> Callable[[np.ndarray, float], np.ndarray]:
+    """生成逐帧合成函数 (帧, 时间) -> 帧，把一组静态水印按顺序叠加到帧上
+
+    先按时间轴规划区间，每个区间的活动图层预先合并，直通区间直接返回原帧。
+    帧可以是 RGB (高, 宽, 3)，也可以是 yuv420p (高 × 3/2, 宽)。
+    计划可通过返回函数的 timeline_plan 属性查看。
+
+    Args:
+        overlays: 静态水印合成器列表，先添加的在下层
+        duration: 视频时长（秒）
+    """
+    plan = plan_timeline(overlays, duration)
+    logger.debug(f"水印时间轴计划:\n{plan.describe()}")
+
+    def process(frame, t):
+        overlay = plan.overlay_at(t)
+        if overlay is None:
+            return frame
+        # 解码器返回的帧是只读的且会被复用，需要先复制；流水线缓冲区中的帧可直接修改
+        if not frame.flags.writeable:
+            frame = frame.copy()
+        if frame.ndim == 2:
+            # yuv420p 帧：使用预先转换到 Y、U、V 平面的图块
+            overlay = overlay.yuv420()
+        overlay.blend(frame)
+        return frame
+
+    process.timeline_plan = plan
+    return process
@@ -0,0 +1,81 @@
+"""测试共用的 fixture"""
+
+import pytest
+import os
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+# 将项目根目录添加到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.insert import clip_cache
+from src.media import keyframes, probe
+from src.media.ffmpeg_tools import get_ffmpeg_binary, run_ffprobe
+from src.watermark import asset_cache, font_index
+
+
+@pytest.fixture(autouse=True)
+def isolated_probe_cache(tmp_path, monkeypatch):
+    """探测缓存写入每个测试自己的临时目录，不读取用户缓存中遗留的条目"""
+    db_path = str(tmp_path / "cache" / "probe.sqlite3")
+    # 环境变量供批量处理等子进程使用，当前进程的全局缓存直接改路径
+    monkeypatch.setenv(probe.PROBE_DB_ENV, db_path)
+    monkeypatch.setattr(probe.probe_cache, '_db_path', db_path)
+    monkeypatch.setattr(probe.probe_cache, '_initialized', False)
+
+
+@pytest.fixture(autouse=True)
+def isolated_overlay_cache(tmp_path, monkeypatch):
+    """水印素材缓存写入每个测试自己的临时目录，结果不依赖之前运行留下的 .npy 文件"""
+    cache_dir = str(tmp_path / "cache" / "overlays")
+    monkeypatch.setenv(asset_cache.CACHE_DIR_ENV, cache_dir)
+    monkeypatch.setattr(asset_cache.overlay_cache, 'cache_dir', cache_dir)
+
+
+@pytest.fixture
+def output_dir():
+    """创建输出目录"""
+    output_path = os.path.join(tempfile.gettempdir(), "test_output")
+    os.makedirs(output_path, exist_ok=True)
+    return output_path
+
+
+@pytest.fixture
+def decode_frames():
+    """返回解码函数：把视频的全部帧解码为 (帧数, 高, 宽, 3) 的 RGB 数组"""
+    def decode(path):
+        stream = run_ffprobe(['-select_streams', 'v:0', '-show_entries', 'stream=width,height',
+                              path])['streams'][0]
+        result = subprocess.run(
+            [get_ffmpeg_binary(), '-v', 'error', '-i', path,
+             '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-'],
+            capture_output=True, check=True
+        )
+        return np.frombuffer(result.stdout, np.uint8).reshape(
+            -1, stream['height'], stream['width'], 3)
+    return decode
+
+
+@pytest.fixture(autouse=True)
+def isolated_font_index(tmp_path, monkeypatch):
+    """字体索引缓存写入每个测试自己的临时目录，进程内的索引也重新构建"""
+    index_path = str(tmp_path / "cache" / "font_index.json")
+    monkeypatch.setattr(font_index, 'default_index_path', lambda: index_path)
+    monkeypatch.setattr(font_index, '_index', None)
+
+
+@pytest.fixture(autouse=True)
+def isolated_keyframe_index(tmp_path, monkeypatch):
+    """关键帧索引缓存写入每个测试自己的临时目录"""
+    monkeypatch.setenv(keyframes.KEYFRAME_DIR_ENV, str(tmp_path / "cache" / "keyframes"))
+
+
+@pytest.fixture(autouse=True)
+def isolated_insert_cache(tmp_path, monkeypatch):
+    """插入视频转码缓存写到每个测试的临时目录，不读写用户缓存目录"""
+    cache_dir = str(tmp_path / "cache" / "inserts")
+    monkeypatch.setenv(clip_cache.CLIP_CACHE_DIR_ENV, cache_dir)
+    monkeypatch.setattr(clip_cache.insert_clip_cache, '_cache_dir', cache_dir)
@@ -0,0 +1,128 @@
+"""水印素材磁盘缓存测试"""
+
+import pytest
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# 将项目根目录添加到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.watermark import asset_cache, text_render
+from src.watermark.asset_cache import OverlayAssetCache, file_digest
+
+
+def _write_entry(cache_dir, value):
+    """工作进程：向同一个键写入缓存"""
+    cache = OverlayAssetCache(cache_dir)
+    array = np.full((64, 64, 4), value, np.uint8)
+    return int(cache.put(cache.make_key('shared'), array)[0, 0, 0])
+
+
+def test_put_get_memory_mapped(tmp_path):
+    """测试写入后以只读内存映射读取"""
+    cache = OverlayAssetCache(str(tmp_path))
+    key = cache.make_key('logo', 'abc', (100, 50))
+    assert cache.get(key) is None
+
+    array = np.random.randint(0, 256, (20, 30, 4), dtype=np.uint8)
+    cache.put(key, array)
+
+    cached = cache.get(key)
+    assert isinstance(cached, np.memmap)
+    assert not cached.flags.writeable
+    assert np.array_equal(cached, array)
+
+    # 参数不同则键不同
+    assert cache.make_key('logo', 'abc', (100, 51)) != key
+
+
+def test_file_digest_tracks_content(tmp_path):
+    """测试素材内容变化时哈希随之变化"""
+    path = tmp_path / "logo.png"
+    path.write_bytes(b'first')
+    first = file_digest(str(path))
+    path.write_bytes(b'second!')
+    assert file_digest(str(path)) != first
+
+
+def test_eviction_least_recently_used(tmp_path):
+    """测试超出容量时淘汰最久未使用的条目"""
+    array = np.zeros((32, 32, 4), np.uint8)
+    entry_size = array.nbytes + 128  # .npy 文件头
+    cache = OverlayAssetCache(str(tmp_path), max_bytes=entry_size * 2 + 64)
+
+    keys = [cache.make_key(i) for i in range(3)]
+    cache.put(keys[0], array)
+    cache.put(keys[1], array)
+    # 第一个条目更早写入，但访问后成为最近使用的；再写入第三个时淘汰第二个
+    for index, key in enumerate(keys[:2]):
+        stamp = (index + 1) * 10 ** 9
+        os.utime(os.path.join(str(tmp_path), f'{key}.npy'), ns=(stamp, stamp))
+    cache.get(keys[0])
+    cache.put(keys[2], array)
+
+    assert cache.get(keys[0]) is not None
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[2]) is not None
+
+
+def test_concurrent_writers(tmp_path):
+    """测试多个进程同时写入同一个键时不会读到不完整的文件"""
+    with ProcessPoolExecutor(max_workers=4) as executor:
+        values = list(executor.map(_write_entry, [str(tmp_path)] * 8, range(8)))
+    assert all(0 <= value < 8 for value in values)
+
+    cache = OverlayAssetCache(str(tmp_path))
+    cached = cache.get(cache.make_key('shared'))
+    assert cached.shape == (64, 64, 4)
+    assert len(np.unique(cached)) == 1
+    assert not [name for name in os.listdir(str(tmp_path)) if name.endswith('.tmp')]
+
+
+def test_text_image_uses_disk_cache(tmp_path, monkeypatch):
+    """测试进程内缓存清空后（如新的命令行调用）文字图片从磁盘缓存读取"""
+    monkeypatch.setattr(asset_cache.overlay_cache, 'cache_dir', str(tmp_path))
+    text_render.text_image_cache.clear()
+    first, height = text_render.render_text_image("Disk cache", None, 40, 'white', 2, 'black')
+
+    text_render.text_image_cache.clear()
+
+    def fail(*args):
+        raise AssertionError("应命中磁盘缓存，不应重新绘制")
+
+    monkeypatch.setattr(text_render, '_draw_text_image', fail)
+    second, second_height = text_render.render_text_image("Disk cache", None, 40, 'white', 2, 'black')
+    assert second_height == height
+    assert second.tobytes() == first.tobytes()
+
+
+def test_logo_image_matches_moviepy_resize(tmp_path):
+    """测试分离模式缓存的Logo与 ImageClip(路径).resized(...) 的画面和遮罩逐像素一致"""
+    from PIL import Image
+    from moviepy import ImageClip
+    from src.watermark.combo_watermark import _render_logo_image
+    from src.watermark.overlay import image_to_clip
+
+    logo_path = str(tmp_path / "logo.png")
+    rng = np.random.default_rng(0)
+    Image.fromarray(rng.integers(0, 256, (50, 80, 4), dtype=np.uint8), 'RGBA').save(logo_path)
+
+    for width, height in ((None, 37), (60, None), (33, 21)):
+        expected = ImageClip(logo_path)
+        if width and height:
+            expected = expected.resized((width, height))
+        elif width:
+            expected = expected.resized(width=width)
+        else:
+            expected = expected.resized(height=height)
+
+        clip = image_to_clip(_render_logo_image(logo_path, width, height))
+        assert np.array_equal(clip.get_frame(0), expected.get_frame(0))
+        assert np.array_equal(clip.mask.get_frame(0), expected.mask.get_frame(0))
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
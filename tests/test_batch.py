@@ -0,0 +1,162 @@
+"""批量并行处理测试"""
+
+import pytest
+import os
+import shutil
+import sys
+import tempfile
+
+from click.testing import CliRunner
+
+# 将项目根目录添加到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.batch import (
+    build_output_path, collect_videos, preflight_batch, summarize_results, threads_per_job
+)
+
+
+@pytest.fixture
+def video_folder():
+    """创建包含两个测试视频和一个非视频文件的文件夹"""
+    folder = os.path.join(tempfile.gettempdir(), "test_batch_videos")
+    shutil.rmtree(folder, ignore_errors=True)
+    os.makedirs(folder)
+
+    null_output = "nul" if os.name == 'nt' else "/dev/null"
+    for name in ["a.mp4", "b.mov"]:
+        cmd = (f'ffmpeg -f lavfi -i testsrc=duration=1:size=320x240:rate=30 '
+               f'-pix_fmt yuv420p -y "{os.path.join(folder, name)}" 2>{null_output}')
+        os.system(cmd)
+    with open(os.path.join(folder, "notes.txt"), "w") as f:
+        f.write("not a video")
+    return folder
+
+
+@pytest.fixture
+def test_logo():
+    """创建测试Logo"""
+    from PIL import Image
+
+    logo_path = os.path.join(tempfile.gettempdir(), "test_logo_batch.png")
+    Image.new('RGBA', (60, 30), (255, 0, 0, 200)).save(logo_path)
+    return logo_path
+
+
+def test_collect_videos(video_folder):
+    """测试文件夹和通配符两种输入"""
+    videos = collect_videos(video_folder)
+    assert [os.path.basename(v) for v in videos] == ["a.mp4", "b.mov"]
+
+    videos = collect_videos(os.path.join(video_folder, "*.mp4"))
+    assert [os.path.basename(v) for v in videos] == ["a.mp4"]
+
+
+def test_threads_per_job():
+    """测试编码线程分配不超过CPU核心数"""
+    cpu_count = os.cpu_count() or 1
+    assert threads_per_job(1) == cpu_count
+    assert threads_per_job(cpu_count * 2) == 1
+    assert threads_per_job(2) * 2 <= max(cpu_count, 2)
+
+
+def test_build_output_path():
+    """测试输出文件命名与UI文件夹模式一致"""
+    assert build_output_path("/videos/clip.mov", "/out") == os.path.join("/out", "clip_wmarked.mp4")
+
+
+def test_summarize_results():
+    """测试吞吐量统计"""
+    results = [
+        {'success': True, 'duration': 30.0, 'size': 1024 * 1024},
+        {'success': True, 'duration': 30.0, 'size': 1024 * 1024},
+        {'success': False, 'duration': 0.0, 'size': 1024 * 1024},
+    ]
+    summary = summarize_results(results, 20.0)
+    assert summary['succeeded'] == 2
+    assert summary['failed'] == 1
+    assert summary['videos_per_minute'] == pytest.approx(6.0)
+    assert summary['realtime_factor'] == pytest.approx(3.0)
+    assert summary['megabytes_per_second'] == pytest.approx(0.1)
+
+
+def test_batch_command(video_folder, test_logo):
+    """测试批量命令并行处理整个文件夹"""
+    from src.cli import cli
+
+    output_dir = os.path.join(tempfile.gettempdir(), "test_batch_output")
+    shutil.rmtree(output_dir, ignore_errors=True)
+
+    runner = CliRunner()
+    result = runner.invoke(cli, [
+        'batch', '-i', video_folder, '-o', output_dir,
+        '--task', 'watermark', '-w', test_logo,
+        '--backend', 'ffmpeg', '--jobs', '2'
+    ])
+    assert result.exit_code == 0, result.output
+    assert '吞吐量' in result.output
+    assert sorted(os.listdir(output_dir)) == ["a_wmarked.mp4", "b_wmarked.mp4"]
+
+
+def test_preflight_batch(video_folder, test_logo):
+    """测试预检发现损坏文件、空文件和超出时长的参数"""
+    with open(os.path.join(video_folder, "broken.mp4"), "w") as f:
+        f.write("not a video")
+    open(os.path.join(video_folder, "empty.mkv"), "w").close()
+    videos = collect_videos(video_folder)
+    output_dir = os.path.join(tempfile.gettempdir(), "test_batch_preflight")
+
+    report = preflight_batch('watermark', videos, output_dir,
+                             {'watermark_path': test_logo, 'start_time': 0, 'end_time': 0.5})
+    assert [os.path.basename(v) for v in report['ready']] == ["a.mp4", "b.mov"]
+    errors = {os.path.basename(item['input']): item['error'] for item in report['rejected']}
+    assert errors['empty.mkv'] == '文件为空'
+    assert '无法读取' in errors['broken.mp4']
+    assert report['estimated_bytes'] == sum(os.path.getsize(v) for v in report['ready'])
+    assert report['enough_space']
+
+    # 结束时间超出视频时长
+    report = preflight_batch('watermark_text', report['ready'], output_dir,
+                             {'start_time': 0, 'end_time': 5})
+    assert report['ready'] == []
+    assert all('超出视频时长' in item['error'] for item in report['rejected'])
+
+    # 插入位置超出主视频时长
+    report = preflight_batch('insert', videos[:1], output_dir,
+                             {'insert_video_path': videos[1], 'insert_position': 3})
+    assert '插入位置' in report['rejected'][0]['error']
+
+    # 共用素材不可用时整批失败
+    with pytest.raises(ValueError):
+        preflight_batch('watermark', videos, output_dir, {'watermark_path': 'missing.png'})
+
+
+def test_batch_preflight_only(video_folder, test_logo):
+    """测试只做预检时不处理任何文件"""
+    from src.cli import cli
+
+    output_dir = os.path.join(tempfile.gettempdir(), "test_batch_preflight_only")
+    shutil.rmtree(output_dir, ignore_errors=True)
+
+    runner = CliRunner()
+    result = runner.invoke(cli, [
+        'batch', '-i', video_folder, '-o', output_dir, '--task', 'watermark',
+        '-w', test_logo, '--end-time', '5', '--preflight-only'
+    ])
+    assert result.exit_code == 1
+    assert '预检完成：0/2' in result.output
+    assert not os.path.exists(output_dir)
+
+
+def test_batch_missing_task_option(video_folder):
+    """测试缺少任务所需参数"""
+    from src.cli import cli
+
+    runner = CliRunner()
+    result = runner.invoke(cli, ['batch', '-i', video_folder, '--task', 'watermark-text'])
+    assert result.exit_code == 1
+    assert '--text' in result.output
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
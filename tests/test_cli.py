@@ -69,6 +69,24 @@ def test_positions():
     assert 'top-left' in result.output
 
 
+def test_fonts():
+    """测试字体列表命令"""
+    from src.cli import cli
+    runner = CliRunner()
+    result = runner.invoke(cli, ['fonts'])
+    assert result.exit_code == 0
+    assert '字体' in result.output
+
+
+def test_watermark_dynamic_help():
+    """测试动态文字水印命令帮助"""
+    from src.cli import cli
+    runner = CliRunner()
+    result = runner.invoke(cli, ['watermark-dynamic', '--help'])
+    assert result.exit_code == 0
+    assert '--clock-start' in result.output
+
+
 def test_watermark_help():
     """测试图片水印命令帮助"""
     from src.cli import cli
@@ -111,6 +129,42 @@ def test_watermark_combo_help():
     assert '--logo-scale-factor' in result.output
 
 
+def test_batch_help():
+    """测试批量处理命令帮助"""
+    from src.cli import cli
+    runner = CliRunner()
+    result = runner.invoke(cli, ['batch', '--help'])
+    assert result.exit_code == 0
+    assert '--task' in result.output
+    assert '--jobs' in result.output
+
+
+def test_max_memory_option(monkeypatch):
+    """测试全局渲染选项：写入环境变量供渲染进程读取，格式无效时报错"""
+    from src.cli import cli
+    from src.media.pipeline import (COMPOSE_PROCESSES_ENV, COMPOSITE_FORMAT_ENV, MAX_FRAMES_ENV,
+                                    MAX_MEMORY_ENV)
+    # 命令会直接写 os.environ：先 setenv 让 monkeypatch 记下原值，测试结束后恢复，
+    # 否则这些设置会泄漏到之后的渲染测试
+    for name in (MAX_MEMORY_ENV, MAX_FRAMES_ENV, COMPOSE_PROCESSES_ENV, COMPOSITE_FORMAT_ENV):
+        monkeypatch.setenv(name, '')
+        monkeypatch.delenv(name)
+    runner = CliRunner()
+
+    result = runner.invoke(cli, ['--max-memory', '512M', '--max-frames', '6',
+                                 '--compose-processes', '2', '--composite-format', 'yuv420p',
+                                 'positions'])
+    assert result.exit_code == 0
+    assert os.environ[MAX_MEMORY_ENV] == str(512 * 1024 ** 2)
+    assert os.environ[MAX_FRAMES_ENV] == '6'
+    assert os.environ[COMPOSE_PROCESSES_ENV] == '2'
+    assert os.environ[COMPOSITE_FORMAT_ENV] == 'yuv420p'
+
+    result = runner.invoke(cli, ['--max-memory', 'abc', 'positions'])
+    assert result.exit_code != 0
+    assert '--max-memory' in result.output
+
+
 # =======================================
 # 功能测试：实际视频处理（生成可查看的文件）
 # =======================================
@@ -6,10 +6,10 @@ import sys
 import tempfile
 from pathlib import Path
 
-# 添加src到路径
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+# 将项目根目录添加到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
-from watermark.combo_watermark import create_text_image, add_combo_watermark
+from src.watermark.combo_watermark import create_text_image, add_combo_watermark
 
 
 @pytest.fixture
@@ -29,14 +29,6 @@ def test_video():
     return video_path
 
 
-@pytest.fixture
-def output_dir():
-    """创建输出目录"""
-    output_path = os.path.join(tempfile.gettempdir(), "test_output")
-    os.makedirs(output_path, exist_ok=True)
-    return output_path
-
-
 @pytest.fixture
 def test_logo():
     """创建测试Logo"""
@@ -327,7 +319,7 @@ def test_combo_watermark_stroke_options(test_video, output_dir, test_logo):
 def test_combine_images_horizontal():
     """测试水平合并图片"""
     from PIL import Image
-    from watermark.combo_watermark import combine_images
+    from src.watermark.combo_watermark import combine_images
 
     # 创建测试图片
     logo = Image.new('RGBA', (50, 50), (255, 0, 0, 255))  # 红色方块
@@ -343,7 +335,7 @@ def test_combine_images_horizontal():
 def test_combine_images_vertical():
     """测试垂直合并图片"""
     from PIL import Image
-    from watermark.combo_watermark import combine_images
+    from src.watermark.combo_watermark import combine_images
 
     # 创建测试图片
     logo = Image.new('RGBA', (50, 50), (255, 0, 0, 255))  # 红色方块
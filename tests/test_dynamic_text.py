@@ -0,0 +1,111 @@
+"""动态文字水印（字形图集）测试"""
+
+import pytest
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+# 将项目根目录添加到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.media.ffmpeg_tools import get_ffmpeg_binary
+from src.watermark import add_dynamic_text_watermark
+from src.watermark.dynamic_text import DynamicTextLayer
+from src.watermark.text_render import load_font
+
+
+@pytest.fixture
+def test_video():
+    """创建测试视频"""
+    video_path = os.path.join(tempfile.gettempdir(), "test_video_dynamic.mp4")
+
+    if not os.path.exists(video_path):
+        null_output = "nul" if os.name == 'nt' else "/dev/null"
+        cmd = (f'ffmpeg -f lavfi -i color=c=gray:duration=1:size=320x240:rate=25 '
+               f'-pix_fmt yuv420p -y "{video_path}" 2>{null_output}')
+        os.system(cmd)
+    return video_path
+
+
+def _layer(template='{timecode}', **kwargs):
+    return DynamicTextLayer(template, (320, 240), 25, **kwargs)
+
+
+def test_template_fields():
+    """测试模板字段的格式化"""
+    layer = _layer('{timecode}|{frame}|{time}|{seconds:.2f}|{clock:%H:%M:%S}',
+                   clock_start=datetime(2024, 1, 2, 23, 59, 59))
+    assert layer.text_at(0) == '00:00:00:00|0|00:00:00.000|0.00|23:59:59'
+    assert layer.text_at(3725.48) == '01:02:05:12|93137|01:02:05.480|3725.48|01:02:04'
+
+
+def test_glyphs_rasterized_once():
+    """测试每个字符只栅格化一次，逐帧只拼接图集"""
+    layer = _layer(stroke_width=2)
+    frame = np.zeros((240, 320, 3), np.uint8)
+    for index in range(250):
+        layer.blend(frame, index / 25)
+    # 时间码只用到数字和冒号
+    assert len(layer.atlas) == 11
+
+
+def test_matches_pil_rendering():
+    """测试图集拼出的文字与 PIL 整串绘制基本一致"""
+    layer = _layer('0123:45', font_size=32, color='white', opacity=1.0, position=('left', 'top'),
+                   margin=0)
+    frame = np.zeros((240, 320, 3), np.uint8)
+    layer.blend(frame, 0)
+
+    font = load_font(None, 32, '0123:45')
+    expected = Image.new('L', (320, 240), 0)
+    ImageDraw.Draw(expected).text((0, font.getmetrics()[0]), '0123:45', font=font,
+                                  fill=255, anchor='ls')
+    difference = np.abs(frame[:, :, 0].astype(int) - np.asarray(expected).astype(int))
+    # 字形位置取整到像素，只允许边缘抗锯齿的少量差异
+    assert frame[:, :, 0].max() == 255
+    assert difference.mean() < 1.0
+
+
+def test_per_frame_blend_is_fast():
+    """测试逐帧更新文字无需重新绘制 PIL 图片"""
+    layer = _layer('{timecode} {frame}', font_size=36, stroke_width=2)
+    frame = np.zeros((240, 320, 3), np.uint8)
+    layer.blend(frame, 0)
+
+    start = time.perf_counter()
+    for index in range(1, 201):
+        layer.blend(frame, index / 25)
+    elapsed = (time.perf_counter() - start) / 200
+    assert elapsed < 0.005
+
+
+def test_dynamic_text_video(test_video):
+    """测试输出视频中每帧的文字随时间变化，且时间范围外不绘制"""
+    output = os.path.join(tempfile.gettempdir(), "test_output_dynamic.mp4")
+    add_dynamic_text_watermark(test_video, '{frame}', output, position=('left', 'top'),
+                               font_size=40, color='white', opacity=1.0, end_time=0.8)
+
+    result = subprocess.run(
+        [get_ffmpeg_binary(), '-v', 'error', '-i', output,
+         '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-'],
+        capture_output=True, check=True
+    )
+    frames = np.frombuffer(result.stdout, np.uint8).reshape(-1, 240, 320, 3)
+    assert len(frames) == 25
+
+    region = (slice(0, 70), slice(0, 100))
+    assert frames[1][region].max() > 200
+    # 第1帧和第2帧的帧号不同
+    assert np.abs(frames[1][region].astype(int) - frames[2][region].astype(int)).max() > 100
+    # end_time 之后不再绘制
+    assert frames[22][region].max() < 160
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,114 @@
+"""系统字体索引测试"""
+
+import pytest
+import json
+import os
+import struct
+import sys
+
+# 将项目根目录添加到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.watermark import font_index
+from src.watermark.font_index import build_font_index
+
+
+def _make_font(path, family, style, ranges):
+    """生成只包含 name 表和 cmap 表（format 12）的最小字体文件"""
+    records = b''
+    strings = b''
+    for name_id, value in ((1, family), (2, style)):
+        encoded = value.encode('utf-16-be')
+        records += struct.pack('>6H', 3, 1, 0x409, name_id, len(encoded), len(strings))
+        strings += encoded
+    name = struct.pack('>3H', 0, 2, 6 + len(records)) + records + strings
+
+    groups = b''.join(struct.pack('>3I', start, end, 1) for start, end in ranges)
+    subtable = struct.pack('>2H3I', 12, 0, 16 + len(groups), 0, len(ranges)) + groups
+    cmap = struct.pack('>2H', 0, 1) + struct.pack('>2HI', 3, 10, 12) + subtable
+
+    tables = [(b'cmap', cmap), (b'name', name)]
+    offset = 12 + 16 * len(tables)
+    directory = b''
+    body = b''
+    for tag, data in tables:
+        directory += struct.pack('>4s3I', tag, 0, offset + len(body), len(data))
+        body += data + b'\0' * (-len(data) % 4)
+
+    with open(path, 'wb') as f:
+        f.write(struct.pack('>I4H', 0x00010000, len(tables), 0, 0, 0) + directory + body)
+
+
+@pytest.fixture
+def font_dir(tmp_path):
+    """创建包含拉丁字体和 CJK 字体的字体目录"""
+    fonts = tmp_path / "fonts"
+    (fonts / "cjk").mkdir(parents=True)
+    _make_font(str(fonts / "latin.ttf"), "Test Sans", "Regular", [(0x20, 0x7E)])
+    _make_font(str(fonts / "latin-bold.ttf"), "Test Sans", "Bold", [(0x20, 0x7E)])
+    _make_font(str(fonts / "cjk" / "cjk.otf"), "Test CJK", "Regular",
+               [(0x20, 0x7E), (0x4E00, 0x9FFF)])
+    return str(fonts)
+
+
+def test_parse_and_lookup(font_dir, tmp_path):
+    """测试解析字体族、样式和按族名查找"""
+    index = build_font_index([font_dir], str(tmp_path / "index.json"))
+    assert index.families() == ['Test CJK', 'Test Sans']
+
+    regular = index.find('test sans')
+    assert regular.style == 'Regular'
+    assert regular.path.endswith('latin.ttf')
+    assert index.find('Test Sans', 'Bold').path.endswith('latin-bold.ttf')
+    assert index.find('Missing Family') is None
+
+
+def test_fonts_for_text(font_dir, tmp_path):
+    """测试筛选能渲染指定文字的字体"""
+    index = build_font_index([font_dir], str(tmp_path / "index.json"))
+
+    assert {font.family for font in index.fonts_for_text('Hello')} == {'Test Sans', 'Test CJK'}
+    cjk = index.fonts_for_text('版权所有 2025')
+    assert [font.family for font in cjk] == ['Test CJK']
+
+    # 默认字体族中没有能渲染 CJK 的字体时，自动选择能渲染的字体
+    assert index.default_font('版权所有').family == 'Test CJK'
+
+
+def test_cache_invalidation(font_dir, tmp_path, monkeypatch):
+    """测试目录未变化时直接使用缓存，新增字体后只解析新文件"""
+    cache_path = str(tmp_path / "index.json")
+    build_font_index([font_dir], cache_path)
+    with open(cache_path, encoding='utf-8') as f:
+        assert len(json.load(f)['files']) == 3
+
+    parsed = []
+    original = font_index._parse_font_file
+
+    def tracking_parse(path):
+        parsed.append(os.path.basename(path))
+        return original(path)
+
+    monkeypatch.setattr(font_index, '_parse_font_file', tracking_parse)
+
+    # 目录未变化：不解析任何文件
+    assert len(build_font_index([font_dir], cache_path).fonts) == 3
+    assert parsed == []
+
+    # 新增字体：只解析新文件
+    _make_font(os.path.join(font_dir, "extra.ttf"), "Extra", "Regular", [(0x20, 0x7E)])
+    index = build_font_index([font_dir], cache_path)
+    assert parsed == ['extra.ttf']
+    assert index.find('Extra') is not None
+
+
+def test_invalid_font_file_ignored(font_dir, tmp_path):
+    """测试无法解析的字体文件被忽略"""
+    with open(os.path.join(font_dir, "broken.ttf"), 'wb') as f:
+        f.write(b'not a font')
+    index = build_font_index([font_dir], str(tmp_path / "index.json"))
+    assert len(index.fonts) == 3
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
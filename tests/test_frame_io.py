@@ -0,0 +1,120 @@
+"""零拷贝帧传输测试"""
+
+import pytest
+import os
+import sys
+import tempfile
+
+import numpy as np
+from moviepy import VideoFileClip
+
+# 将项目根目录添加到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.media.frame_io import (FramePool, FrameWriter, RawFrameReader, RawFrameWriter,
+                                raw_frame_shape)
+
+
+@pytest.fixture
+def test_video():
+    """创建测试视频"""
+    video_path = os.path.join(tempfile.gettempdir(), "test_video_frame_io.mp4")
+
+    if not os.path.exists(video_path):
+        null_output = "nul" if os.name == 'nt' else "/dev/null"
+        cmd = (f'ffmpeg -f lavfi -i testsrc2=duration=1:size=160x120:rate=25 '
+               f'-pix_fmt yuv420p -y "{video_path}" 2>{null_output}')
+        os.system(cmd)
+    return video_path
+
+
+def test_frame_pool():
+    """测试缓冲区复用：池空时 acquire 超时，归还后可再次取出同一缓冲区"""
+    pool = FramePool((4, 6, 3), 2)
+    assert pool.nbytes == 2 * 4 * 6 * 3
+
+    first = pool.acquire()
+    second = pool.acquire()
+    assert first is not second
+    assert pool.acquire(timeout=0.01) is None
+
+    pool.release(first)
+    assert pool.acquire(timeout=0.01) is first
+
+    with pytest.raises(ValueError):
+        FramePool((4, 6, 3), 1)
+
+
+def test_raw_frame_reader_matches_moviepy(test_video):
+    """测试读入复用缓冲区的帧与 VideoFileClip 逐帧一致"""
+    video = VideoFileClip(test_video)
+    expected = list(video.iter_frames(fps=video.fps, dtype='uint8'))
+    size = video.size
+    video.close()
+
+    buffer = np.empty((size[1], size[0], 3), np.uint8)
+    address = buffer.ctypes.data
+    with RawFrameReader(test_video, size) as reader:
+        for frame in expected:
+            assert reader.read_into(buffer)
+            assert np.array_equal(buffer, frame)
+        assert not reader.read_into(buffer)
+    # 始终写入同一块内存
+    assert buffer.ctypes.data == address
+
+
+def test_frame_writer_roundtrip(test_video):
+    """测试零拷贝写入的帧可以正确编码"""
+    output_path = os.path.join(tempfile.gettempdir(), "test_frame_writer.mp4")
+    frame = np.zeros((120, 160, 3), np.uint8)
+    with FrameWriter(output_path, (160, 120), 25, codec='libx264') as writer:
+        for value in range(0, 250, 10):
+            frame[:] = value
+            writer.write_frame(frame)
+
+    video = VideoFileClip(output_path)
+    frames = list(video.iter_frames(fps=video.fps, dtype='uint8'))
+    video.close()
+    assert len(frames) == 25
+    assert abs(int(frames[10].mean()) - 100) <= 2
+
+
+def test_yuv420_frames_roundtrip(test_video):
+    """测试 yuv420p 原始帧：形状、读取与直接写入编码器"""
+    assert raw_frame_shape((160, 120), 'yuv420p') == (180, 160)
+    with pytest.raises(ValueError):
+        raw_frame_shape((161, 120), 'yuv420p')
+
+    output_path = os.path.join(tempfile.gettempdir(), "test_raw_frame_writer.mp4")
+    buffer = np.empty(raw_frame_shape((160, 120), 'yuv420p'), np.uint8)
+    count = 0
+    with RawFrameReader(test_video, (160, 120), 'yuv420p') as reader, \
+            RawFrameWriter(output_path, (160, 120), 25, 'yuv420p') as writer:
+        while reader.read_into(buffer):
+            writer.write_frame(buffer)
+            count += 1
+    assert count == 25
+
+    # 重新编码后与源视频的 RGB 帧基本一致
+    video = VideoFileClip(test_video)
+    expected = np.array(list(video.iter_frames(fps=video.fps, dtype='uint8')), float)
+    video.close()
+    video = VideoFileClip(output_path)
+    frames = np.array(list(video.iter_frames(fps=video.fps, dtype='uint8')), float)
+    video.close()
+    assert frames.shape == expected.shape
+    assert np.abs(frames - expected).mean() < 3
+
+
+
+def test_raw_frame_writer_reports_failure():
+    """测试编码器失败时 close 抛出带 ffmpeg 错误信息的异常"""
+    output_path = os.path.join(tempfile.gettempdir(), "test_raw_frame_writer_fail.mp4")
+    writer = RawFrameWriter(output_path, (160, 120), 25, 'yuv420p', codec='no_such_codec')
+    with pytest.raises(RuntimeError, match='返回码'):
+        writer.close()
+    # 进程已回收，重复关闭不再报错
+    writer.close()
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
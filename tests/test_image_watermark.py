@@ -0,0 +1,116 @@
+"""图片水印功能测试"""
+
+import pytest
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+# 将项目根目录添加到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.watermark.image_watermark import (
+    add_image_watermark, _compute_position, _compute_watermark_size
+)
+
+
+@pytest.fixture
+def test_video():
+    """创建测试视频"""
+    temp_dir = tempfile.gettempdir()
+    video_path = os.path.join(temp_dir, "test_video_image_wm.mp4")
+
+    if not os.path.exists(video_path):
+        null_output = "nul" if os.name == 'nt' else "/dev/null"
+        cmd = (f'ffmpeg -f lavfi -i testsrc=duration=3:size=1280x720:rate=30 '
+               f'-pix_fmt yuv420p -y "{video_path}" 2>{null_output}')
+        os.system(cmd)
+    return video_path
+
+
+@pytest.fixture
+def test_logo():
+    """创建测试Logo（纯色不透明方块，便于比较像素）"""
+    from PIL import Image
+
+    logo_path = os.path.join(tempfile.gettempdir(), "test_logo_image_wm.png")
+    Image.new('RGBA', (120, 60), (255, 0, 0, 255)).save(logo_path)
+    return logo_path
+
+
+def _read_frame(path, t):
+    """读取指定时间的视频帧"""
+    from moviepy import VideoFileClip
+
+    clip = VideoFileClip(path, audio=False)
+    try:
+        return clip.get_frame(t).astype(np.int16)
+    finally:
+        clip.close()
+
+
+def test_compute_watermark_size():
+    """测试水印尺寸计算（与 moviepy resized 取整一致）"""
+    assert _compute_watermark_size((120, 60), 1280, None, None) == (213, 106)
+    assert _compute_watermark_size((120, 60), 1280, 300, None) == (300, 150)
+    assert _compute_watermark_size((120, 60), 1280, None, 30) == (60, 30)
+    assert _compute_watermark_size((120, 60), 1280, 50, 40) == (50, 40)
+
+
+def test_compute_position():
+    """测试水印位置计算"""
+    assert _compute_position((1280, 720), (200, 100), ('left', 'top'), 10) == (10, 10)
+    assert _compute_position((1280, 720), (200, 100), ('right', 'bottom'), 10) == (1070, 610)
+    assert _compute_position((1280, 720), (201, 101), ('center', 'center'), 10) == (539, 309)
+
+
+def test_invalid_backend(test_video, test_logo, output_dir):
+    """测试无效的处理后端"""
+    with pytest.raises(ValueError):
+        add_image_watermark(
+            video_path=test_video,
+            watermark_path=test_logo,
+            output_path=os.path.join(output_dir, "invalid_backend.mp4"),
+            backend='gstreamer'
+        )
+
+
+def test_ffmpeg_backend_matches_moviepy(test_video, test_logo, output_dir):
+    """测试 ffmpeg 后端与 moviepy 后端的位置、透明度和时间范围一致"""
+    outputs = {}
+    for backend in ['moviepy', 'ffmpeg']:
+        output_path = os.path.join(output_dir, f"image_wm_{backend}.mp4")
+        add_image_watermark(
+            video_path=test_video,
+            watermark_path=test_logo,
+            output_path=output_path,
+            position=('right', 'bottom'),
+            opacity=0.5,
+            margin=20,
+            start_time=1.0,
+            end_time=2.0,
+            width=120,
+            backend=backend
+        )
+        assert os.path.exists(output_path)
+        outputs[backend] = output_path
+
+    # 水印区域：x 1140-1260, y 640-700
+    for t in [0.5, 1.5, 2.5]:
+        frame_moviepy = _read_frame(outputs['moviepy'], t)
+        frame_ffmpeg = _read_frame(outputs['ffmpeg'], t)
+        roi_moviepy = frame_moviepy[645:695, 1145:1255]
+        roi_ffmpeg = frame_ffmpeg[645:695, 1145:1255]
+        assert np.abs(roi_moviepy - roi_ffmpeg).mean() < 8
+
+    # 时间范围内水印可见，范围外与原视频一致
+    for t, visible in [(0.5, False), (1.5, True), (2.5, False)]:
+        original = _read_frame(test_video, t)[645:695, 1145:1255]
+        watermarked = _read_frame(outputs['ffmpeg'], t)[645:695, 1145:1255]
+        diff = np.abs(watermarked - original).mean()
+        assert (diff > 20) if visible else (diff < 8)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,135 @@
+"""关键帧索引测试"""
+
+import pytest
+import os
+import shutil
+import sys
+import tempfile
+
+# 将项目根目录添加到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.media import keyframes
+from src.media.keyframes import KeyframeIndex, load_keyframe_index
+
+
+@pytest.fixture
+def test_video():
+    """创建测试视频（关键帧间隔1秒）"""
+    video_path = os.path.join(tempfile.gettempdir(), "test_video_keyframes.mp4")
+
+    if not os.path.exists(video_path):
+        null_output = "nul" if os.name == 'nt' else "/dev/null"
+        cmd = (f'ffmpeg -f lavfi -i testsrc=duration=4:size=160x120:rate=25 '
+               f'-g 25 -keyint_min 25 -sc_threshold 0 -pix_fmt yuv420p '
+               f'-y "{video_path}" 2>{null_output}')
+        os.system(cmd)
+    return video_path
+
+
+@pytest.fixture
+def cache_dir(monkeypatch):
+    """使用临时索引目录，清空进程内缓存，并统计扫描次数"""
+    directory = tempfile.mkdtemp(prefix='keyframe_cache_')
+    monkeypatch.setenv(keyframes.KEYFRAME_DIR_ENV, directory)
+    monkeypatch.setattr(keyframes, '_memory_cache', {})
+
+    scans = []
+    scan_keyframes = keyframes.scan_keyframes
+
+    def counting_scan(video_path):
+        scans.append(video_path)
+        return scan_keyframes(video_path)
+
+    monkeypatch.setattr(keyframes, 'scan_keyframes', counting_scan)
+    yield directory, scans
+    shutil.rmtree(directory, ignore_errors=True)
+
+
+def test_keyframe_queries():
+    """测试最近关键帧查询"""
+    index = KeyframeIndex([4.0, 0.0, 2.0])
+    assert index.times == [0.0, 2.0, 4.0]
+    assert index.before(3.0) == 2.0
+    assert index.before(2.0) == 2.0
+    assert index.after(2.0) == 4.0
+    assert index.after(4.5) is None
+    assert index.nearest(2.9) == 2.0
+    assert index.nearest(3.1) == 4.0
+    assert index.is_keyframe(2.0004)
+    assert not index.is_keyframe(2.5)
+    assert KeyframeIndex([]).nearest(1.0) is None
+
+
+def test_binary_roundtrip():
+    """测试二进制格式往返一致，损坏的数据被拒绝"""
+    index = KeyframeIndex([0.0, 1.001, 2.002], frame_count=75)
+    data = index.to_bytes()
+    assert len(data) == 14 + 3 * 8
+
+    restored = KeyframeIndex.from_bytes(data)
+    assert restored.times == index.times
+    assert restored.frame_count == 75
+
+    with pytest.raises(ValueError):
+        KeyframeIndex.from_bytes(data[:-1])
+    with pytest.raises(ValueError):
+        KeyframeIndex.from_bytes(b'XXXX' + data[4:])
+
+
+def test_load_keyframe_index_cached(test_video, cache_dir):
+    """测试索引只扫描一次：进程内缓存和磁盘缓存都能命中"""
+    directory, scans = cache_dir
+
+    index = load_keyframe_index(test_video)
+    assert index.times == pytest.approx([0.0, 1.0, 2.0, 3.0])
+    assert index.frame_count == 100
+    assert len(scans) == 1
+    assert len([name for name in os.listdir(directory) if name.endswith('.kfi')]) == 1
+
+    assert load_keyframe_index(test_video) is index
+    assert len(scans) == 1
+
+    # 新进程（清空进程内缓存）从磁盘读取
+    keyframes._memory_cache.clear()
+    assert load_keyframe_index(test_video).times == index.times
+    assert len(scans) == 1
+
+
+def test_load_keyframe_index_invalidated(test_video, cache_dir):
+    """测试文件变化后重新扫描，损坏的索引文件被替换"""
+    directory, scans = cache_dir
+    video_copy = os.path.join(tempfile.gettempdir(), "test_video_keyframes_copy.mp4")
+    shutil.copy(test_video, video_copy)
+
+    load_keyframe_index(video_copy)
+    for name in os.listdir(directory):
+        with open(os.path.join(directory, name), 'wb') as f:
+            f.write(b'broken')
+    keyframes._memory_cache.clear()
+    assert len(load_keyframe_index(video_copy)) == 4
+    assert len(scans) == 2
+
+    # 修改文件后缓存失效
+    os.utime(video_copy, ns=(0, 0))
+    load_keyframe_index(video_copy)
+    assert len(scans) == 3
+
+    os.remove(video_copy)
+
+
+def test_evict_keyframe_cache(tmp_path):
+    """测试索引缓存超过上限时淘汰最久未使用的文件"""
+    data = KeyframeIndex([0.0, 1.0, 2.0], frame_count=90).to_bytes()
+    for number in range(4):
+        path = tmp_path / f"{number}.kfi"
+        path.write_bytes(data)
+        os.utime(path, ns=(number * 10 ** 9, number * 10 ** 9))
+    (tmp_path / "other.tmp").write_bytes(data)
+
+    keyframes.evict_keyframe_cache(str(tmp_path), max_bytes=2 * len(data))
+    assert sorted(os.listdir(tmp_path)) == ["2.kfi", "3.kfi", "other.tmp"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
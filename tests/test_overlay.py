@@ -0,0 +1,159 @@
+"""水印叠加层工具测试"""
+
+import pytest
+import os
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+from PIL import Image
+
+# 将项目根目录添加到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.media.ffmpeg_tools import get_ffmpeg_binary
+from src.watermark.overlay import (BLEND_STRIP_ROWS, StaticOverlay, blend_tile, image_to_clip,
+                                   yuv420_planes)
+from src.watermark.timeline import static_overlay_processor
+
+
+def test_image_to_clip_matches_png_roundtrip():
+    """测试内存构建的剪辑与读取PNG文件构建的剪辑完全一致"""
+    from moviepy import ImageClip
+
+    rng = np.random.default_rng(0)
+    image = Image.fromarray(rng.integers(0, 256, (40, 60, 4), dtype=np.uint8))
+    png_path = os.path.join(tempfile.gettempdir(), "test_overlay_roundtrip.png")
+    image.save(png_path, "PNG")
+
+    from_file = ImageClip(png_path)
+    from_memory = image_to_clip(image)
+
+    assert from_memory.size == from_file.size
+    assert np.array_equal(from_memory.get_frame(0), from_file.get_frame(0))
+    assert np.array_equal(from_memory.mask.get_frame(0), from_file.mask.get_frame(0))
+
+
+def test_image_to_clip_rgb_image():
+    """测试不带alpha的图像得到全不透明遮罩"""
+    image = Image.new('RGB', (10, 8), (10, 20, 30))
+    clip = image_to_clip(image)
+    assert clip.size == (10, 8)
+    assert np.all(clip.mask.get_frame(0) == 1.0)
+
+
+@pytest.mark.parametrize("position", [(5, 7), (-10, -5), (55, 40), (200, 200)])
+def test_static_overlay_matches_pil(position):
+    """测试区域混合与 PIL alpha_composite 逐像素一致（含超出画面的情况）"""
+    rng = np.random.default_rng(1)
+    background = rng.integers(0, 256, (50, 70, 3), dtype=np.uint8)
+    rgb = rng.integers(0, 256, (20, 30, 3), dtype=np.uint8)
+    alpha = rng.integers(0, 256, (20, 30), dtype=np.uint8)
+
+    frame = background.copy()
+    overlay = StaticOverlay(rgb, alpha, position, (70, 50))
+    overlay.blend(frame)
+
+    canvas = Image.new('RGBA', (70, 50), (0, 0, 0, 0))
+    canvas.paste(Image.fromarray(np.dstack([rgb, alpha])), position)
+    expected = Image.alpha_composite(Image.fromarray(background).convert('RGBA'), canvas)
+    assert np.array_equal(frame, np.array(expected)[:, :, :3])
+
+
+def test_blend_tile_strips():
+    """测试分条带混合与整块一次计算的结果一致（高度跨多个条带、宽度变化时缓冲区重新分配）"""
+    rng = np.random.default_rng(2)
+    for height, width in [(BLEND_STRIP_ROWS * 2 + 5, 40), (BLEND_STRIP_ROWS + 1, 90), (3, 20)]:
+        roi = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+        rgb = rng.integers(0, 256, (height, width, 3)).astype(np.uint32)
+        alpha = rng.integers(0, 256, (height, width, 1)).astype(np.uint32)
+        premultiplied = rgb * alpha + 128
+        inverse_alpha = 255 - alpha
+
+        value = (roi * inverse_alpha + premultiplied) << 7
+        expected = (((value >> 8) + value) >> 15).astype(np.uint8)
+        blend_tile(roi, premultiplied, inverse_alpha)
+        assert np.array_equal(roi, expected)
+
+
+def test_blend_tile_division_matches_pil_precision():
+    """测试 ((x >> 8) + x) >> 8 与 PIL 的 7 位精度写法在全部背景值、alpha 和预乘颜色上逐值相同"""
+    background = np.repeat(np.arange(256, dtype=np.uint8)[:, None], 256, axis=1)
+    alpha = np.arange(256, dtype=np.uint32)[None, :].repeat(256, axis=0)
+    inverse_alpha = 255 - alpha
+    for color in (0, 1, 127, 128, 254, 255):
+        roi = background.copy()
+        premultiplied = color * alpha + 128
+        value = (roi * inverse_alpha + premultiplied) << 7
+        expected = (((value >> 8) + value) >> 15).astype(np.uint8)
+        blend_tile(roi, premultiplied, inverse_alpha)
+        assert np.array_equal(roi, expected)
+
+
+def _rgb_to_yuv420(frame):
+    """用 ffmpeg（与编码器相同的转换）把 RGB 帧转换为 yuv420p 帧"""
+    height, width = frame.shape[:2]
+    result = subprocess.run(
+        [get_ffmpeg_binary(), '-v', 'error', '-f', 'rawvideo', '-pix_fmt', 'rgb24',
+         '-s', f'{width}x{height}', '-i', '-', '-f', 'rawvideo', '-pix_fmt', 'yuv420p', '-'],
+        input=frame.tobytes(), capture_output=True, check=True
+    )
+    return np.frombuffer(result.stdout, np.uint8).reshape(height * 3 // 2, width).copy()
+
+
+@pytest.mark.parametrize("position", [(12, 9), (13, 10), (-7, -3)])
+def test_yuv420_overlay_matches_rgb(position):
+    """测试 YUV420 平面混合与先在 RGB 中混合再转换的结果在容差内一致（含奇数坐标、超出画面）"""
+    width, height = 96, 64
+    # 平滑渐变背景 + 圆形半透明水印（边缘抗锯齿）
+    ys, xs = np.mgrid[0:height, 0:width]
+    background = np.dstack([xs * 2, ys * 3, 255 - xs * 2]).astype(np.uint8)
+    wy, wx = np.mgrid[0:30, 0:40]
+    distance = np.hypot(wx - 19.5, wy - 14.5)
+    alpha = (np.clip(14 - distance, 0, 1) * 200).astype(np.uint8)
+    rgb = np.zeros((30, 40, 3), np.uint8)
+    rgb[:] = (240, 30, 60)
+    rgb[10:20, 10:30] = 255
+
+    overlay = StaticOverlay(rgb, alpha, position, (width, height))
+    blended = background.copy()
+    overlay.blend(blended)
+    expected = _rgb_to_yuv420(blended)
+    base = _rgb_to_yuv420(background)
+
+    frame = base.copy()
+    overlay.yuv420().blend(frame)
+
+    # 比较混合引起的变化量：亮度逐像素相差不超过 2，色度（半分辨率）不超过 6，平均差异很小
+    for actual, reference, original, limit in zip(
+            yuv420_planes(frame), yuv420_planes(expected), yuv420_planes(base), [2, 6, 6]):
+        difference = np.abs((actual.astype(int) - original) - (reference.astype(int) - original))
+        assert difference.max() <= limit
+        assert difference.mean() < 0.3
+
+
+def test_static_overlay_processor_matches_moviepy():
+    """测试静态水印逐帧合成与 CompositeVideoClip 的结果和时间范围一致"""
+    from moviepy import CompositeVideoClip, ImageClip
+
+    rng = np.random.default_rng(2)
+    video = ImageClip(rng.integers(0, 256, (90, 160, 3), dtype=np.uint8), duration=3)
+    video.fps = 10
+    logo = Image.fromarray(rng.integers(0, 256, (25, 40, 4), dtype=np.uint8))
+
+    watermark = image_to_clip(logo).with_start(1).with_end(2).with_duration(1)
+    overlay = StaticOverlay.from_clip(watermark, (110.5, 60.7), video.size, 0.7, 1, 2)
+    process = static_overlay_processor([overlay], video.duration)
+
+    reference = CompositeVideoClip(
+        [video, watermark.with_position((110.5, 60.7)).with_opacity(0.7)],
+        size=video.size
+    )
+    for t in [0.5, 1.0, 1.5, 2.0, 2.5]:
+        assert np.array_equal(process(video.get_frame(t).copy(), t),
+                              reference.get_frame(t)[:, :, :3])
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
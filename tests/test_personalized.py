@@ -0,0 +1,103 @@
+"""个性化水印批量渲染测试"""
+
+import pytest
+import json
+import os
+import sys
+import tempfile
+
+import numpy as np
+from click.testing import CliRunner
+
+# 将项目根目录添加到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.media.segments import probe_streams
+from src.watermark import add_personalized_watermarks, add_text_watermark
+
+
+@pytest.fixture
+def test_video():
+    """创建测试视频（带音频）"""
+    video_path = os.path.join(tempfile.gettempdir(), "test_video_personalized.mp4")
+
+    if not os.path.exists(video_path):
+        null_output = "nul" if os.name == 'nt' else "/dev/null"
+        cmd = (f'ffmpeg -f lavfi -i testsrc=duration=2:size=320x240:rate=30 '
+               f'-f lavfi -i sine=duration=2 -pix_fmt yuv420p -c:a aac -shortest '
+               f'-y "{video_path}" 2>{null_output}')
+        os.system(cmd)
+    return video_path
+
+
+def test_personalized_matches_single_render(test_video, output_dir, decode_frames):
+    """测试一次解码多路输出的结果与逐个调用 add_text_watermark 一致"""
+    names = ["Alice 0001", "Bob 0002", "Carol 0003"]
+    recipients = [
+        {'output_path': os.path.join(output_dir, f"recipient_{i}.mp4"), 'text': name,
+         'font_size': 32, 'start_time': 0.5}
+        for i, name in enumerate(names)
+    ]
+    # 3 个接收者、2 个编码器：分两批处理
+    outputs = add_personalized_watermarks(test_video, recipients, max_encoders=2, threads=1)
+    assert outputs == [r['output_path'] for r in recipients]
+
+    reference_path = os.path.join(output_dir, "reference.mp4")
+    add_text_watermark(test_video, names[1], reference_path, font_size=32,
+                       start_time=0.5, threads=1)
+
+    reference = decode_frames(reference_path)
+    result = decode_frames(outputs[1])
+    assert len(result) == len(reference)
+    assert np.abs(result.astype(int) - reference).mean() < 1
+
+    # 不同接收者的水印不同
+    first = decode_frames(outputs[0])
+    assert np.abs(first[45].astype(int) - result[45]).mean() > 0.1
+
+    for path in outputs:
+        _, audio_stream, _ = probe_streams(path)
+        assert audio_stream is not None
+
+
+def test_personalized_invalid_recipient(test_video, output_dir):
+    """测试接收者参数校验"""
+    with pytest.raises(ValueError):
+        add_personalized_watermarks(test_video, [{'output_path': 'x.mp4', 'txt': 'typo'}])
+    with pytest.raises(ValueError):
+        add_personalized_watermarks(test_video, [{'text': 'no output'}])
+
+
+def test_personalized_encoder_failure(test_video, output_dir):
+    """测试某个接收者的编码器失败时整批停止并抛出异常，不会卡住"""
+    recipients = [
+        {'output_path': os.path.join(output_dir, "recipient_ok.mp4"), 'text': "Alice"},
+        {'output_path': os.path.join(output_dir, "missing_dir", "recipient.mp4"), 'text': "Bob"},
+    ]
+    with pytest.raises(IOError):
+        add_personalized_watermarks(test_video, recipients, max_encoders=2, threads=1)
+
+
+def test_personalize_command(test_video, output_dir):
+    """测试个性化水印命令"""
+    from src.cli import cli
+
+    recipients_path = os.path.join(output_dir, "recipients.json")
+    with open(recipients_path, 'w', encoding='utf-8') as f:
+        json.dump([
+            {'output_path': 'cli_a.mp4', 'text': 'User A', 'position': 'top-left'},
+            {'output_path': 'cli_b.mp4', 'text': 'User B'},
+        ], f)
+
+    runner = CliRunner()
+    result = runner.invoke(cli, [
+        'personalize', '-i', test_video, '-r', recipients_path,
+        '-o', output_dir, '--max-encoders', '2'
+    ])
+    assert result.exit_code == 0, result.output
+    assert os.path.exists(os.path.join(output_dir, 'cli_a.mp4'))
+    assert os.path.exists(os.path.join(output_dir, 'cli_b.mp4'))
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
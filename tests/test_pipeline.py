@@ -0,0 +1,232 @@
+"""流水线渲染测试"""
+
+import pytest
+import os
+import sys
+import tempfile
+
+import numpy as np
+from moviepy import VideoFileClip
+
+# 将项目根目录添加到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.media.pipeline import (MAX_MEMORY_ENV, parse_memory_size, plan_frame_pool,
+                                process_compositing_available, render_pipelined)
+from src.media.segments import probe_streams
+
+
+@pytest.fixture
+def test_video():
+    """创建测试视频（带音频）"""
+    video_path = os.path.join(tempfile.gettempdir(), "test_video_pipeline.mp4")
+
+    if not os.path.exists(video_path):
+        null_output = "nul" if os.name == 'nt' else "/dev/null"
+        cmd = (f'ffmpeg -f lavfi -i testsrc=duration=2:size=160x120:rate=25 '
+               f'-f lavfi -i sine=duration=2 -pix_fmt yuv420p -c:a aac -shortest '
+               f'-y "{video_path}" 2>{null_output}')
+        os.system(cmd)
+    return video_path
+
+
+def _invert_left_half(frame, t):
+    frame = frame.copy()
+    frame[:, :80] = 255 - frame[:, :80]
+    return frame
+
+
+def test_render_pipelined_matches_write_videofile(test_video, output_dir, decode_frames):
+    """测试流水线渲染与 write_videofile 的输出逐帧一致"""
+    pipelined_path = os.path.join(output_dir, "pipeline_output.mp4")
+    reference_path = os.path.join(output_dir, "pipeline_reference.mp4")
+
+    video = VideoFileClip(test_video)
+    stats = render_pipelined(video, pipelined_path, _invert_left_half, threads=1)
+    video.close()
+
+    video = VideoFileClip(test_video)
+    reference = video.transform(lambda get_frame, t: _invert_left_half(get_frame(t), t))
+    reference.write_videofile(reference_path, codec='libx264', audio_codec='aac',
+                              threads=1, logger=None)
+    video.close()
+
+    assert np.array_equal(decode_frames(pipelined_path), decode_frames(reference_path))
+    _, audio_stream, duration = probe_streams(pipelined_path)
+    assert audio_stream is not None
+    assert duration == pytest.approx(2.0, abs=0.1)
+
+    # 三个阶段各处理全部帧，利用率在 0-1 之间
+    assert [stage.name for stage in stats.stages] == ['解码', '合成', '编码']
+    assert all(stage.frames == 50 for stage in stats.stages)
+    assert all(0 <= stage.utilization(stats.wall) <= 1 for stage in stats.stages)
+    assert '利用率' in stats.describe()
+
+
+def test_render_pipelined_from_file(test_video, output_dir, decode_frames):
+    """测试零拷贝读取源文件时输出与逐帧 get_frame 一致，合成函数可原地修改缓冲区"""
+    clip_path = os.path.join(output_dir, "pipeline_clip_source.mp4")
+    file_path = os.path.join(output_dir, "pipeline_file_source.mp4")
+
+    def invert_in_place(frame, t):
+        if not frame.flags.writeable:
+            frame = frame.copy()
+        frame[:, :80] = 255 - frame[:, :80]
+        return frame
+
+    video = VideoFileClip(test_video)
+    render_pipelined(video, clip_path, invert_in_place, threads=1)
+    stats = render_pipelined(video, file_path, invert_in_place, threads=1, queue_size=1,
+                             source_path=test_video)
+    video.close()
+
+    assert all(stage.frames == 50 for stage in stats.stages)
+    assert np.array_equal(decode_frames(file_path), decode_frames(clip_path))
+
+
+def test_render_pipelined_without_process(test_video, output_dir, decode_frames):
+    """测试不合成时只有解码、编码两个阶段"""
+    output_path = os.path.join(output_dir, "pipeline_passthrough.mp4")
+    video = VideoFileClip(test_video)
+    stats = render_pipelined(video, output_path, queue_size=2)
+    video.close()
+
+    assert [stage.name for stage in stats.stages] == ['解码', '编码']
+    assert len(decode_frames(output_path)) == 50
+
+
+def test_parse_memory_size():
+    """测试内存大小解析"""
+    assert parse_memory_size('1048576') == 1024 ** 2
+    assert parse_memory_size('512M') == 512 * 1024 ** 2
+    assert parse_memory_size('1.5g') == int(1.5 * 1024 ** 3)
+    assert parse_memory_size('2GB') == 2 * 1024 ** 3
+    with pytest.raises(ValueError):
+        parse_memory_size('很多')
+
+
+def test_plan_frame_pool(monkeypatch):
+    """测试在途帧数按队列容量、帧数上限和内存上限取最小值"""
+    monkeypatch.delenv(MAX_MEMORY_ENV, raising=False)
+    assert plan_frame_pool(100, queue_size=8) == 20
+    assert plan_frame_pool(100, queue_size=8, max_frames=5) == 5
+    assert plan_frame_pool(100, queue_size=8, max_memory=1050) == 10
+
+    monkeypatch.setenv(MAX_MEMORY_ENV, '300')
+    assert plan_frame_pool(100) == 3
+    with pytest.raises(ValueError):
+        plan_frame_pool(100, max_memory=150)
+
+
+def test_render_pipelined_memory_cap(test_video, output_dir, decode_frames):
+    """测试内存上限只容纳 2 帧时仍能完整渲染，帧复用不影响输出"""
+    reference_path = os.path.join(output_dir, "pipeline_uncapped.mp4")
+    capped_path = os.path.join(output_dir, "pipeline_capped.mp4")
+
+    def invert_in_place(frame, t):
+        frame[:, :80] = 255 - frame[:, :80]
+        return frame
+
+    video = VideoFileClip(test_video)
+    render_pipelined(video, reference_path, invert_in_place, threads=1)
+    stats = render_pipelined(video, capped_path, invert_in_place, threads=1,
+                             max_memory=2 * 160 * 120 * 3)
+    file_stats = render_pipelined(video, capped_path, invert_in_place, threads=1,
+                                  source_path=test_video, max_frames=2)
+    video.close()
+
+    assert all(stage.frames == 50 for stage in stats.stages + file_stats.stages)
+    assert np.array_equal(decode_frames(capped_path), decode_frames(reference_path))
+
+
+@pytest.mark.skipif(not process_compositing_available(), reason='需要 fork 启动方式')
+def test_render_pipelined_processes(test_video, output_dir, decode_frames):
+    """测试多进程合成：帧经共享内存传递、按序重排后与线程合成的输出逐帧一致"""
+    thread_path = os.path.join(output_dir, "pipeline_threads.mp4")
+    process_path = os.path.join(output_dir, "pipeline_processes.mp4")
+
+    def invert_in_place(frame, t):
+        frame[:, :80] = 255 - frame[:, :80]
+        return frame
+
+    def invert_copy(frame, t):
+        # 返回新数组时同样写回共享内存
+        return _invert_left_half(frame, t)
+
+    video = VideoFileClip(test_video)
+    render_pipelined(video, thread_path, invert_in_place, threads=1, source_path=test_video)
+    stats = render_pipelined(video, process_path, invert_in_place, threads=1,
+                             source_path=test_video, compose_processes=3, max_frames=4)
+    assert [stage.name for stage in stats.stages] == ['解码', '合成1', '合成2', '合成3', '编码']
+    assert sum(stage.frames for stage in stats.stages[1:4]) == 50
+    assert np.array_equal(decode_frames(process_path), decode_frames(thread_path))
+
+    render_pipelined(video, process_path, invert_copy, threads=1,
+                     source_path=test_video, compose_processes=1)
+    video.close()
+    assert np.array_equal(decode_frames(process_path), decode_frames(thread_path))
+
+
+@pytest.mark.skipif(not process_compositing_available(), reason='需要 fork 启动方式')
+def test_render_pipelined_processes_error(test_video, output_dir):
+    """测试合成进程出错时主进程抛出原异常"""
+    def failing(frame, t):
+        if t > 0.5:
+            raise ValueError('合成失败')
+        return frame
+
+    video = VideoFileClip(test_video)
+    with pytest.raises(ValueError, match='合成失败'):
+        render_pipelined(video, os.path.join(output_dir, "pipeline_process_error.mp4"), failing,
+                         source_path=test_video, compose_processes=2)
+    video.close()
+
+
+def test_render_pipelined_yuv420(test_video, output_dir, decode_frames):
+    """测试 YUV420 合成：合成函数收到 yuv420p 帧，输出与 RGB 合成在容差内一致；条件不满足时回退到 RGB"""
+    rgb_path = os.path.join(output_dir, "pipeline_rgb.mp4")
+    yuv_path = os.path.join(output_dir, "pipeline_yuv.mp4")
+    shapes = set()
+
+    def darken_top(frame, t):
+        shapes.add(frame.shape)
+        # yuv420p 帧的前 120 行是亮度平面，两种格式都只把画面上半部分调暗
+        frame[:60] //= 2
+        return frame
+
+    video = VideoFileClip(test_video)
+    stats = render_pipelined(video, yuv_path, darken_top, threads=1, source_path=test_video,
+                             pix_fmt='yuv420p')
+    assert shapes == {(180, 160)}
+    assert all(stage.frames == 50 for stage in stats.stages)
+
+    shapes.clear()
+    render_pipelined(video, rgb_path, darken_top, threads=1, pix_fmt='yuv420p')
+    video.close()
+    assert shapes == {(120, 160, 3)}
+
+    yuv_frames = decode_frames(yuv_path).astype(int)
+    rgb_frames = decode_frames(rgb_path).astype(int)
+    assert np.abs(yuv_frames[:, 70:] - rgb_frames[:, 70:]).mean() < 3
+    assert yuv_frames[:, :50].mean() < rgb_frames[:, 70:].mean()
+
+    with pytest.raises(ValueError):
+        render_pipelined(video, yuv_path, pix_fmt='nv12')
+
+
+def test_render_pipelined_error(test_video, output_dir):
+    """测试合成阶段出错时所有阶段停止并抛出原异常"""
+    def failing(frame, t):
+        if t > 0.5:
+            raise ValueError('合成失败')
+        return frame
+
+    video = VideoFileClip(test_video)
+    with pytest.raises(ValueError, match='合成失败'):
+        render_pipelined(video, os.path.join(output_dir, "pipeline_error.mp4"), failing,
+                         queue_size=1)
+    video.close()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,107 @@
+"""媒体信息探测与缓存测试"""
+
+import pytest
+import os
+import shutil
+import sys
+import tempfile
+
+# 将项目根目录添加到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.media import probe
+from src.media.probe import ProbeCache, probe_media
+
+
+@pytest.fixture
+def test_video():
+    """创建测试视频（带音频，关键帧间隔1秒）"""
+    video_path = os.path.join(tempfile.gettempdir(), "test_video_probe.mp4")
+
+    if not os.path.exists(video_path):
+        null_output = "nul" if os.name == 'nt' else "/dev/null"
+        cmd = (f'ffmpeg -f lavfi -i testsrc=duration=3:size=320x240:rate=25 '
+               f'-f lavfi -i sine=duration=3 -g 25 -pix_fmt yuv420p -c:a aac -ac 2 -shortest '
+               f'-y "{video_path}" 2>{null_output}')
+        os.system(cmd)
+    return video_path
+
+
+@pytest.fixture
+def counting_cache(monkeypatch):
+    """使用临时数据库作为缓存，并统计 ffprobe 调用次数"""
+    db_dir = tempfile.mkdtemp(prefix='probe_cache_')
+    monkeypatch.setattr(probe, 'probe_cache', ProbeCache(os.path.join(db_dir, 'probe.sqlite3')))
+
+    calls = []
+    run_ffprobe = probe.run_ffprobe
+
+    def counting_run_ffprobe(args):
+        calls.append(args)
+        return run_ffprobe(args)
+
+    monkeypatch.setattr(probe, 'run_ffprobe', counting_run_ffprobe)
+    yield calls
+    shutil.rmtree(db_dir, ignore_errors=True)
+
+
+def test_probe_media(test_video, counting_cache):
+    """测试一次 ffprobe 调用得到全部元数据"""
+    info = probe_media(test_video)
+    assert len(counting_cache) == 1
+
+    assert info.size == (320, 240)
+    assert info.fps == 25
+    assert abs(info.duration - 3) < 0.1
+    assert info.video_codec == 'h264'
+    assert info.pix_fmt == 'yuv420p'
+    assert abs(info.keyframe_interval - 1) < 1e-6
+    assert info.has_audio
+    assert info.audio_codec == 'aac'
+    assert info.channels == 2
+    assert info.sample_rate > 0
+
+
+def test_probe_cache_hit_and_invalidation(test_video, counting_cache):
+    """测试缓存命中不再调用 ffprobe，文件变化后重新探测"""
+    video_copy = os.path.join(tempfile.gettempdir(), "test_video_probe_copy.mp4")
+    shutil.copy(test_video, video_copy)
+
+    first = probe_media(video_copy)
+    second = probe_media(video_copy)
+    assert len(counting_cache) == 1
+    assert first == second
+
+    # 内容改变（大小和修改时间变化）后缓存失效
+    shutil.copy(os.path.join(os.path.dirname(__file__), '..', 'README.md'), video_copy)
+    with pytest.raises(RuntimeError):
+        probe_media(video_copy)
+    assert len(counting_cache) == 2
+
+    os.remove(video_copy)
+
+
+def test_probe_cache_disabled(test_video, counting_cache, monkeypatch):
+    """测试禁用缓存时每次都探测"""
+    monkeypatch.setattr(probe, 'probe_cache', ProbeCache(db_path=''))
+    probe_media(test_video)
+    probe_media(test_video)
+    assert len(counting_cache) == 2
+
+
+def test_probe_cache_eviction(test_video):
+    """测试超过条目上限时删除最久未使用的条目"""
+    db_dir = tempfile.mkdtemp(prefix='probe_cache_')
+    cache = ProbeCache(os.path.join(db_dir, 'probe.sqlite3'), max_entries=2)
+    stat = os.stat(test_video)
+
+    for name in ('a', 'b', 'c'):
+        cache.put(name, stat, {'name': name})
+    assert cache.get('a', stat) is None
+    assert cache.get('c', stat) == {'name': 'c'}
+
+    shutil.rmtree(db_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,192 @@
+"""视频分段与智能部分重编码测试"""
+
+import pytest
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+# 将项目根目录添加到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.media.segments import (list_keyframes, plan_parallel_cuts, plan_reencode_window, probe_streams,
+                                video_streams_match)
+
+
+@pytest.fixture
+def gop_video():
+    """创建测试视频（h264/yuv420p，每秒一个关键帧，带音频）"""
+    video_path = os.path.join(tempfile.gettempdir(), "test_video_gop.mp4")
+
+    if not os.path.exists(video_path):
+        null_output = "nul" if os.name == 'nt' else "/dev/null"
+        cmd = (f'ffmpeg -f lavfi -i testsrc=duration=4:size=320x240:rate=30 '
+               f'-f lavfi -i sine=duration=4 -c:v libx264 -g 30 -pix_fmt yuv420p '
+               f'-c:a aac -shortest -y "{video_path}" 2>{null_output}')
+        os.system(cmd)
+    return video_path
+
+
+@pytest.fixture
+def main_profile_video():
+    """创建与 gop_video 参数相同、但编码档次为 Main 的测试视频"""
+    video_path = os.path.join(tempfile.gettempdir(), "test_video_gop_main.mp4")
+
+    if not os.path.exists(video_path):
+        null_output = "nul" if os.name == 'nt' else "/dev/null"
+        cmd = (f'ffmpeg -f lavfi -i testsrc=duration=4:size=320x240:rate=30 '
+               f'-c:v libx264 -profile:v main -g 30 -pix_fmt yuv420p '
+               f'-y "{video_path}" 2>{null_output}')
+        os.system(cmd)
+    return video_path
+
+
+def test_plan_reencode_window():
+    """测试重编码区间规划"""
+    keyframes = [0.0, 2.0, 4.0, 6.0, 8.0]
+
+    # 窗口位于中间：向前、向后扩展到关键帧
+    assert plan_reencode_window(keyframes, 2.5, 5.0) == (2.0, 6.0)
+    # 窗口恰好落在关键帧上
+    assert plan_reencode_window(keyframes, 2.0, 4.0) == (2.0, 4.0)
+    # 片头窗口
+    assert plan_reencode_window(keyframes, 0.0, 3.0) == (0.0, 4.0)
+    # 延伸到结尾
+    assert plan_reencode_window(keyframes, 7.0, 9.5) == (6.0, None)
+    # 覆盖整个视频时不适用
+    assert plan_reencode_window(keyframes, 0.0, 9.5) is None
+
+
+def test_plan_parallel_cuts():
+    """测试分段并行切点规划"""
+    keyframes = [0.0, 2.0, 4.0, 6.0, 8.0]
+
+    # 等分点取最近的关键帧
+    assert plan_parallel_cuts(keyframes, 10.0, 2) == [4.0]
+    assert plan_parallel_cuts(keyframes, 10.0, 4) == [2.0, 4.0, 8.0]
+    # 关键帧不足时合并重复的切点
+    assert plan_parallel_cuts([0.0, 5.0], 10.0, 8) == [5.0]
+    # 只有一个关键帧时无法切分
+    assert plan_parallel_cuts([0.0], 10.0, 4) == []
+
+
+def test_list_keyframes(gop_video):
+    """测试关键帧列表"""
+    keyframes = list_keyframes(gop_video)
+    assert keyframes[0] == pytest.approx(0.0)
+    assert keyframes[:4] == pytest.approx([0.0, 1.0, 2.0, 3.0], abs=0.01)
+
+
+def test_smart_render_text_watermark(gop_video, output_dir, decode_frames):
+    """测试文字水印只重编码时间范围所在的GOP"""
+    from src.watermark import add_text_watermark
+
+    output_path = os.path.join(output_dir, "smart_render_text.mp4")
+    add_text_watermark(
+        video_path=gop_video,
+        text="Smart",
+        output_path=output_path,
+        position=("left", "top"),
+        font_size=48,
+        start_time=1.2,
+        end_time=1.8,
+        smart_render=True
+    )
+
+    source = decode_frames(gop_video)
+    result = decode_frames(output_path)
+    assert len(result) == len(source)
+
+    # GOP [1s, 2s) 之外的帧是流复制的，应与源完全一致
+    assert np.array_equal(result[:30], source[:30])
+    assert np.array_equal(result[60:], source[60:])
+
+    # 水印时间范围内左上角应有变化
+    diff = np.abs(result[45, :80, :160].astype(int) - source[45, :80, :160]).mean()
+    assert diff > 5
+
+
+def test_parallel_text_watermark(gop_video, output_dir, decode_frames):
+    """测试分段并行渲染：水印时间按全局时间轴换算，窗口外的段直接流复制"""
+    from src.watermark import add_text_watermark
+
+    params = dict(video_path=gop_video, text="Parallel", position=("left", "top"),
+                  font_size=48, start_time=1.5, end_time=2.5)
+    output_path = os.path.join(output_dir, "parallel_text.mp4")
+    add_text_watermark(output_path=output_path, segments=4, **params)
+
+    reference_path = os.path.join(output_dir, "parallel_text_reference.mp4")
+    add_text_watermark(output_path=reference_path, **params)
+
+    source = decode_frames(gop_video)
+    reference = decode_frames(reference_path)
+    result = decode_frames(output_path)
+    assert len(result) == len(source)
+
+    # 与水印时间范围不重叠的段 [0s, 1s)、[3s, 4s) 是流复制的
+    assert np.array_equal(result[:30], source[:30])
+    assert np.array_equal(result[90:], source[90:])
+
+    # 其余段与单进程渲染结果一致（仅编码误差）
+    assert np.abs(result[30:90].astype(int) - reference[30:90]).mean() < 3
+
+    # 水印在全局时间 1.5s 出现、2.5s 消失
+    region = (slice(0, 80), slice(0, 160))
+    def changed(index):
+        return np.abs(result[index][region].astype(int) - source[index][region]).mean() > 5
+    assert not changed(44) and changed(45)
+    assert changed(74) and not changed(75)
+
+
+def test_video_streams_match_profile(gop_video, main_profile_video):
+    """测试编码档次或全局头（SPS/PPS）不同的视频流不能流复制拼接"""
+    high, _, _ = probe_streams(gop_video)
+    main, _, _ = probe_streams(main_profile_video)
+    assert video_streams_match(high, dict(high))
+    assert not video_streams_match(high, main)
+    assert not video_streams_match(high, dict(high, extradata_hash='SHA256:0'))
+
+
+def test_smart_render_profile_mismatch(main_profile_video, output_dir, decode_frames):
+    """测试重编码结果与源的编码档次不一致时回退为完整渲染"""
+    from src.watermark import add_text_watermark
+
+    output_path = os.path.join(output_dir, "smart_render_main_profile.mp4")
+    add_text_watermark(
+        video_path=main_profile_video,
+        text="Smart",
+        output_path=output_path,
+        position=("left", "top"),
+        font_size=48,
+        start_time=1.2,
+        end_time=1.8,
+        smart_render=True
+    )
+
+    source = decode_frames(main_profile_video)
+    result = decode_frames(output_path)
+    assert len(result) == len(source)
+    # 完整渲染：整个输出为同一档次，可以正常解码，窗口外的帧只有编码误差
+    assert probe_streams(output_path)[0]['profile'] == 'High'
+    assert np.abs(result[60:].astype(int) - source[60:]).mean() < 5
+
+
+def test_parallel_profile_mismatch(main_profile_video, output_dir, decode_frames):
+    """测试重编码的段与流复制的源片段编码档次不一致时回退为单进程渲染"""
+    from src.watermark import add_text_watermark
+
+    output_path = os.path.join(output_dir, "parallel_main_profile.mp4")
+    add_text_watermark(video_path=main_profile_video, text="Parallel", output_path=output_path,
+                       position=("left", "top"), font_size=48, start_time=1.5, end_time=2.5,
+                       segments=4)
+
+    source = decode_frames(main_profile_video)
+    result = decode_frames(output_path)
+    assert len(result) == len(source)
+    assert probe_streams(output_path)[0]['profile'] == 'High'
+    assert np.abs(result[90:].astype(int) - source[90:]).mean() < 5
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
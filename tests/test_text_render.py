@@ -0,0 +1,66 @@
+"""文字渲染缓存测试"""
+
+import pytest
+import os
+import sys
+
+# 将项目根目录添加到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from PIL import Image
+
+from src.watermark.text_render import (
+    TextImageCache, load_font, render_text_image, text_image_cache
+)
+
+
+def test_load_font_cached():
+    """测试相同 (路径, 字号) 只加载一次字体"""
+    assert load_font(None, 30) is load_font(None, 30)
+    assert load_font(None, 30) is not load_font(None, 31)
+
+
+def test_render_text_image_cached():
+    """测试相同样式的文字图片只渲染一次，且返回的副本互不影响"""
+    text_image_cache.clear()
+    first, height = render_text_image("Cached", None, 36, 'white', 2, 'black')
+    assert text_image_cache.misses == 1
+
+    second, _ = render_text_image("Cached", None, 36, 'white', 2, 'black')
+    assert text_image_cache.hits == 1
+    assert first.tobytes() == second.tobytes()
+    assert height == first.height
+
+    # 修改返回的图片不影响缓存
+    first.paste((255, 0, 0, 255), (0, 0, first.width, first.height))
+    third, _ = render_text_image("Cached", None, 36, 'white', 2, 'black')
+    assert third.tobytes() == second.tobytes()
+
+    # 任一样式参数不同都重新渲染
+    render_text_image("Cached", None, 36, 'yellow', 2, 'black')
+    assert text_image_cache.misses == 2
+
+
+def test_text_image_cache_eviction():
+    """测试按字节数淘汰最久未使用的图片"""
+    cache = TextImageCache(max_bytes=3 * 10 * 10 * 4)
+    images = {key: (Image.new('RGBA', (10, 10)), 10) for key in 'abcd'}
+
+    for key in 'abc':
+        cache.put((key,), images[key])
+    assert len(cache) == 3
+
+    # 访问 a 后加入 d：淘汰最久未使用的 b
+    cache.get(('a',))
+    cache.put(('d',), images['d'])
+    assert cache.get(('b',)) is None
+    assert cache.get(('a',)) is not None
+    assert cache.current_bytes == 3 * 10 * 10 * 4
+
+    # 超过容量的单张图片不缓存
+    cache.put(('big',), (Image.new('RGBA', (100, 100)), 100))
+    assert cache.get(('big',)) is None
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -6,11 +6,11 @@ import sys
 import tempfile
 from pathlib import Path
 
-# 添加src到路径
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+# 将项目根目录添加到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
-from watermark import add_text_watermark
-from watermark.text_watermark_v2 import create_text_image
+from src.watermark import add_text_watermark
+from src.watermark.text_watermark_v2 import create_text_image
 
 
 @pytest.fixture
@@ -32,15 +32,6 @@ def test_video():
     return video_path
 
 
-@pytest.fixture
-def output_dir():
-    """创建输出目录"""
-    # 使用跨平台的临时目录
-    output_path = os.path.join(tempfile.gettempdir(), "test_output")
-    os.makedirs(output_path, exist_ok=True)
-    return output_path
-
-
 def test_create_text_image():
     """测试创建文本图片"""
     # 创建简单文本图片
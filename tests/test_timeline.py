@@ -0,0 +1,76 @@
+"""时间轴区间规划测试"""
+
+import pytest
+import os
+import sys
+
+import numpy as np
+
+# 将项目根目录添加到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.watermark.overlay import StaticOverlay
+from src.watermark.timeline import plan_timeline, static_overlay_processor
+
+
+def _layer(rng, position, start=0, end=None):
+    """创建随机内容的静态图层"""
+    return StaticOverlay(
+        rng.integers(0, 256, (20, 30, 3), dtype=np.uint8),
+        rng.integers(0, 256, (20, 30), dtype=np.uint8),
+        position, (160, 90), start, end
+    )
+
+
+def test_plan_timeline_intervals():
+    """测试时间轴按活动图层集合切分"""
+    rng = np.random.default_rng(0)
+    logo = _layer(rng, (5, 5))
+    copyright_line = _layer(rng, (20, 15), 1, 2)
+    channel = _layer(rng, (120, 60), 3, 4)
+
+    plan = plan_timeline([logo, copyright_line, channel], duration=5)
+    assert [(i.start, i.end, i.layers) for i in plan.intervals] == [
+        (0.0, 1.0, (0,)),
+        (1.0, 2.0, (0, 1)),
+        (2.0, 3.0, (0,)),
+        (3.0, 4.0, (0, 2)),
+        (4.0, None, (0,)),
+    ]
+    # 相同的图层组合只合并一次
+    assert plan.intervals[0].overlay is plan.intervals[2].overlay
+    assert plan.overlay_at(1.5) is plan.intervals[1].overlay
+
+
+def test_plan_timeline_pass_through():
+    """测试没有活动图层的区间标记为直通"""
+    rng = np.random.default_rng(1)
+    plan = plan_timeline([_layer(rng, (5, 5), 1, 2)], duration=10)
+
+    assert [(i.start, i.end) for i in plan.intervals] == [(0.0, 1.0), (1.0, 2.0), (2.0, None)]
+    assert plan.overlay_at(0.5) is None
+    assert plan.overlay_at(1.0) is not None
+    assert plan.overlay_at(2.0) is None
+    assert '直通' in plan.describe()
+
+
+def test_processor_follows_plan():
+    """测试按计划逐帧合成的结果与逐层混合一致，只读的源帧不被修改"""
+    rng = np.random.default_rng(2)
+    background = rng.integers(0, 256, (90, 160, 3), dtype=np.uint8)
+    background.flags.writeable = False
+    layers = [_layer(rng, (5, 5), 0, 2), _layer(rng, (100, 50), 1, 3)]
+
+    process = static_overlay_processor(layers, duration=3)
+    assert len(process.timeline_plan.intervals) == 3
+
+    for t in [0.5, 1.5, 2.5]:
+        expected = background.copy()
+        for layer in layers:
+            if layer.is_active(t):
+                layer.blend(expected)
+        assert np.array_equal(process(background, t), expected)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
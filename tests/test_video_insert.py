@@ -0,0 +1,326 @@
+"""视频插入功能测试"""
+
+import pytest
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+
+# 将项目根目录添加到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.insert import clip_cache, video_insert
+from src.insert import insert_video, insert_videos
+from src.insert.snap import histogram_differences, snap_insert_position
+from src.media.segments import probe_streams
+
+
+def _make_video(name, source, duration, profile='high'):
+    """用 ffmpeg 生成 h264/yuv420p 测试视频（每秒一个关键帧，带音频）"""
+    video_path = os.path.join(tempfile.gettempdir(), name)
+    if not os.path.exists(video_path):
+        null_output = "nul" if os.name == 'nt' else "/dev/null"
+        cmd = (f'ffmpeg -f lavfi -i {source}=duration={duration}:size=320x240:rate=30 '
+               f'-f lavfi -i sine=duration={duration} -c:v libx264 -profile:v {profile} -g 30 '
+               f'-pix_fmt yuv420p -c:a aac -shortest -y "{video_path}" 2>{null_output}')
+        os.system(cmd)
+    return video_path
+
+
+@pytest.fixture
+def main_video():
+    """创建主视频"""
+    return _make_video("test_insert_main.mp4", "testsrc", 4)
+
+
+@pytest.fixture
+def bumper_video():
+    """创建编码参数相同的插入视频"""
+    return _make_video("test_insert_bumper.mp4", "testsrc2", 1)
+
+
+@pytest.fixture
+def mismatched_video():
+    """创建分辨率和帧率与主视频不同的插入视频"""
+    video_path = os.path.join(tempfile.gettempdir(), "test_insert_mismatch.mp4")
+    if not os.path.exists(video_path):
+        null_output = "nul" if os.name == 'nt' else "/dev/null"
+        os.system(f'ffmpeg -f lavfi -i testsrc2=duration=1:size=160x120:rate=25 '
+                  f'-f lavfi -i sine=duration=1 -c:v libx264 -pix_fmt yuv420p '
+                  f'-c:a aac -shortest -y "{video_path}" 2>{null_output}')
+    return video_path
+
+
+def test_stream_copy_insert(main_video, bumper_video, output_dir, decode_frames):
+    """测试插入点不在关键帧上时的流复制快速插入"""
+    output_path = os.path.join(output_dir, "insert_stream_copy.mp4")
+    insert_video(
+        main_video_path=main_video,
+        insert_video_path=bumper_video,
+        output_path=output_path,
+        insert_position=1.5,
+        audio_mode='keep'
+    )
+
+    main_frames = decode_frames(main_video)
+    bumper_frames = decode_frames(bumper_video)
+    result = decode_frames(output_path)
+    assert len(result) == len(main_frames) + len(bumper_frames)
+
+    # 插入点所在GOP [1s, 2s) 之外的帧、插入视频的帧都是流复制的，应完全一致
+    assert np.array_equal(result[:30], main_frames[:30])
+    assert np.array_equal(result[45:75], bumper_frames)
+    assert np.array_equal(result[90:], main_frames[60:])
+
+    # 重编码的半个GOP与源接近
+    assert np.abs(result[30:45].astype(int) - main_frames[30:45]).mean() < 5
+
+    # 音轨时长与视频一致
+    _, audio_stream, duration = probe_streams(output_path)
+    assert audio_stream is not None
+    assert duration == pytest.approx(5.0, abs=0.1)
+
+
+def test_stream_copy_insert_on_keyframe(main_video, bumper_video, output_dir, decode_frames):
+    """测试插入点恰好在关键帧上时完全不重编码"""
+    output_path = os.path.join(output_dir, "insert_keyframe.mp4")
+    insert_video(
+        main_video_path=main_video,
+        insert_video_path=bumper_video,
+        output_path=output_path,
+        insert_position=2.0,
+        audio_mode='mute'
+    )
+
+    main_frames = decode_frames(main_video)
+    bumper_frames = decode_frames(bumper_video)
+    result = decode_frames(output_path)
+    expected = np.concatenate([main_frames[:60], bumper_frames, main_frames[60:]])
+    assert np.array_equal(result, expected)
+
+    _, audio_stream, _ = probe_streams(output_path)
+    assert audio_stream is None
+
+
+def test_stream_copy_insert_profile_mismatch(output_dir, decode_frames):
+    """测试重编码的GOP与主视频的编码档次不一致时回退为完整渲染"""
+    main_video = _make_video("test_insert_main_profile.mp4", "testsrc", 4, profile='main')
+    bumper_video = _make_video("test_insert_bumper_main_profile.mp4", "testsrc2", 1, profile='main')
+    output_path = os.path.join(output_dir, "insert_profile_mismatch.mp4")
+    insert_video(main_video, bumper_video, output_path, insert_position=1.5)
+
+    main_frames = decode_frames(main_video)
+    bumper_frames = decode_frames(bumper_video)
+    result = decode_frames(output_path)
+    assert len(result) == len(main_frames) + len(bumper_frames)
+    # 完整渲染：整个输出为同一档次，主视频部分只有编码误差
+    assert probe_streams(output_path)[0]['profile'] == 'High'
+    assert np.abs(result[:45].astype(int) - main_frames[:45]).mean() < 5
+    assert np.abs(result[75:].astype(int) - main_frames[45:]).mean() < 5
+
+
+def test_parallel_insert(main_video, mismatched_video, output_dir, decode_frames, capsys):
+    """测试编码参数不一致时的分段并行插入"""
+    output_path = os.path.join(output_dir, "insert_parallel.mp4")
+    insert_video(
+        main_video_path=main_video,
+        insert_video_path=mismatched_video,
+        output_path=output_path,
+        insert_position=1.5,
+        audio_mode='keep',
+        segments=2,
+        cache_inserts=False
+    )
+
+    # 各段的全局头一致，没有回退为完整渲染
+    assert '改为完整渲染' not in capsys.readouterr().out
+
+    main_frames = decode_frames(main_video)
+    result = decode_frames(output_path)
+    # 插入视频转换为主视频的帧率：1秒 30帧
+    assert len(result) == len(main_frames) + 30
+
+    # 主视频部分与源接近（仅编码误差）
+    assert np.abs(result[:45].astype(int) - main_frames[:45]).mean() < 5
+    assert np.abs(result[75:].astype(int) - main_frames[45:]).mean() < 5
+
+    video_stream, audio_stream, duration = probe_streams(output_path)
+    assert (video_stream['width'], video_stream['height']) == (320, 240)
+    assert audio_stream is not None
+    assert duration == pytest.approx(5.0, abs=0.1)
+
+
+def test_insert_clip_cache(main_video, mismatched_video, output_dir, monkeypatch, decode_frames,
+                           tmp_path):
+    """测试编码参数不一致的插入视频只转码一次，之后从缓存流复制插入"""
+    cache_dir = str(tmp_path / "insert_cache")
+    monkeypatch.setattr(video_insert, 'insert_clip_cache', clip_cache.InsertClipCache(cache_dir))
+
+    transcodes = []
+    transcode_to_profile = clip_cache.transcode_to_profile
+
+    def counting_transcode(*args, **kwargs):
+        transcodes.append(args[0])
+        return transcode_to_profile(*args, **kwargs)
+
+    monkeypatch.setattr(clip_cache, 'transcode_to_profile', counting_transcode)
+
+    main_frames = decode_frames(main_video)
+    for name in ("insert_cached_1.mp4", "insert_cached_2.mp4"):
+        output_path = os.path.join(output_dir, name)
+        insert_video(main_video, mismatched_video, output_path, insert_position=2.0,
+                     audio_mode='replace', cache_inserts=True)
+
+        # 主视频部分全部流复制，插入视频转换为主视频的帧率：1秒 30帧
+        result = decode_frames(output_path)
+        assert len(result) == len(main_frames) + 30
+        assert np.array_equal(result[:60], main_frames[:60])
+        assert np.array_equal(result[90:], main_frames[60:])
+
+        _, audio_stream, duration = probe_streams(output_path)
+        assert audio_stream is not None
+        assert duration == pytest.approx(5.0, abs=0.1)
+
+    assert len(transcodes) == 1
+    assert len([name for name in os.listdir(cache_dir) if name.endswith('.mp4')]) == 1
+    shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+@pytest.fixture
+def scene_video():
+    """创建在 1.4 秒处切换场景的视频（红色 -> 蓝色渐变）"""
+    video_path = os.path.join(tempfile.gettempdir(), "test_insert_scene.mp4")
+    if not os.path.exists(video_path):
+        null_output = "nul" if os.name == 'nt' else "/dev/null"
+        cmd = (f'ffmpeg -f lavfi -i color=c=red:duration=1.4:size=320x240:rate=30 '
+               f'-f lavfi -i testsrc2=duration=2:size=320x240:rate=30 '
+               f'-filter_complex "[0:v][1:v]concat=n=2:v=1[v]" -map "[v]" '
+               f'-c:v libx264 -g 30 -pix_fmt yuv420p -y "{video_path}" 2>{null_output}')
+        os.system(cmd)
+    return video_path
+
+
+def test_histogram_differences():
+    """测试相邻帧直方图差异：相同帧为0，完全不同的颜色为1"""
+    frames = np.zeros((3, 4, 4, 3), np.uint8)
+    frames[2, :, :, 2] = 255
+    differences = histogram_differences(frames)
+    assert differences[0] == 0
+    assert differences[1] == pytest.approx(1 / 3)
+
+    frames[2] = 255
+    assert histogram_differences(frames)[1] == pytest.approx(1)
+
+
+def test_snap_insert_position(main_video, scene_video):
+    """测试吸附到最近的关键帧和场景切换处"""
+    assert snap_insert_position(main_video, 1.4, 'keyframe') == pytest.approx(1.0)
+    assert snap_insert_position(main_video, 1.6, 'keyframe') == pytest.approx(2.0)
+    assert snap_insert_position(main_video, 1.4, 'none') == 1.4
+
+    assert snap_insert_position(scene_video, 1.0, 'scene', window=1.0) == pytest.approx(1.4, abs=1e-3)
+    # 搜索窗口内没有场景切换时保持原位置
+    assert snap_insert_position(scene_video, 2.8, 'scene', window=0.5) == 2.8
+
+
+def test_scene_detection_samples_frames(scene_video):
+    """测试场景检测只取采样帧：30fps 的视频每秒只输出 SCENE_SAMPLE_FPS 帧缩略图"""
+    from src.insert import snap
+
+    frames = snap._decode_thumbnails(scene_video, 0.0, 2.0, snap.SCENE_SAMPLE_FPS)
+    assert frames.shape == (2 * snap.SCENE_SAMPLE_FPS, 36, 64, 3)
+
+
+def test_insert_with_keyframe_snap(main_video, bumper_video, output_dir, decode_frames):
+    """测试吸附到关键帧后插入，插入点之前的帧与主视频一致"""
+    output_path = os.path.join(output_dir, "inserted_snap.mp4")
+    insert_video(main_video, bumper_video, output_path, insert_position=1.9, snap='keyframe')
+
+    output = decode_frames(output_path)
+    main = decode_frames(main_video)
+    bumper = decode_frames(bumper_video)
+    assert len(output) == len(main) + len(bumper)
+    # 插入点从 1.9 秒吸附到 2.0 秒关键帧
+    assert np.array_equal(output[:60], main[:60])
+    assert np.array_equal(output[60:60 + len(bumper)], bumper)
+
+
+def test_insert_multiple_stream_copy(main_video, bumper_video, output_dir, decode_frames):
+    """测试一次插入多个视频：关键帧上、GOP中间、同一个GOP内的两处和结尾"""
+    output_path = os.path.join(output_dir, "insert_multiple.mp4")
+    insert_videos(main_video, [
+        {'path': bumper_video, 'position': 4.0, 'audio_mode': 'replace'},
+        {'path': bumper_video, 'position': 1.0},
+        {'path': bumper_video, 'position': 2.5, 'audio_mode': 'mute'},
+        {'path': bumper_video, 'position': 2.8},
+    ], output_path)
+
+    main_frames = decode_frames(main_video)
+    bumper_frames = decode_frames(bumper_video)
+    result = decode_frames(output_path)
+    assert len(result) == len(main_frames) + 4 * len(bumper_frames)
+
+    # 按位置排序后依次插入：1.0s（关键帧）、2.5s 和 2.8s（同一个GOP）、4.0s（结尾）
+    expected = np.concatenate([
+        main_frames[:30], bumper_frames, main_frames[30:75], bumper_frames,
+        main_frames[75:84], bumper_frames, main_frames[84:], bumper_frames
+    ])
+    # 未重编码的部分完全一致，重编码的GOP [2s, 3s) 与源接近
+    copied = np.ones(len(result), bool)
+    copied[90:105] = copied[135:144] = copied[174:180] = False
+    assert np.array_equal(result[copied], expected[copied])
+    assert np.abs(result.astype(int) - expected).mean() < 5
+
+    _, audio_stream, duration = probe_streams(output_path)
+    assert audio_stream is not None
+    assert duration == pytest.approx(8.0, abs=0.1)
+
+
+def test_insert_multiple_parallel(main_video, mismatched_video, output_dir, decode_frames):
+    """测试编码参数不一致时多个插入项一次分段并行编码"""
+    output_path = os.path.join(output_dir, "insert_multiple_parallel.mp4")
+    insert_videos(main_video, [
+        {'path': mismatched_video, 'position': 0.5, 'audio_mode': 'mute'},
+        {'path': mismatched_video, 'position': 3.0, 'audio_mode': 'mute'},
+    ], output_path, segments=2, cache_inserts=False)
+
+    main_frames = decode_frames(main_video)
+    result = decode_frames(output_path)
+    assert len(result) == len(main_frames) + 60
+    assert np.abs(result[:15].astype(int) - main_frames[:15]).mean() < 5
+    assert np.abs(result[45:120].astype(int) - main_frames[15:90]).mean() < 5
+    assert np.abs(result[150:].astype(int) - main_frames[90:]).mean() < 5
+
+    _, audio_stream, _ = probe_streams(output_path)
+    assert audio_stream is None
+
+
+def test_insert_videos_invalid(main_video, bumper_video, output_dir):
+    """测试插入项参数校验"""
+    output_path = os.path.join(output_dir, "insert_invalid.mp4")
+    with pytest.raises(ValueError):
+        insert_videos(main_video, [], output_path)
+    with pytest.raises(ValueError):
+        insert_videos(main_video, [{'path': bumper_video}], output_path)
+    with pytest.raises(ValueError):
+        insert_videos(main_video, [{'path': bumper_video, 'position': 1, 'audio': 'keep'}], output_path)
+    with pytest.raises(ValueError):
+        insert_videos(main_video, [{'path': bumper_video, 'position': 1, 'audio_mode': 'loud'}],
+                      output_path)
+
+
+def test_insert_position_out_of_range(main_video, bumper_video, output_dir):
+    """测试插入位置超出主视频时长"""
+    with pytest.raises(ValueError):
+        insert_video(
+            main_video_path=main_video,
+            insert_video_path=bumper_video,
+            output_path=os.path.join(output_dir, "insert_invalid.mp4"),
+            insert_position=10.0
+        )
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])